@@ -3,7 +3,9 @@ import re
 import shutil
 import subprocess
 import sys
+import tempfile
 import time
+import uuid
 import pathlib
 
 """
@@ -12,58 +14,242 @@ in vTestInterface.py.  It was moved here to give access to the
 VectorCAST environment server.
 """
 
+import outputCapture
 import pythonUtilities
+import serverMetrics
 from pythonUtilities import (
-    cleanEnviroPath,
     closeEnvironmentConnection,
-    getClicastInstance,
+    lockClicastInstance,
+    logLevel,
     logMessage,
     monkeypatch_custom_css,
 )
 from vcastDataServerTypes import errorCodes
 from vector.apps.DataAPI.unit_test_api import UnitTestApi
-from vector.lib.core.system import cd
 
-# Filename used when we run a clicast command script
-commandFileName = "commands.cmd"
 
+def writeClicastCommands(processObject, commandList):
+    """
+    Returns None if the commands were written, or the reason for the failure
+    """
+    try:
+        processObject.stdin.write("".join(f"{command}\n" for command in commandList))
+        processObject.stdin.flush()
+    except OSError:
+        return "failed, the clicast instance is not running"
+    return None
 
-def runClicastServerCommand(enviroPath, commandString):
+
+def readClicastCommandResult(processObject, outputBuffer):
     """
-    Note: we indent the log messages here to make them easier to
-    read in the context of the original server command received
+    Reads the output of one command into outputBuffer, which is None if the
+    output should be thrown away.  Returns the exit code and the reason
+    the command was aborted, or None if it completed
     """
 
-    # This call will return the processObject or None
-    processObject = getClicastInstance(enviroPath)
+    startTime = time.perf_counter()
+    deadline = None
+    if pythonUtilities.clicastCommandTimeout > 0:
+        deadline = time.time() + pythonUtilities.clicastCommandTimeout
+
+    # The clicast server emits a line like this to mark the end of a command:
+    #   clicast-server-command-done:COMMAND_NOT_ALLOWED | 8
+    # Between the colon and the command is the status enum, and the
+    # number after the | is the 'pos of the enum which is the normal
+    # exit code for a clicast command.
+    #
+    # If clicast hangs we give up at the deadline, and if it dies, or is
+    # killed by a cancel request, readline() returns an empty string
+    abortReason = None
+    exitCode = errorCodes.clicastCommandAborted
+    while True:
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - time.time(), 0)
+        responseLine = processObject.readline(timeout)
+        if responseLine is None:
+            abortReason = (
+                f"timed out after {pythonUtilities.clicastCommandTimeout} seconds"
+            )
+            break
+        elif responseLine == "":
+            if pythonUtilities.requestIsCancelled():
+                abortReason = "cancelled"
+            else:
+                abortReason = "failed, the clicast instance exited"
+            break
+        elif responseLine.startswith("clicast-server-command-done"):
+            exitCode = int(responseLine.split("|")[1].strip())
+            break
+        elif outputBuffer is not None:
+            outputBuffer.append(responseLine)
+            pythonUtilities.emitOutputLine(responseLine)
 
-    if processObject == None:
-        exitCode = errorCodes.couldNotStartClicastInstance
-        returnText = "Could not start clicast instance"
+    serverMetrics.recordLatency("clicast", time.perf_counter() - startTime)
+    return exitCode, abortReason
 
-    else:
-        logMessage(f"    commandString: {commandString}")
-        processObject.stdin.write(f"{commandString}\n")
-        processObject.stdin.flush()
 
-        responseLine = ""
-        returnText = ""
+def sendClicastCommands(
+    enviroPath, processObject, commandList, pipelined, outputBuffer
+):
+    """
+    Returns the exit code, and the reason the commands were aborted or
+    None, the caller must hold the commandLock of the instance
+    """
+    exitCode = 0
+    abortReason = None
+
+    if pipelined:
+        abortReason = writeClicastCommands(processObject, commandList)
+
+    for index, commandString in enumerate(commandList):
+        if abortReason is not None:
+            break
+        if not pipelined:
+            abortReason = writeClicastCommands(processObject, [commandString])
+            if abortReason is not None:
+                break
 
-        # The clicast server emits a line like this to mark the end of a command:
-        #   clicast-server-command-done:COMMAND_NOT_ALLOWED | 8
-        # Between the colon and the command is the status enum, and the
-        # number after the | is the 'pos of the enum which is the normal
-        # exit code for a clicast command.
-        while not responseLine.startswith("clicast-server-command-done"):
-            returnText += responseLine
-            responseLine = processObject.stdout.readline()
+        logMessage(f"    commandString: {commandString}")
+        pythonUtilities.recordClicastCommand(enviroPath)
+        exitCode, abortReason = readClicastCommandResult(processObject, outputBuffer)
+        if abortReason is not None:
+            break
 
-        exitCode = int(responseLine.split("|")[1].strip())
         logMessage(f"    server return code: {exitCode}")
+        if exitCode != 0:
+            if pipelined and index < len(commandList) - 1:
+                # clicast runs every command that was written, so like a cancel,
+                # we kill the instance, so that the queued commands cannot run
+                logMessage(
+                    f"    command failed with {len(commandList) - index - 1} "
+                    f"more commands queued, discarding the clicast instance"
+                )
+                pythonUtilities.discardClicastInstance(
+                    enviroPath, processObject, isCrash=False
+                )
+            break
+
+    return exitCode, abortReason
+
+
+def runClicastServerCommands(enviroPath, commandList, pipelined=False):
+    """
+    Runs the commands using the clicast instance for enviroPath, and for
+    consistency with clicast scripts, we stop and return the exit code of
+    the first command that fails.
+
+    If pipelined is True, all of the commands are written to clicast before
+    we read the first result, which saves a round trip per command.  Clicast
+    would run every command that was written, so when a command fails we kill
+    the instance, the same way that a cancel does, and a new one is started.
+    Clicast might have started the next command before we read the failure,
+    the kill stops it, but a command that takes a few milliseconds could
+    complete first, so the commands should not be ones that can do damage
+    in that time.  The output of the queued commands is not returned
+    """
+
+    commandList = [command for command in commandList if command.strip()]
+
+    if pythonUtilities.requestIsCancelled():
+        logMessage(f"    request cancelled, not sending: {commandList}")
+        return errorCodes.clicastCommandAborted, "clicast command cancelled\n"
+
+    # This call will return the processObject, with its commandLock
+    # held, since the instance is shared by the environments in the
+    # same directory, or None
+    processObject = lockClicastInstance(enviroPath)
+    if processObject == None:
+        return (
+            errorCodes.couldNotStartClicastInstance,
+            "Could not start clicast instance",
+        )
+
+    try:
+        with outputCapture.outputBuffer() as outputBuffer:
+            pythonUtilities.setRunningClicastProcess(processObject)
+            try:
+                exitCode, abortReason = sendClicastCommands(
+                    enviroPath, processObject, commandList, pipelined, outputBuffer
+                )
+            finally:
+                pythonUtilities.setRunningClicastProcess(None)
+
+            if abortReason is not None:
+                logMessage(f"    clicast command {abortReason}", logLevel.error)
+                pythonUtilities.discardClicastInstance(enviroPath, processObject)
+                exitCode = errorCodes.clicastCommandAborted
+                outputBuffer.append(f"clicast command {abortReason}\n")
+
+            returnText = outputBuffer.getvalue()
+    finally:
+        processObject.commandLock.release()
 
     return exitCode, returnText
 
 
+def runClicastServerCommandList(enviroPath, commandList, resultCallback):
+    """
+    Runs all of the commands, pipelined, using the clicast instance for enviroPath
+    and calls resultCallback with the index, exit code and output of each command
+    as it completes.  Unlike runClicastServerCommands(), we do not stop when a
+    command fails.  If the instance hangs or dies, the remaining commands
+    get the clicastCommandAborted exit code
+    """
+    nextIndex = 0
+    if pythonUtilities.requestIsCancelled():
+        abortReason = "cancelled"
+    else:
+        abortReason = None
+        processObject = lockClicastInstance(enviroPath)
+        if processObject == None:
+            for index in range(len(commandList)):
+                resultCallback(
+                    index,
+                    errorCodes.couldNotStartClicastInstance,
+                    "Could not start clicast instance",
+                )
+            return
+
+    if abortReason is None:
+        try:
+            pythonUtilities.setRunningClicastProcess(processObject)
+            try:
+                abortReason = writeClicastCommands(processObject, commandList)
+                while abortReason is None and nextIndex < len(commandList):
+                    logMessage(f"    commandString: {commandList[nextIndex]}")
+                    pythonUtilities.recordClicastCommand(enviroPath)
+                    with outputCapture.outputBuffer() as outputBuffer:
+                        exitCode, abortReason = readClicastCommandResult(
+                            processObject, outputBuffer
+                        )
+                        if abortReason is None:
+                            logMessage(f"    server return code: {exitCode}")
+                            resultCallback(nextIndex, exitCode, outputBuffer.getvalue())
+                            nextIndex += 1
+            finally:
+                pythonUtilities.setRunningClicastProcess(None)
+
+            if abortReason is not None:
+                logMessage(f"    clicast command {abortReason}", logLevel.error)
+                pythonUtilities.discardClicastInstance(enviroPath, processObject)
+        finally:
+            processObject.commandLock.release()
+
+    for index in range(nextIndex, len(commandList)):
+        resultCallback(
+            index, errorCodes.clicastCommandAborted, f"clicast command {abortReason}\n"
+        )
+
+
+def runClicastServerCommand(enviroPath, commandString):
+    """
+    Note: we indent the log messages here to make them easier to
+    read in the context of the original server command received
+    """
+    return runClicastServerCommands(enviroPath, [commandString])
+
+
 enviroNameRegex = "-e\s*([^\s]*)"
 
 
@@ -96,19 +282,29 @@ def convertOutput(rawOutput):
     return returnText
 
 
-def runClicastCommandWithEcho(commandToRun):
+def runClicastCommandWithEcho(commandToRun, cwd=None):
     """
-    Similar to runClicastCommand but with real-time echo of output
+    Similar to runClicastCommand but with real-time echo of output,
+    commandToRun is split on spaces, or it can be a list of arguments.
+    The output goes to the output listener if there is one, since that
+    replaces the console, and to stdout otherwise
     """
-    stdoutString = ""
-    process = subprocess.Popen(
-        commandToRun.split(" "), stdout=subprocess.PIPE, text=True
-    )
-    while process.poll() is None:
-        line = process.stdout.readline().rstrip()
-        if len(line) > 0:
-            stdoutString += line + "\n"
-            print(line, flush=True)
+    if isinstance(commandToRun, str):
+        commandToRun = commandToRun.split(" ")
+    process = subprocess.Popen(commandToRun, stdout=subprocess.PIPE, text=True, cwd=cwd)
+    # we read until EOF rather than until the process exits,
+    # so that we never lose the last lines of output
+    with outputCapture.outputBuffer() as outputBuffer:
+        for line in process.stdout:
+            line = line.rstrip()
+            if len(line) > 0:
+                outputBuffer.append(line + "\n")
+                if pythonUtilities.outputIsStreamed():
+                    pythonUtilities.emitOutputLine(line)
+                else:
+                    print(line, flush=True)
+        process.wait()
+        stdoutString = outputBuffer.getvalue()
 
     return process.returncode, stdoutString
 
@@ -121,7 +317,7 @@ def runClicastCommandUsingServer(enviroPath, commandToRun):
     return runClicastServerCommand(enviroPath, commandArgString)
 
 
-def runClicastCommandCommandLine(commandToRun):
+def runClicastCommandCommandLine(commandToRun, cwd=None):
     """
     A wrapper for the subprocess.run() function
     """
@@ -133,6 +329,7 @@ def runClicastCommandCommandLine(commandToRun):
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             shell=True,
+            cwd=cwd,
         )
         returnCode = result.returncode
         rawOutput = result.stdout
@@ -156,34 +353,27 @@ def runClicastScriptUsingServer(enviroPath, commandFileName):
     with open(commandFileName, "r") as f:
         lines = f.read().splitlines()
 
-    returnText = ""
-    for line in lines:
-        # for consistency with the non server version, we stop and
-        # return the exit code of the first command that fails
-        exitCode, commandOutput = runClicastServerCommand(enviroPath, line)
-        returnText += commandOutput
-        if exitCode != 0:
-            break
-
-    return exitCode, returnText
+    return runClicastServerCommands(enviroPath, lines, pipelined=True)
 
 
-def runClicastScriptCommandLine(commandFileName, echoToStdout):
+def runClicastScriptCommandLine(commandFileName, echoToStdout, cwd=None):
     """
     The caller should create a correctly formatted clicast script
-    and then call this with the name of that script
+    and then call this with the path of that script, absolute or relative to cwd
     """
 
     # true at the end tells clicast to exit with the exit code of the first
     # command that fails.  If this is set to false, it always returns 0
-    commandToRun = f"{pythonUtilities.globalClicastCommand} -lc tools execute {commandFileName} true"
-
     if echoToStdout:
-        returnCode, stdoutString = runClicastCommandWithEcho(commandToRun)
+        # a list, since the script path might contain spaces
+        commandToRun = [pythonUtilities.globalClicastCommand, "-lc", "tools"]
+        commandToRun += ["execute", commandFileName, "true"]
+        returnCode, stdoutString = runClicastCommandWithEcho(commandToRun, cwd=cwd)
     else:
-        returnCode, stdoutString = runClicastCommandCommandLine(commandToRun)
+        commandToRun = f'{pythonUtilities.globalClicastCommand} -lc tools execute "{commandFileName}" true'
+        returnCode, stdoutString = runClicastCommandCommandLine(commandToRun, cwd=cwd)
 
-    os.remove(commandFileName)
+    os.remove(os.path.join(cwd or "", commandFileName))
     return returnCode, stdoutString
 
 
@@ -197,25 +387,71 @@ def runClicastScript(enviroPath, commandFileName, echoToStdout=False):
         return runClicastScriptCommandLine(commandFileName, echoToStdout)
 
 
-tempEnviroScript = "rebuild.env"
-tempTestScript = "rebuild.tst"
+def runClicastCommandList(
+    enviroPath, commandList, echoToStdout=False, pipelined=True, noServer=False
+):
+    """
+    Runs a list of clicast commands in the parent directory of enviroPath, and
+    stops at the first command that fails.  In server mode the commands are
+    sent to the clicast instance directly, pipelined unless pipelined is False.
+    Otherwise we write a script with a unique name to the temp directory,
+    so that concurrent jobs never collide, and run it with the parent
+    directory as the cwd, which means that we never have to change the
+    cwd of the server.
+
+    noServer allows the caller to specify that we should run clicast directly
+    """
+    if pythonUtilities.USE_SERVER and not noServer:
+        return runClicastServerCommands(enviroPath, commandList, pipelined)
+    else:
+        enviroDirectory = os.path.dirname(enviroPath)
+        fileHandle, scriptPath = tempfile.mkstemp(prefix="vcast-", suffix=".cmd")
+        with os.fdopen(fileHandle, "w") as commandFile:
+            commandFile.write("".join(f"{command}\n" for command in commandList))
+        # this removes the script
+        return runClicastScriptCommandLine(
+            scriptPath, echoToStdout, cwd=enviroDirectory or None
+        )
+
+
+def shouldEchoOutput():
+    """
+    We echo the output in real-time when we are running from the command
+    line, or when the server is streaming the output to the client
+    """
+    return (not pythonUtilities.USE_SERVER) or pythonUtilities.outputIsStreamed()
 
 
-def updateScriptsAndRebuild(enviroPath, jsonOptions):
+def rebuildScriptNames(enviroName):
     """
-    This does the actual work of updating the scripts
-    and invoking the build and load test script commands
+    Returns unique names for the enviro and test scripts of one rebuild,
+    so that rebuilds of the environments in one directory do not collide
     """
+    jobId = uuid.uuid4().hex[:8]
+    return f"{enviroName}-{jobId}.env", f"{enviroName}-{jobId}.tst"
 
-    enviroName = os.path.basename(enviroPath)
+
+def removeFileIfExists(filePath):
+    try:
+        os.remove(filePath)
+    except OSError:
+        pass
+
+
+def updateEnviroScript(enviroScriptPath, jsonOptions):
+    """
+    Re-writes the enviro script replacing the value of
+    commands that exist in jsonOptions
+    """
+
+    # make a copy since we pop the options that we have used
+    jsonOptions = dict(jsonOptions)
 
     # Read the enviro script into a list of strings
-    with open(tempEnviroScript, "r") as enviroFile:
+    with open(enviroScriptPath, "r") as enviroFile:
         enviroLines = enviroFile.readlines()
 
-    # Re-write the enviro script replacing the value of commands
-    # that exist in the jsonOptions
-    with open(tempEnviroScript, "w") as enviroFile:
+    with open(enviroScriptPath, "w") as enviroFile:
         for line in enviroLines:
             whatToWrite = line
             if line.startswith("ENVIRO.END"):
@@ -238,29 +474,39 @@ def updateScriptsAndRebuild(enviroPath, jsonOptions):
             # write the original or updated line
             enviroFile.write(whatToWrite)
 
+
+def updateScriptsAndRebuild(enviroPath, jsonOptions, enviroScript, testScript):
+    """
+    This does the actual work of updating the scripts
+    and invoking the build and load test script commands
+
+    enviroScript and testScript are relative to the parent directory
+    """
+
+    enviroDirectory = os.path.dirname(enviroPath)
+    enviroName = os.path.basename(enviroPath)
+
+    updateEnviroScript(os.path.join(enviroDirectory, enviroScript), jsonOptions)
+
     # if we are server mode, terminate any existing process
     closeEnvironmentConnection(enviroPath)
 
     # Finally delete and re-build the environment using the updated script
     # and load the existing tests -> which duplicates what enviro rebuild does.
-    with open(commandFileName, "w") as commandFile:
-        # Improvement needed: vcast bug: 100924
-        shutil.rmtree(enviroName)
-        # commandFile.write(f"-e{enviroName} enviro delete\n")
-        commandFile.write(f"-lc enviro build {tempEnviroScript}\n")
-        commandFile.write(f"-e{enviroName} test script run {tempTestScript}\n")
+    # Improvement needed: vcast bug: 100924
+    shutil.rmtree(enviroPath)
+    # f"-e{enviroName} enviro delete"
+    commandList = [
+        f"-lc enviro build {enviroScript}",
+        f"-e{enviroName} test script run {testScript}",
+    ]
 
     # there is no benefit to starting a new server process here (if we are server mode)
-    # so we call the command line version directly
-    returnCodeRebuild, commandOutputRebuild = runClicastScriptCommandLine(
-        commandFileName, echoToStdout=(not pythonUtilities.USE_SERVER)
+    # so we run the command line version directly
+    return runClicastCommandList(
+        enviroPath, commandList, echoToStdout=shouldEchoOutput(), noServer=True
     )
 
-    os.remove(tempEnviroScript)
-    os.remove(tempTestScript)
-
-    return returnCodeRebuild, commandOutputRebuild
-
 
 def rebuildEnvironmentWithUpdates(enviroPath, jsonOptions):
     """
@@ -269,30 +515,39 @@ def rebuildEnvironmentWithUpdates(enviroPath, jsonOptions):
     e.g.  ENVIRO.COVERAGE_TYPE: Statement
 
     We overwrite any matching ENVIRO commands with the new values before rebuild
+
+    We never change the cwd of the server, the scripts are written to the
+    parent directory with unique names, and clicast is run with that directory
+    as its cwd, so rebuilds of different environments can run in parallel
     """
 
-    with cd(os.path.dirname(enviroPath)):
+    enviroDirectory = os.path.dirname(enviroPath)
+    enviroName = os.path.basename(enviroPath)
+    enviroScript, testScript = rebuildScriptNames(enviroName)
+
+    try:
         # first we generate a .env and .tst for the existing environment
-        # we do this using a clicast script
-        enviroName = os.path.basename(enviroPath)
-        with open(commandFileName, "w") as commandFile:
-            commandFile.write(
-                f"-e{enviroName} enviro script create {tempEnviroScript}\n"
-            )
-            commandFile.write(f"-e{enviroName} test script create {tempTestScript}\n")
-        returnCode, commandOutput = runClicastScript(
-            enviroPath, commandFileName, echoToStdout=(not pythonUtilities.USE_SERVER)
+        commandList = [
+            f"-e{enviroName} enviro script create {enviroScript}",
+            f"-e{enviroName} test script create {testScript}",
+        ]
+        returnCode, commandOutput = runClicastCommandList(
+            enviroPath, commandList, echoToStdout=shouldEchoOutput()
         )
 
         # if the script generation was successful, we update the scripts and rebuild
         if returnCode == 0:
             # now we update the scripts and rebuild the environment
             returnCode, commandOutputRebuild = updateScriptsAndRebuild(
-                enviroPath, jsonOptions
+                enviroPath, jsonOptions, enviroScript, testScript
             )
             # concatenate the output from both commands for completeness
             commandOutput = f"{commandOutput}\n{commandOutputRebuild.rstrip()}"
 
+    finally:
+        removeFileIfExists(os.path.join(enviroDirectory, enviroScript))
+        removeFileIfExists(os.path.join(enviroDirectory, testScript))
+
     return returnCode, commandOutput
 
 
@@ -301,12 +556,19 @@ def rebuildEnvironmentUsingClicastReBuild(enviroPath):
     This does a "normal" rebuild environment, when there are no
     edits to be made to the enviro script
     """
-    with cd(os.path.dirname(enviroPath)):
-        enviroName = os.path.basename(enviroPath)
-        commandToRun = (
-            f"{pythonUtilities.globalClicastCommand} -lc -e{enviroName} enviro re_build"
-        )
-        returnCode, commandOutput = runClicastCommandWithEcho(commandToRun)
+    # if we are server mode, terminate any existing process, since
+    # the re_build deletes the environment directory
+    closeEnvironmentConnection(enviroPath)
+
+    # we pass the cwd to the sub-process rather than changing the
+    # server's cwd, so that other environments are not blocked
+    enviroName = os.path.basename(enviroPath)
+    commandToRun = (
+        f"{pythonUtilities.globalClicastCommand} -lc -e{enviroName} enviro re_build"
+    )
+    returnCode, commandOutput = runClicastCommandWithEcho(
+        commandToRun, cwd=os.path.dirname(enviroPath)
+    )
 
     return returnCode, commandOutput
 
@@ -328,28 +590,66 @@ def rebuildEnvironment(enviroPath, jsonOptions):
         return rebuildEnvironmentUsingClicastReBuild(enviroPath)
 
 
-def executeTest(enviroPath, testIDObject):
+def getExecuteArgs(testIDObject):
     # since we are doing a direct call to clicast, we need to quote the parameters
     # separate variable because in the future there will be additional parameters
     shouldQuoteParameters = not pythonUtilities.USE_SERVER
     standardArgs = getStandardArgsFromTestObject(testIDObject, shouldQuoteParameters)
-    # we cannot include the execute command in the command script that we use for
-    # results because we need the return code from the execute command separately
-    commandToRun = (
-        f"{pythonUtilities.globalClicastCommand} -lc {standardArgs} execute run"
-    )
-    executeReturnCode, stdoutText = runClicastCommand(enviroPath, commandToRun)
+    return f"-lc {standardArgs} execute run"
 
+
+def adjustExecuteReturnCode(testIDObject, executeReturnCode, stdoutText):
     # currently clicast returns the same error code for a failed coded test compile or
     # a failed coded test execution.  We need to distinguish between these two cases
     # so we are using this hack until vcast changes the return code for a failed coded test compile
     if testIDObject.functionName == "coded_tests_driver" and executeReturnCode != 0:
         if "TEST RESULT:" not in stdoutText:
             executeReturnCode = errorCodes.codedTestCompileError
+    return executeReturnCode
+
+
+def executeTest(enviroPath, testIDObject):
+    # we cannot include the execute command in the command script that we use for
+    # results because we need the return code from the execute command separately
+    commandToRun = (
+        f"{pythonUtilities.globalClicastCommand} {getExecuteArgs(testIDObject)}"
+    )
+    executeReturnCode, stdoutText = runClicastCommand(enviroPath, commandToRun)
+    executeReturnCode = adjustExecuteReturnCode(
+        testIDObject, executeReturnCode, stdoutText
+    )
 
     return executeReturnCode, stdoutText
 
 
+def executeTests(enviroPath, testIDObjectList, resultCallback):
+    """
+    Executes a list of tests for one environment, resultCallback is called with
+    the index, exit code and output of each test as soon as it completes.
+
+    In server mode the execute commands are pipelined to the clicast instance
+    for the environment.  A clicast script would stop at the first failed
+    test, and would not give us the exit code for each test, so on the command
+    line we still run one clicast process per test.
+    """
+    if pythonUtilities.USE_SERVER:
+        commandList = [
+            getExecuteArgs(testIDObject) for testIDObject in testIDObjectList
+        ]
+
+        def onCommandComplete(index, executeReturnCode, stdoutText):
+            executeReturnCode = adjustExecuteReturnCode(
+                testIDObjectList[index], executeReturnCode, stdoutText
+            )
+            resultCallback(index, executeReturnCode, stdoutText)
+
+        runClicastServerCommandList(enviroPath, commandList, onCommandComplete)
+    else:
+        for index, testIDObject in enumerate(testIDObjectList):
+            executeReturnCode, stdoutText = executeTest(enviroPath, testIDObject)
+            resultCallback(index, executeReturnCode, stdoutText)
+
+
 def generate_report(testObject):
     """
     Generates the our custom report for the test case execution data
@@ -369,8 +669,9 @@ def generate_report(testObject):
 
     test_found = False
 
-    # Open-up the unit test API
-    with UnitTestApi(testObject.enviroName) as api:
+    # Open-up the unit test API, with the full path, since
+    # the server does not change the cwd for the report
+    with UnitTestApi(testObject.enviroPath) as api:
         for test_case in api.TestCase.all():
             # Combined condition to find the correct test case
             if (
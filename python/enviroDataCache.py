@@ -0,0 +1,160 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+"""
+This module keeps an on-disk cache of the getEnviroData results.
+
+Every vTestInterface command line call is a new vpython process, so without
+this cache we open the dataAPI and walk the whole environment each time, even
+when nothing has changed.  The result for each environment is stored as gzip
+compressed JSON in cacheDirectory, along with a key that is built from the
+size, modification time and inode of master.db, cover.db and the coded test
+files that the environment uses.  If any of these change, the key does not
+match and the cache file is ignored, and replaced with the new result.
+
+The key also includes the date, because getTime() shows only the time for the
+tests that were run today, and the VectorCAST installation, since a different
+version might give different data for the same databases.
+"""
+
+import jsonEncoding
+from pythonUtilities import (
+    cleanEnviroPath,
+    getUserCacheDirectory,
+    logDiagnostic,
+    logLevel,
+    makePrivateDirectory,
+)
+
+# Bump this when the format of the cache file or the getEnviroData data changes
+cacheFormatVersion = 1
+
+# Where the cache files are written, one per environment, this
+# is private to the user, see makePrivateDirectory()
+cacheDirectory = getUserCacheDirectory("enviroDataCache")
+
+# Set by the server main(), with --noEnviroDataCache
+enabled = True
+
+# The environment files that the key is built from
+fingerprintFileNames = ["master.db", "cover.db"]
+
+
+def fileFingerprint(filePath):
+    """
+    Returns the size, modification time and inode of filePath, None if it is missing
+    """
+    try:
+        statObject = os.stat(filePath)
+        return [statObject.st_size, statObject.st_mtime_ns, statObject.st_ino]
+    except OSError:
+        return None
+
+
+def getEnviroFingerprint(enviroPath):
+    return [
+        fileFingerprint(os.path.join(enviroPath, fileName))
+        for fileName in fingerprintFileNames
+    ]
+
+
+def buildCacheKey(enviroPath, codedTestFileList):
+    return {
+        "version": cacheFormatVersion,
+        "date": datetime.date.today().isoformat(),
+        "vectorcastDir": os.environ.get("VECTORCAST_DIR", ""),
+        "enviroFiles": getEnviroFingerprint(enviroPath),
+        "codedTestFiles": {
+            filePath: fileFingerprint(filePath) for filePath in codedTestFileList
+        },
+    }
+
+
+def cacheFilePath(enviroPath):
+    keyText = cleanEnviroPath(os.path.abspath(enviroPath))
+    fileName = hashlib.sha1(keyText.encode("utf-8")).hexdigest() + ".json.gz"
+    return os.path.join(cacheDirectory, fileName)
+
+
+def loadEnviroData(enviroPath):
+    """
+    Returns the cached getEnviroData result for enviroPath, or None
+    if there is no cache file, or if the environment has changed
+    """
+    if not enabled:
+        return None
+    try:
+        makePrivateDirectory(cacheDirectory)
+        with open(cacheFilePath(enviroPath), "rb") as cacheFile:
+            cacheData = json.loads(gzip.decompress(cacheFile.read()))
+        cacheKey = cacheData["key"]
+        currentKey = buildCacheKey(enviroPath, list(cacheKey["codedTestFiles"]))
+    except FileNotFoundError:
+        return None
+    except Exception as error:
+        # a corrupt cache file is just a cache miss
+        logDiagnostic(
+            f"  could not read the enviro data cache: {error}", logLevel.verbose
+        )
+        return None
+
+    if cacheKey != currentKey:
+        logDiagnostic(
+            f"  enviro data cache is stale for: {enviroPath}", logLevel.verbose
+        )
+        return None
+
+    logDiagnostic(f"  using cached enviro data for: {enviroPath}", logLevel.verbose)
+    return cacheData["data"]
+
+
+def storeEnviroData(enviroPath, enviroFingerprint, codedTestFileList, topLevel):
+    """
+    enviroFingerprint is the result of getEnviroFingerprint() from before
+    the data was computed, if the environment databases changed while we
+    were computing the data, we don't store it
+    """
+    if not enabled:
+        return
+    cacheKey = buildCacheKey(enviroPath, sorted(codedTestFileList))
+    if cacheKey["enviroFiles"] != enviroFingerprint:
+        logDiagnostic(
+            f"  environment changed while building data for: {enviroPath}",
+            logLevel.info,
+        )
+        return
+
+    cacheData = {"key": cacheKey, "data": topLevel}
+    payload = gzip.compress(
+        jsonEncoding.compactDumps(cacheData).encode("utf-8"),
+        compresslevel=jsonEncoding.compressLevel,
+    )
+    # We write a temp file and rename it so that a crash, or
+    # another process, never sees a partial file
+    tempFilePath = None
+    try:
+        makePrivateDirectory(cacheDirectory)
+        fileHandle, tempFilePath = tempfile.mkstemp(dir=cacheDirectory, suffix=".tmp")
+        with os.fdopen(fileHandle, "wb") as cacheFile:
+            cacheFile.write(payload)
+        os.replace(tempFilePath, cacheFilePath(enviroPath))
+    except OSError as error:
+        logDiagnostic(
+            f"  could not save the enviro data cache: {error}", logLevel.error
+        )
+        if tempFilePath is not None and os.path.exists(tempFilePath):
+            os.remove(tempFilePath)
+
+
+def discardEnviroData(enviroPath):
+    """
+    Called when the environment is re-built, or closed by the client
+    """
+    try:
+        os.remove(cacheFilePath(enviroPath))
+    except OSError:
+        pass
@@ -0,0 +1,184 @@
+import itertools
+import threading
+import uuid
+
+"""
+This module supports incremental getEnviroData responses for the data server.
+
+The server keeps the last getEnviroData snapshot for each environment, along
+with a version token that is returned to the client.  When the client sends
+that token back with the next request, we return only the units, functions,
+tests, and coverage entries that were added, changed, or removed since then.
+
+Delta response format:
+    versionToken:      the token for the new snapshot
+    baseVersionToken:  the token the delta was computed against
+    delta:
+        units:      added: [unitNode], changed: [unitNode], removed: [unitKey]
+        functions:  added: [functionNode], changed: [functionNode], removed: [functionKey]
+        tests:      added: [testInfo], changed: [testInfo], removed: [testKey]
+        unitData:   added: [unitInfo], changed: [unitInfo], removed: [path]
+
+Unit nodes have no "functions", and function nodes have no "tests", the
+function and test nodes have a "unit" field, and the test nodes have a
+"function" field, so that the client can find the parent node.  The
+"Compound Tests" and "Initialization Tests" nodes are treated as units
+and their tests use an empty string for the "function" field.
+
+This module also holds the getEnviroData results computed by the pre-warm
+thread, see enviroPrewarm.py, the first getEnviroData request for the
+environment uses that result if the environment databases have not changed.
+"""
+
+from pythonUtilities import cleanEnviroPath
+from unitTestApiCache import getFingerprint
+
+# Key is the clean enviro path, value is a enviroSnapshot
+enviroSnapshots = dict()
+enviroSnapshotsLock = threading.Lock()
+
+# Makes the tokens unique across server restarts
+tokenPrefix = uuid.uuid4().hex[:8]
+tokenCounter = itertools.count(1)
+
+# Key is the clean enviro path, value is a (fingerprint, topLevel) tuple
+prewarmedData = dict()
+
+
+class enviroSnapshot:
+    def __init__(self, token, topLevel):
+        self.token = token
+        self.units, self.functions, self.tests = flattenTestData(topLevel["testData"])
+        self.unitData = {
+            unitInfo["path"]: unitInfo for unitInfo in topLevel["unitData"]
+        }
+
+
+def newToken():
+    return f"{tokenPrefix}-{next(tokenCounter)}"
+
+
+def flattenTestData(testData):
+    """
+    This function will convert the testData tree created by getTestDataVCAST()
+    into three dictionaries of units, functions and tests, keyed by name tuples
+    """
+    units = dict()
+    functions = dict()
+    tests = dict()
+
+    for unitNode in testData:
+        unitName = unitNode["name"]
+        units[unitName] = {
+            key: value
+            for key, value in unitNode.items()
+            if key not in ["functions", "tests"]
+        }
+
+        # Compound and Init nodes have tests but no functions
+        for testInfo in unitNode.get("tests", []):
+            testKey = (unitName, "", testInfo["testName"])
+            tests[testKey] = dict(testInfo, unit=unitName, function="")
+
+        for functionNode in unitNode.get("functions", []):
+            functionName = functionNode["name"]
+            functions[(unitName, functionName)] = dict(
+                {key: value for key, value in functionNode.items() if key != "tests"},
+                unit=unitName,
+            )
+            for testInfo in functionNode["tests"]:
+                testKey = (unitName, functionName, testInfo["testName"])
+                tests[testKey] = dict(testInfo, unit=unitName, function=functionName)
+
+    return units, functions, tests
+
+
+def diffDictionaries(oldItems, newItems, removedKeyToJson):
+    """
+    Returns the added, changed, removed dictionary for the items
+    """
+    added = []
+    changed = []
+    for key, value in newItems.items():
+        if key not in oldItems:
+            added.append(value)
+        elif oldItems[key] != value:
+            changed.append(value)
+
+    removed = [removedKeyToJson(key) for key in oldItems if key not in newItems]
+
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def computeDelta(oldSnapshot, newSnapshot):
+    delta = dict()
+    delta["units"] = diffDictionaries(
+        oldSnapshot.units, newSnapshot.units, lambda key: key
+    )
+    delta["functions"] = diffDictionaries(
+        oldSnapshot.functions,
+        newSnapshot.functions,
+        lambda key: {"unit": key[0], "name": key[1]},
+    )
+    delta["tests"] = diffDictionaries(
+        oldSnapshot.tests,
+        newSnapshot.tests,
+        lambda key: {"unit": key[0], "function": key[1], "testName": key[2]},
+    )
+    delta["unitData"] = diffDictionaries(
+        oldSnapshot.unitData, newSnapshot.unitData, lambda key: key
+    )
+    return delta
+
+
+def buildVersionedResponse(enviroPath, topLevel, previousToken):
+    """
+    topLevel is the full getEnviroData response, we save a snapshot of it
+    and return either the full response or the delta against previousToken,
+    in both cases with the new version token added
+    """
+    key = cleanEnviroPath(enviroPath)
+    newSnapshot = enviroSnapshot(newToken(), topLevel)
+
+    with enviroSnapshotsLock:
+        oldSnapshot = enviroSnapshots.get(key)
+        enviroSnapshots[key] = newSnapshot
+
+    if previousToken and oldSnapshot is not None and oldSnapshot.token == previousToken:
+        returnObject = dict()
+        returnObject["versionToken"] = newSnapshot.token
+        returnObject["baseVersionToken"] = previousToken
+        returnObject["delta"] = computeDelta(oldSnapshot, newSnapshot)
+        returnObject["enviro"] = topLevel["enviro"]
+        returnObject["mockingSupport"] = topLevel["mockingSupport"]
+    else:
+        returnObject = topLevel
+        returnObject["versionToken"] = newSnapshot.token
+
+    return returnObject
+
+
+def discardSnapshot(enviroPath):
+    """
+    Called when the environment is closed, or re-built
+    """
+    with enviroSnapshotsLock:
+        enviroSnapshots.pop(cleanEnviroPath(enviroPath), None)
+        prewarmedData.pop(cleanEnviroPath(enviroPath), None)
+
+
+def storePrewarmedData(enviroPath, fingerprint, topLevel):
+    with enviroSnapshotsLock:
+        prewarmedData[cleanEnviroPath(enviroPath)] = (fingerprint, topLevel)
+
+
+def takePrewarmedData(enviroPath):
+    """
+    Returns the pre-warmed getEnviroData result for enviroPath and removes it,
+    or None if there is no result, or if the environment has changed since
+    """
+    with enviroSnapshotsLock:
+        entry = prewarmedData.pop(cleanEnviroPath(enviroPath), None)
+    if entry is not None and entry[0] == getFingerprint(enviroPath):
+        return entry[1]
+    return None
@@ -0,0 +1,200 @@
+import json
+import os
+import queue
+import threading
+import time
+
+"""
+This module pre-warms environments for the data server.
+
+The first request for an environment pays for the dataAPI open, the clicast
+instance start, and the getEnviroData computation.  The server keeps a most
+recently used list of environment paths in a file next to the server log, and
+on startup, or when it receives a prewarm command, it does this work for those
+environments on a background thread.
+
+The clicast instances are started in parallel as soon as the environments
+are queued.  The rest of the work is done by a thread that runs at low
+priority: it processes one environment at a time, holds the environment lock
+while it is working on an environment, and waits until there are no client
+requests running before it starts.
+"""
+
+import enviroDataVersions
+import pythonUtilities
+import serverMetrics
+import unitTestApiCache
+import vTestInterface
+from pythonUtilities import cleanEnviroPath, logLevel, logMessage
+
+# Maximum number of paths in the MRU list, also the number of
+# environments that are pre-warmed on startup.  Set by the server main()
+maxMruSize = 5
+
+# The file that we persist the MRU list to, set by startPrewarmThread()
+mruFilePath = None
+
+# The most recently used path is first
+mruList = []
+mruLock = threading.Lock()
+
+# The paths waiting to be pre-warmed
+prewarmQueue = queue.Queue()
+
+prewarmThread = None
+
+# How long the pre-warm thread sleeps while it waits for the server to be idle
+idlePollInterval = 0.1
+
+
+def loadMruList():
+    """
+    Reads the MRU list from mruFilePath, a missing
+    or corrupt file just gives an empty list
+    """
+    global mruList
+    try:
+        with open(mruFilePath, "r") as mruFile:
+            pathList = json.load(mruFile)
+        mruList = [path for path in pathList if isinstance(path, str)][:maxMruSize]
+    except (OSError, ValueError):
+        mruList = []
+
+
+def saveMruList():
+    """
+    The caller must hold mruLock, we write a temp file and
+    rename it so that a crash never leaves a partial file
+    """
+    if mruFilePath is None:
+        return
+    tempFilePath = mruFilePath + ".tmp"
+    try:
+        with open(tempFilePath, "w") as mruFile:
+            json.dump(mruList, mruFile, indent=4)
+        os.replace(tempFilePath, mruFilePath)
+    except OSError as error:
+        logMessage(f"  could not save the MRU list: {error}", logLevel.error)
+
+
+def recordEnviroUse(enviroPath):
+    """
+    Moves enviroPath to the front of the MRU list, the file
+    is only written when the order of the list changes
+    """
+    if maxMruSize <= 0:
+        return
+    key = cleanEnviroPath(enviroPath)
+    with mruLock:
+        if len(mruList) > 0 and mruList[0] == key:
+            return
+        if key in mruList:
+            mruList.remove(key)
+        mruList.insert(0, key)
+        del mruList[maxMruSize:]
+        saveMruList()
+
+
+def forgetEnviro(enviroPath):
+    """
+    Called when the client closes the connection to an environment
+    """
+    key = cleanEnviroPath(enviroPath)
+    with mruLock:
+        if key in mruList:
+            mruList.remove(key)
+            saveMruList()
+
+
+def getMruList():
+    with mruLock:
+        return list(mruList)
+
+
+def waitForIdleServer():
+    """
+    Client requests always have priority over the pre-warm work
+    """
+    while serverMetrics.activeRequests > 0 or serverMetrics.queueDepth > 0:
+        time.sleep(idlePollInterval)
+
+
+def isValidEnviro(enviroPath):
+    return os.path.isfile(os.path.join(enviroPath, "master.db"))
+
+
+def prewarmEnvironment(enviroPath):
+    """
+    Opens the dataAPI and computes the environment data
+    for enviroPath, if it is a valid environment
+    """
+    if not isValidEnviro(enviroPath):
+        logMessage(f"  skipping pre-warm for invalid environment: {enviroPath}")
+        return
+
+    startTime = time.perf_counter()
+
+    waitForIdleServer()
+    with pythonUtilities.getEnviroLock(enviroPath):
+        # the dataAPI handle stays open on the enviroThread, which is
+        # the thread that will serve the requests for the environment
+        enviroData = unitTestApiCache.runOnEnviroThread(
+            enviroPath, vTestInterface.buildEnviroData, enviroPath
+        )
+        enviroDataVersions.storePrewarmedData(
+            enviroPath, unitTestApiCache.getFingerprint(enviroPath), enviroData
+        )
+
+    logMessage(
+        f"  pre-warmed environment: {enviroPath} in {time.perf_counter() - startTime:.3f}s"
+    )
+
+
+def prewarmWorker():
+    while True:
+        enviroPath = prewarmQueue.get()
+        try:
+            prewarmEnvironment(enviroPath)
+        except Exception as error:
+            logMessage(f"  pre-warm failed for: {enviroPath}: {error}", logLevel.error)
+
+
+def prewarmEnvironments(pathList):
+    """
+    Queues the environments in pathList to be pre-warmed, and returns the
+    list of clean paths that were queued
+    """
+    queuedPaths = []
+    for enviroPath in pathList:
+        key = cleanEnviroPath(enviroPath)
+        if key not in queuedPaths:
+            queuedPaths.append(key)
+            prewarmQueue.put(key)
+
+    # this does not block, the instances are started on a thread pool
+    pythonUtilities.startClicastInstances(
+        [enviroPath for enviroPath in queuedPaths if isValidEnviro(enviroPath)]
+    )
+    return queuedPaths
+
+
+def startPrewarmThread(filePath):
+    """
+    Called by the server warm-up, loads the MRU list from
+    filePath and queues those environments to be pre-warmed
+    """
+    global mruFilePath
+    global prewarmThread
+
+    with mruLock:
+        mruFilePath = filePath
+        loadMruList()
+        pathList = list(mruList)
+
+    if prewarmThread is None:
+        prewarmThread = threading.Thread(
+            target=prewarmWorker, name="prewarm", daemon=True
+        )
+        prewarmThread.start()
+
+    return prewarmEnvironments(pathList)
@@ -0,0 +1,125 @@
+import gzip
+import json
+import zlib
+
+"""
+This module does the JSON encoding of the responses for the data server
+and the vTestInterface command line, and the compression of the server
+responses based on the Accept-Encoding header sent by the client.
+
+If orjson or ujson is available we use it for the compact encoding since
+they are much faster than the standard json module for large responses.
+"""
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Responses smaller than this are not worth compressing
+minimumCompressSize = 1024
+
+# This is a good balance between speed and size for JSON text
+compressLevel = 5
+
+# The encodings that we support, in order of preference
+supportedEncodings = ["gzip", "deflate"]
+
+
+def encoderName():
+    if orjson is not None:
+        return "orjson"
+    elif ujson is not None:
+        return "ujson"
+    else:
+        return "json"
+
+
+def compactDumps(data):
+    """
+    Returns data as JSON text without any whitespace
+    """
+    # the accelerated encoders do not handle everything that json
+    # does, for example non-string keys, so we fall back on errors.
+    # We always return ASCII text like json.dumps() does by default, since
+    # the command line output is printed to consoles that might not be UTF-8
+    if orjson is not None:
+        try:
+            returnText = orjson.dumps(data).decode("utf-8")
+            if returnText.isascii():
+                return returnText
+        except TypeError:
+            pass
+    elif ujson is not None:
+        try:
+            return ujson.dumps(data, ensure_ascii=True)
+        except (TypeError, OverflowError):
+            pass
+    return json.dumps(data, separators=(",", ":"))
+
+
+def dumps(data, compact=True):
+    if compact:
+        return compactDumps(data)
+    else:
+        return json.dumps(data, indent=4)
+
+
+def parseAcceptEncoding(headerValue):
+    """
+    Returns a dictionary of encoding name to quality value
+    """
+    qualities = dict()
+    for item in (headerValue or "").split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parts[1:]:
+            parameter = parameter.strip()
+            if parameter.startswith("q="):
+                try:
+                    quality = float(parameter[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def chooseEncoding(headerValue):
+    """
+    Returns the encoding to use for the response, or None for no compression
+    """
+    qualities = parseAcceptEncoding(headerValue)
+    bestEncoding = None
+    bestQuality = 0.0
+    for encoding in supportedEncodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > bestQuality:
+            bestEncoding = encoding
+            bestQuality = quality
+    return bestEncoding
+
+
+def compressPayload(payload, acceptEncoding):
+    """
+    payload is bytes, returns the (possibly compressed) payload and the
+    value for the Content-Encoding header, None if it was not compressed
+    """
+    if len(payload) < minimumCompressSize:
+        return payload, None
+
+    encoding = chooseEncoding(acceptEncoding)
+    if encoding == "gzip":
+        return gzip.compress(payload, compresslevel=compressLevel), encoding
+    elif encoding == "deflate":
+        # HTTP deflate is the zlib format, not raw deflate
+        return zlib.compress(payload, compressLevel), encoding
+    else:
+        return payload, None
@@ -0,0 +1,98 @@
+import collections
+import tempfile
+
+"""
+This module collects the output of clicast commands.
+
+Building the output with string concatenation is quadratic for the large
+outputs of builds and test script loads, so the outputBuffer class appends
+to a SpooledTemporaryFile, which is kept in memory until it reaches
+spoolThreshold characters, and is then moved to a temporary file.
+
+In "truncate" mode we only keep the first headSize and the last tailSize
+characters, so the memory used does not depend on how much clicast writes.
+"""
+
+# The output modes, set by the server main()
+fullOutput = "full"
+truncateOutput = "truncate"
+outputModes = [fullOutput, truncateOutput]
+outputMode = fullOutput
+
+# Number of characters that are kept in memory before the output is spooled
+spoolThreshold = 1024 * 1024
+
+# Number of characters kept from the start and end of the output in truncate mode
+headSize = 64 * 1024
+tailSize = 256 * 1024
+
+
+class outputBuffer:
+    def __init__(self, mode=None):
+        self.mode = mode or outputMode
+        self.length = 0
+        if self.mode == truncateOutput:
+            self.head = []
+            self.headLength = 0
+            self.tail = collections.deque()
+            self.tailLength = 0
+            self.omittedLength = 0
+        else:
+            self.spoolFile = tempfile.SpooledTemporaryFile(
+                max_size=spoolThreshold, mode="w+", encoding="utf-8", newline=""
+            )
+
+    def append(self, text):
+        if len(text) == 0:
+            return
+        self.length += len(text)
+        if self.mode == truncateOutput:
+            self.appendTruncated(text)
+        else:
+            self.spoolFile.write(text)
+
+    def appendTruncated(self, text):
+        if self.headLength < headSize:
+            headPart = text[: headSize - self.headLength]
+            self.head.append(headPart)
+            self.headLength += len(headPart)
+            text = text[len(headPart) :]
+
+        if len(text) > 0:
+            self.tail.append(text)
+            self.tailLength += len(text)
+            # drop the oldest chunks, and trim the oldest remaining chunk
+            while self.tailLength - len(self.tail[0]) >= tailSize:
+                self.omittedLength += len(self.tail[0])
+                self.tailLength -= len(self.tail[0])
+                self.tail.popleft()
+            excess = self.tailLength - tailSize
+            if excess > 0:
+                self.tail[0] = self.tail[0][excess:]
+                self.tailLength -= excess
+                self.omittedLength += excess
+
+    def getvalue(self):
+        if self.mode == truncateOutput:
+            returnList = list(self.head)
+            if self.omittedLength > 0:
+                returnList.append(
+                    f"\n... {self.omittedLength} characters of output omitted ...\n"
+                )
+            returnList.extend(self.tail)
+            return "".join(returnList)
+        else:
+            self.spoolFile.seek(0)
+            returnText = self.spoolFile.read()
+            self.spoolFile.seek(0, 2)
+            return returnText
+
+    def close(self):
+        if self.mode != truncateOutput:
+            self.spoolFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,10 +1,20 @@
+import collections
+import concurrent.futures
+import contextlib
 import datetime
+import getpass
 import os
+import queue
+import stat
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 import re
-from vector.apps.DataAPI.configuration import EnvironmentMixin
+
+# Note: the vector modules are imported in the functions that use them,
+# so that importing this module does not slow down the server startup
 
 # This contains the clicast command that was used to start the data server
 globalClicastCommand = ""
@@ -14,82 +24,805 @@ globalClicastCommand = ""
 # of vcastDataServer.py
 USE_SERVER = False
 
-# Key is the path to the environment, value is the process object
-# for the clicast instance for that environment
-clicastInstances = {}
+# Key is the directory that contains the environments, value is the
+# clicastProcess object for the clicast instance for that directory.
+# The order of the dictionary is the least to most recently used.
+#
+# Each clicast instance is started in the parent directory of the environment
+# and every command has a -e<enviroName> argument, so one instance is shared
+# by all of the environments in a directory, see clicastInstanceKey()
+clicastInstances = collections.OrderedDict()
+clicastInstancesLock = threading.RLock()
+
+# The number of times lockClicastInstance() gets a new instance, when
+# the one it is waiting for is closed before it gets the commandLock
+maxInstanceLockAttempts = 3
+
+# Key is the clicast instance key, value is the future for a clicast
+# instance that is being started, so that concurrent requests wait for
+# the same start rather than starting a second instance
+pendingClicastStarts = {}
+
+# The clicast instances are started on this pool, so that we can start
+# the instances for several environments at the same time
+clicastStartExecutor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="clicastStart"
+)
+
+# Number of seconds that we wait for clicast to report that the server started
+clicastStartTimeout = 5
+
+# Number of seconds that we wait for a clicast instance to exit after we
+# send the shutdown command, and then after we terminate it, before we kill it
+clicastShutdownTimeout = 5
+clicastTerminateTimeout = 2
+
+# Set when the server is shutting down, so that no new instances are started
+clicastShutdownStarted = False
+
+# Number of seconds that a single clicast server command can take before
+# we kill the clicast instance, 0 to disable.  Set by the server main()
+clicastCommandTimeout = 1800
+
+# Key is the request ID, value is the requestState for the running requests
+runningRequests = {}
+
+# IDs of the requests that were cancelled before they started, oldest first
+earlyCancels = collections.OrderedDict()
+maxEarlyCancels = 100
+requestsLock = threading.Lock()
+
+# The requestState for the request that the current thread is processing
+currentRequestData = threading.local()
+
+# Maximum number of clicast instances, when we need to start a new one
+# the least recently used idle instance is shut down.  Set by the server main()
+maxClicastInstances = 8
+
+# Number of seconds that a clicast instance can be unused before
+# the reaper thread shuts it down, 0 to disable.  Set by the server main()
+clicastIdleTimeout = 600
+
+clicastReaperThread = None
+
+# Number of seconds between the checks of the health monitor, which
+# respawns the clicast instances that have died, 0 to disable.
+# Set by the server main()
+clicastHealthInterval = 30
+
+# If True, the health monitor also sends clicastProbeCommand to the idle
+# instances, and replaces the ones that do not respond within clicastProbeTimeout.
+# Any response proves that the instance is alive, so the exit code is ignored
+clicastHealthProbe = False
+clicastProbeCommand = "-lc tools version"
+clicastProbeTimeout = 10
+
+# An instance directory that crashes flapThreshold times in flapWindow seconds
+# is quarantined for quarantineSeconds, during which it is not respawned by
+# the health monitor, it is only started when a request needs it
+flapThreshold = 3
+flapWindow = 600
+quarantineSeconds = 600
+
+# Key is the clicast instance key, value is the list of crash times in
+# the flapWindow, and the total number of crashes for the instance key
+crashTimes = {}
+crashCounts = {}
+
+# Key is the clicast instance key, value is the time the quarantine ends
+quarantinedInstances = {}
+
+clicastHealthThread = None
+
+# Key is the cleaned path to the environment, value is the lock that
+# serializes server requests for that environment.  Requests for different
+# environments run in parallel, but the clicast server protocol and the
+# dataAPI handles are not safe to share between threads.
+enviroLocks = {}
+enviroLocksGuard = threading.Lock()
+
+# The current working directory is process wide, so any code that needs
+# to cd into an environment directory must hold this lock while it is there
+cwdLock = threading.RLock()
+
+
+def getEnviroLock(enviroPath):
+    """
+    This function will return the lock for the given environment,
+    creating it on first use
+    """
+    enviroPath = cleanEnviroPath(enviroPath)
+    with enviroLocksGuard:
+        if enviroPath not in enviroLocks:
+            enviroLocks[enviroPath] = threading.RLock()
+        return enviroLocks[enviroPath]
+
+
+# When a request is processed by the streaming route, this holds the
+# callback that receives each line of clicast output as it is read
+outputListenerData = threading.local()
+
+
+def setOutputListener(callback, recordCallback=None):
+    """
+    This function sets the output listener for the current thread,
+    pass None to remove the listener.  The optional recordCallback is
+    called with the records that commands like executeTests emit
+    """
+    outputListenerData.callback = callback
+    outputListenerData.recordCallback = recordCallback
+
+
+def getOutputListener():
+    """
+    Returns the callbacks of the current thread, so that a command that
+    uses helper threads can pass them to setOutputListener() on those threads
+    """
+    return (
+        getattr(outputListenerData, "callback", None),
+        getattr(outputListenerData, "recordCallback", None),
+    )
+
+
+def outputIsStreamed():
+    return getattr(outputListenerData, "callback", None) is not None
+
+
+def emitOutputLine(line):
+    """
+    This function is called for each line of clicast output, and will
+    forward the line to the output listener of the current thread if any
+    """
+    callback = getattr(outputListenerData, "callback", None)
+    if callback is not None:
+        callback(line.rstrip("\n"))
+
+
+def emitRecord(record):
+    """
+    This function forwards a partial result record, which is a dictionary,
+    to the record listener of the current thread if any
+    """
+    recordCallback = getattr(outputListenerData, "recordCallback", None)
+    if recordCallback is not None:
+        recordCallback(record)
+
+
+@contextlib.contextmanager
+def changeDirectory(path):
+    """
+    Thread safe replacement for vector.lib.core.system.cd()
+    """
+    from vector.lib.core.system import cd
+
+    with cwdLock:
+        with cd(path):
+            yield
+
+
+class clicastProcess:
+    """
+    This wraps the process object for a clicast instance.  A reader thread
+    copies the stdout lines into a queue, so that readline() can use a
+    timeout, which works for pipes on all platforms.
+    """
+
+    def __init__(self, processObject):
+        self.processObject = processObject
+        self.pid = processObject.pid
+        self.stdin = processObject.stdin
+        self.lineQueue = queue.Queue()
+        self.sawEOF = False
+        self.startTime = time.time()
+        self.lastUsed = self.startTime
+        self.commandCount = 0
+        # the names of the environments that have sent commands to this instance
+        self.enviroNames = set()
+        # the clicast server runs one command at a time, so the requests for
+        # the environments that share this instance must hold this lock
+        self.commandLock = threading.Lock()
+        self.readerThread = threading.Thread(
+            target=self.readOutput, name=f"clicastReader-{self.pid}", daemon=True
+        )
+        self.readerThread.start()
+
+    def readOutput(self):
+        try:
+            for line in self.processObject.stdout:
+                self.lineQueue.put(line)
+        except (OSError, ValueError):
+            pass
+        # None marks the end of the output
+        self.lineQueue.put(None)
+
+    def readline(self, timeout=None):
+        """
+        Returns the next line of output, an empty string at
+        the end of the output, or None if timeout expires
+        """
+        if self.sawEOF:
+            return ""
+        try:
+            line = self.lineQueue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if line is None:
+            self.sawEOF = True
+            return ""
+        return line
+
+    def poll(self):
+        return self.processObject.poll()
+
+    def wait(self, timeout=None):
+        return self.processObject.wait(timeout)
+
+    def terminate(self):
+        try:
+            self.processObject.terminate()
+        except OSError:
+            pass
+
+    def kill(self):
+        try:
+            self.processObject.kill()
+        except OSError:
+            pass
+
+
+class requestState:
+    def __init__(self, requestId):
+        self.requestId = requestId
+        self.cancelled = False
+        # the clicast instance that is running a command for this request
+        self.clicastProcess = None
+
+
+def startRequest(requestId):
+    """
+    Called by the server before it processes a request, requestId is the
+    optional ID that the client can use to cancel the request
+    """
+    state = requestState(requestId)
+    if requestId:
+        with requestsLock:
+            runningRequests[requestId] = state
+            if earlyCancels.pop(requestId, None) is not None:
+                state.cancelled = True
+    currentRequestData.state = state
+
+
+def endRequest():
+    state = getattr(currentRequestData, "state", None)
+    if state is not None and state.requestId:
+        with requestsLock:
+            if runningRequests.get(state.requestId) is state:
+                del runningRequests[state.requestId]
+    currentRequestData.state = None
+
+
+def getRequestState():
+    return getattr(currentRequestData, "state", None)
+
+
+def setRequestState(state):
+    """
+    Used by helper threads to share the state of the request they are working
+    for, the thread that called startRequest() is responsible for endRequest()
+    """
+    currentRequestData.state = state
+
+
+def requestIsCancelled():
+    state = getattr(currentRequestData, "state", None)
+    return state is not None and state.cancelled
+
+
+def setRunningClicastProcess(processObject):
+    """
+    Records the clicast instance that is running a command for the
+    current request, so that cancelRequest() can kill it
+    """
+    state = getattr(currentRequestData, "state", None)
+    if state is not None:
+        with requestsLock:
+            state.clicastProcess = processObject
+
+
+def cancelRequest(requestId):
+    """
+    Cancels the request with requestId.  The clicast server protocol has no way
+    to abort a command, so if the request is running a clicast command we kill
+    the clicast instance.  Returns "running" if the request was running, or
+    "pending" if it has not started, or has already finished
+    """
+    with requestsLock:
+        state = runningRequests.get(requestId)
+        if state is None:
+            earlyCancels[requestId] = True
+            while len(earlyCancels) > maxEarlyCancels:
+                earlyCancels.popitem(last=False)
+            return "pending"
+        state.cancelled = True
+        processObject = state.clicastProcess
+
+    if processObject is not None:
+        logMessage(
+            f"  killing clicast instance [{processObject.pid}] to cancel request: {requestId}"
+        )
+        processObject.kill()
+    return "running"
+
+
+def discardClicastInstance(enviroPath, processObject, isCrash=True):
+    """
+    Called when a clicast instance hangs, dies or is killed during a command,
+    the instance is killed and a replacement is started in the background.
+    isCrash is False when the instance is fine, but has commands queued that
+    must not run, these do not count towards the quarantine
+    """
+    processObject.kill()
+    try:
+        processObject.wait(5)
+    except subprocess.TimeoutExpired:
+        pass
+    removeClicastInstance(enviroPath, processObject)
+    instanceKey = clicastInstanceKey(enviroPath)
+    # a kill by a cancel request is not a problem with the instance
+    if isCrash and not requestIsCancelled():
+        recordClicastCrash(instanceKey, f"instance [{processObject.pid}] was discarded")
+    if isQuarantined(instanceKey):
+        logMessage(
+            f"  discarded clicast instance [{processObject.pid}] for: {enviroPath}",
+            logLevel.error,
+        )
+    else:
+        logMessage(
+            f"  discarded clicast instance [{processObject.pid}] for: {enviroPath}, starting a new one",
+            logLevel.error,
+        )
+        getClicastInstanceFuture(enviroPath)
+
+
+def clicastInstanceKey(enviroPath):
+    """
+    Returns the key for the clicast instance that enviroPath uses,
+    which is the clean path to the directory that contains the environment
+    """
+    return os.path.dirname(cleanEnviroPath(enviroPath).rstrip("/"))
 
 
 def setClicastInstance(enviroPath, processObject):
     """
     This function will set the clicast instance for the given environment
     """
-    enviroPath = cleanEnviroPath(enviroPath)
-    clicastInstances[enviroPath] = processObject
+    with clicastInstancesLock:
+        clicastInstances[clicastInstanceKey(enviroPath)] = processObject
 
 
-def removeClicastInstance(enviroPath):
+def removeClicastInstance(enviroPath, processObject=None):
     """
     This function will remove the clicast instance for the given environment
-    This should be called AFTER the process has been terminated
+    This should be called AFTER the process has been terminated.  If
+    processObject is given, we only remove the instance if it is that object
     """
-    enviroPath = cleanEnviroPath(enviroPath)
-    if enviroPath in clicastInstances:
-        del clicastInstances[enviroPath]
+    instanceKey = clicastInstanceKey(enviroPath)
+    with clicastInstancesLock:
+        if processObject is None or clicastInstances.get(instanceKey) is processObject:
+            clicastInstances.pop(instanceKey, None)
+
+
+def recordClicastCommand(enviroPath):
+    """
+    Called for each command sent to the clicast instance for enviroPath
+    """
+    with clicastInstancesLock:
+        processObject = clicastInstances.get(clicastInstanceKey(enviroPath))
+        if processObject is not None:
+            processObject.lastUsed = time.time()
+            processObject.commandCount += 1
+            processObject.enviroNames.add(os.path.basename(enviroPath))
+
+
+def getClicastInstanceStatus():
+    """
+    Returns a list with the usage information for each clicast
+    instance, from the least to the most recently used
+    """
+    returnList = []
+    with clicastInstancesLock:
+        for instanceKey, processObject in clicastInstances.items():
+            returnList.append(
+                {
+                    "directory": instanceKey,
+                    "enviros": sorted(processObject.enviroNames),
+                    "pid": processObject.pid,
+                    "idleSeconds": round(time.time() - processObject.lastUsed, 1),
+                    "commandCount": processObject.commandCount,
+                }
+            )
+    return returnList
+
+
+def waitForClicastExit(processObjectList, timeout):
+    """
+    Waits until all of the processes have exited, or timeout seconds
+    have passed, and returns the list of processes that are still running
+    """
+    deadline = time.time() + timeout
+    for processObject in processObjectList:
+        try:
+            processObject.wait(max(deadline - time.time(), 0))
+        except subprocess.TimeoutExpired:
+            pass
+    return [
+        processObject
+        for processObject in processObjectList
+        if processObject.poll() is None
+    ]
+
+
+def stopClicastProcesses(processObjectList):
+    """
+    Sends the shutdown command to all of the processes, and then escalates to
+    terminate and kill for the ones that do not exit in time.  Each step signals
+    all of the processes before it waits, so the time taken is bounded by the
+    slowest process, not the sum of them
+    """
+    for processObject in processObjectList:
+        # In the case where the server has been stopped with ctrl-c
+        # we get here, but the clicast process might have already died
+        # from the propagated SIGINT, so we need to catch the exception
+        try:
+            processObject.stdin.write("clicast-server-shutdown\n")
+            processObject.stdin.flush()
+        except (OSError, ValueError):
+            pass
+    runningList = waitForClicastExit(processObjectList, clicastShutdownTimeout)
+
+    if len(runningList) > 0:
+        logMessage(
+            f"  terminating clicast instances that did not shut down: {[p.pid for p in runningList]}",
+            logLevel.error,
+        )
+        for processObject in runningList:
+            processObject.terminate()
+        runningList = waitForClicastExit(runningList, clicastTerminateTimeout)
+
+    if len(runningList) > 0:
+        logMessage(
+            f"  killing clicast instances that did not terminate: {[p.pid for p in runningList]}",
+            logLevel.error,
+        )
+        for processObject in runningList:
+            processObject.kill()
+        runningList = waitForClicastExit(runningList, clicastTerminateTimeout)
+
+    return runningList
+
+
+def shutdownClicastInstance(instanceKey, processObject):
+    """
+    This tells clicast to shutdown gracefully, the caller must hold
+    the commandLock of the instance, unless the server is exiting
+    """
+    logMessage(
+        f"  terminating clicast instance [{processObject.pid}] for directory: {instanceKey}"
+    )
+    stopClicastProcesses([processObject])
+    # This simply removes the processObject from the dictionary
+    with clicastInstancesLock:
+        if clicastInstances.get(instanceKey) is processObject:
+            del clicastInstances[instanceKey]
+
+
+def closeIdleClicastInstance(instanceKey, reason):
+    """
+    Shuts down the clicast instance for instanceKey, unless it is running
+    a command, returns True if the instance was shut down
+    """
+    with clicastInstancesLock:
+        processObject = clicastInstances.get(instanceKey)
+    if processObject is None or not processObject.commandLock.acquire(blocking=False):
+        return False
+    try:
+        logMessage(f"  closing {reason} clicast instance for: {instanceKey}")
+        shutdownClicastInstance(instanceKey, processObject)
+        return True
+    finally:
+        processObject.commandLock.release()
+
+
+def evictClicastInstances(keepKey):
+    """
+    Shuts down the least recently used instances until there is room for
+    a new instance, instances that are running commands are skipped
+    """
+    with clicastInstancesLock:
+        # we never wait for an instance that is being started, since
+        # that start might be waiting for us to make room
+        candidateList = [
+            instanceKey
+            for instanceKey in clicastInstances
+            if instanceKey != keepKey and instanceKey not in pendingClicastStarts
+        ]
+        numberToClose = len(clicastInstances) - max(maxClicastInstances, 1) + 1
+
+    for instanceKey in candidateList:
+        if numberToClose <= 0:
+            break
+        if closeIdleClicastInstance(instanceKey, "least recently used"):
+            numberToClose -= 1
+
+
+def clicastReaper():
+    while True:
+        time.sleep(max(min(clicastIdleTimeout / 4, 60), 1))
+        now = time.time()
+        with clicastInstancesLock:
+            idleList = [
+                instanceKey
+                for instanceKey, processObject in clicastInstances.items()
+                if now - processObject.lastUsed > clicastIdleTimeout
+            ]
+        for instanceKey in idleList:
+            closeIdleClicastInstance(instanceKey, "idle")
+
+
+def startClicastReaper():
+    """
+    Called by the server to shut down the clicast instances that
+    have not been used for clicastIdleTimeout seconds
+    """
+    global clicastReaperThread
+    if clicastReaperThread is None and clicastIdleTimeout > 0:
+        clicastReaperThread = threading.Thread(
+            target=clicastReaper, name="clicastReaper", daemon=True
+        )
+        clicastReaperThread.start()
+
+
+def recordClicastCrash(instanceKey, reason):
+    """
+    Counts a crash of the clicast instance for instanceKey, and quarantines
+    the instance key if it has crashed flapThreshold times in flapWindow seconds
+    """
+    now = time.time()
+    with clicastInstancesLock:
+        crashCounts[instanceKey] = crashCounts.get(instanceKey, 0) + 1
+        recentCrashes = [
+            crashTime
+            for crashTime in crashTimes.get(instanceKey, [])
+            if now - crashTime < flapWindow
+        ]
+        recentCrashes.append(now)
+        crashTimes[instanceKey] = recentCrashes
+        quarantine = len(recentCrashes) >= flapThreshold
+        if quarantine:
+            quarantinedInstances[instanceKey] = now + quarantineSeconds
+            crashTimes[instanceKey] = []
+
+    logMessage(
+        f"  clicast crash for directory: {instanceKey}: {reason}", logLevel.error
+    )
+    if quarantine:
+        logMessage(
+            f"  clicast instance for directory: {instanceKey} crashed {flapThreshold} "
+            f"times in {flapWindow} seconds, quarantined for {quarantineSeconds} seconds",
+            logLevel.error,
+        )
+
+
+def isQuarantined(instanceKey):
+    with clicastInstancesLock:
+        endTime = quarantinedInstances.get(instanceKey)
+        if endTime is not None and time.time() >= endTime:
+            del quarantinedInstances[instanceKey]
+            endTime = None
+    return endTime is not None
+
+
+def getClicastHealthStatus():
+    """
+    Returns the crash count and the remaining quarantine
+    time for each instance key that has crashed
+    """
+    now = time.time()
+    returnData = dict()
+    with clicastInstancesLock:
+        for instanceKey, crashCount in crashCounts.items():
+            endTime = quarantinedInstances.get(instanceKey, 0)
+            returnData[instanceKey] = {
+                "crashCount": crashCount,
+                "quarantineSeconds": round(max(endTime - now, 0), 1),
+            }
+    return returnData
+
+
+def removeDeadClicastInstance(instanceKey):
+    """
+    Removes the instance for instanceKey if the process has exited,
+    and records the crash.  Returns the dead process object or None
+    """
+    with clicastInstancesLock:
+        processObject = clicastInstances.get(instanceKey)
+        if processObject is None or processObject.poll() is None:
+            return None
+        del clicastInstances[instanceKey]
+    recordClicastCrash(
+        instanceKey,
+        f"instance [{processObject.pid}] exited with code {processObject.poll()}",
+    )
+    return processObject
+
+
+def probeClicastInstance(processObject):
+    """
+    Sends the no-op probe command, the caller must hold the commandLock.
+    Returns True if the instance completed the command in time
+    """
+    try:
+        processObject.stdin.write(f"{clicastProbeCommand}\n")
+        processObject.stdin.flush()
+    except OSError:
+        return False
+    deadline = time.time() + clicastProbeTimeout
+    while True:
+        responseLine = processObject.readline(max(deadline - time.time(), 0))
+        if responseLine is None or responseLine == "":
+            return False
+        elif responseLine.startswith("clicast-server-command-done"):
+            return True
+
+
+def respawnClicastInstance(instanceKey, processObject):
+    """
+    Starts a replacement for a dead instance, if it was used recently
+    enough that the idle reaper would not have shut it down
+    """
+    recentlyUsed = (
+        clicastIdleTimeout <= 0
+        or time.time() - processObject.lastUsed < clicastIdleTimeout
+    )
+    if recentlyUsed and not isQuarantined(instanceKey):
+        logMessage(f"  respawning clicast instance for directory: {instanceKey}")
+        enviroName = next(iter(processObject.enviroNames), "enviro")
+        getClicastInstanceFuture(os.path.join(instanceKey, enviroName))
+
+
+def checkClicastInstance(instanceKey, processObject):
+    """
+    Checks one instance, we skip the instances that are running
+    a command, since the command handles a crash itself
+    """
+    if not processObject.commandLock.acquire(blocking=False):
+        return
+    try:
+        with clicastInstancesLock:
+            if clicastInstances.get(instanceKey) is not processObject:
+                return
+        if processObject.poll() is None and clicastHealthProbe:
+            if time.time() - processObject.lastUsed >= clicastHealthInterval:
+                if not probeClicastInstance(processObject):
+                    logMessage(
+                        f"  clicast instance [{processObject.pid}] did not respond to the health probe",
+                        logLevel.error,
+                    )
+                    processObject.kill()
+                    try:
+                        processObject.wait(5)
+                    except subprocess.TimeoutExpired:
+                        pass
+        deadProcess = removeDeadClicastInstance(instanceKey)
+    finally:
+        processObject.commandLock.release()
+
+    if deadProcess is not None:
+        respawnClicastInstance(instanceKey, deadProcess)
+
+
+def clicastHealthMonitor():
+    while True:
+        time.sleep(clicastHealthInterval)
+        with clicastInstancesLock:
+            instanceList = [
+                (instanceKey, processObject)
+                for instanceKey, processObject in clicastInstances.items()
+                if instanceKey not in pendingClicastStarts
+            ]
+        for instanceKey, processObject in instanceList:
+            try:
+                checkClicastInstance(instanceKey, processObject)
+            except Exception as error:
+                logMessage(
+                    f"  clicast health check failed for: {instanceKey}: {error}",
+                    logLevel.error,
+                )
+
+
+def startClicastHealthMonitor():
+    """
+    Called by the server to detect the clicast instances that have died, or
+    stopped responding, before a request finds them, and to respawn them
+    """
+    global clicastHealthThread
+    if clicastHealthThread is None and clicastHealthInterval > 0:
+        clicastHealthThread = threading.Thread(
+            target=clicastHealthMonitor, name="clicastHealth", daemon=True
+        )
+        clicastHealthThread.start()
 
 
 def startNewClicastInstance(enviroPath):
     """
     This function will start a new clicast instance and check
     that it initializes correctly.  If it does we will return the
-    process object, if not we will return None
+    clicastProcess object, if not we will return None
     """
 
     commandArgs = [globalClicastCommand, "-lc", "tools", "server"]
     CWD = os.path.dirname(enviroPath)
-    processObject = subprocess.Popen(
-        commandArgs,
-        stdout=subprocess.PIPE,
-        stdin=subprocess.PIPE,
-        stderr=sys.stdout,
-        universal_newlines=True,
-        cwd=CWD,
-    )
+    if clicastShutdownStarted:
+        return None
+    try:
+        processObject = clicastProcess(
+            subprocess.Popen(
+                commandArgs,
+                stdout=subprocess.PIPE,
+                stdin=subprocess.PIPE,
+                stderr=sys.stdout,
+                universal_newlines=True,
+                cwd=CWD,
+            )
+        )
+    except OSError as error:
+        logMessage(f"  could not start clicast instance for directory: {CWD}")
+        logMessage(f"  using command: {' '.join (commandArgs)}: {error}")
+        return None
 
     # A valid clicast server start emits: "clicast-server-started"
     # so we wait to get that string from clicast
     #
     # A non-server capable clicast will see the command as invalid
-    # and exit, so we check for that case as well even though
-    # we should never get here if clicast is not server capable
+    # and exit, we see that as the end of the output
     #
-    # And finally we use a 5 second timer to make sure we
-    # never hang even if something goes terribly wrong :)
+    # And finally we use a timer to make sure we never hang even if
+    # clicast hangs without writing anything, since readline() has a timeout
     #
-    timeout = time.time() + 5
+    deadline = time.time() + clicastStartTimeout
+    clicastInstanceRunning = False
     while True:
-        responseLine = processObject.stdout.readline()
-        if responseLine.startswith("clicast-server-started"):
+        responseLine = processObject.readline(timeout=max(deadline - time.time(), 0))
+        if responseLine is None:
+            logMessage("  clicast server start processing timed out ...")
+            break
+        elif responseLine.startswith("clicast-server-started"):
             # server started ok, break and return the process object
             clicastInstanceRunning = True
             break
-        elif processObject.poll() is not None:
+        elif responseLine == "":
             # something went wrong, break and return None
-            clicastInstanceRunning = False
-            processObject = None
-            break
-        elif time.time() > timeout:
-            clicastInstanceRunning = False
-            processObject = None
-            logMessage(f"  clicast server start processing timed out ...")
             break
 
-    if clicastInstanceRunning:
-        setClicastInstance(enviroPath, processObject)
+    # closeAllClicastInstances() sets the flag with the lock held, so
+    # either it sees this instance, or we see that it has started
+    with clicastInstancesLock:
+        stopForShutdown = clicastInstanceRunning and clicastShutdownStarted
+        if clicastInstanceRunning and not stopForShutdown:
+            setClicastInstance(enviroPath, processObject)
+
+    if stopForShutdown:
+        # the server started to shut down while we were starting
+        stopClicastProcesses([processObject])
+        processObject = None
+    elif clicastInstanceRunning:
         logMessage(
-            f"  started clicast instance [{processObject.pid}] for environment: {enviroPath}"
+            f"  started clicast instance [{processObject.pid}] for directory: {CWD}"
         )
     else:
-        logMessage(f"  could not start clicast instance for environment: {enviroPath}")
+        processObject.kill()
+        processObject = None
+        logMessage(f"  could not start clicast instance for directory: {CWD}")
         logMessage(f"  using command: {' '.join (commandArgs)}")
 
     return processObject
@@ -103,25 +836,110 @@ def getExistingClicastInstance(enviroPath):
 
     whatToReturn = None
     # ensure a consistent key for the clicastInstances dictionary
-    enviroPath = cleanEnviroPath(enviroPath)
-    if enviroPath in clicastInstances and clicastInstances[enviroPath].poll() == None:
-        logMessage(
-            f"  using existing clicast instance [{clicastInstances[enviroPath].pid}] for: {enviroPath} "
-        )
-        whatToReturn = clicastInstances[enviroPath]
+    instanceKey = clicastInstanceKey(enviroPath)
+    with clicastInstancesLock:
+        processObject = clicastInstances.get(instanceKey)
+        if processObject != None and processObject.poll() == None:
+            logMessage(
+                f"  using existing clicast instance [{processObject.pid}] for: {enviroPath} "
+            )
+            clicastInstances.move_to_end(instanceKey)
+            whatToReturn = processObject
 
     return whatToReturn
 
 
+def startClicastInstanceForFuture(enviroPath):
+    instanceKey = clicastInstanceKey(enviroPath)
+    try:
+        # the instance might have died, so we clean up before starting a new one
+        removeDeadClicastInstance(instanceKey)
+        removeClicastInstance(enviroPath)
+        evictClicastInstances(instanceKey)
+        return startNewClicastInstance(enviroPath)
+    finally:
+        with clicastInstancesLock:
+            pendingClicastStarts.pop(instanceKey, None)
+
+
+def getClicastInstanceFuture(enviroPath):
+    """
+    This function returns a future for the clicast instance for enviroPath,
+    the result of the future is the clicastProcess object, or None if the
+    instance could not be started.  This does not block, so it can be used
+    to start the instances for several environments at the same time.
+    """
+    instanceKey = clicastInstanceKey(enviroPath)
+    with clicastInstancesLock:
+        if instanceKey in pendingClicastStarts:
+            return pendingClicastStarts[instanceKey]
+
+        clicastInstance = getExistingClicastInstance(enviroPath)
+        future = concurrent.futures.Future()
+        if clicastInstance != None:
+            future.set_result(clicastInstance)
+        else:
+            future = clicastStartExecutor.submit(
+                startClicastInstanceForFuture, cleanEnviroPath(enviroPath)
+            )
+            pendingClicastStarts[instanceKey] = future
+    return future
+
+
+def startClicastInstances(enviroPathList):
+    """
+    Starts the clicast instances for all of the environments in enviroPathList
+    in parallel, returns a dictionary of clean path to future.  Environments
+    in the same directory share an instance, so they share a future
+    """
+    return {
+        cleanEnviroPath(enviroPath): getClicastInstanceFuture(enviroPath)
+        for enviroPath in enviroPathList
+    }
+
+
 def getClicastInstance(enviroPath):
     """
     This function will return the clicast instance for the given environment
     If there is not an existing instance, a new clicast instance will be started.
     """
-    clicastInstance = getExistingClicastInstance(enviroPath)
-    if clicastInstance == None:
-        clicastInstance = startNewClicastInstance(enviroPath)
-    return clicastInstance
+    return getClicastInstanceFuture(enviroPath).result()
+
+
+def lockClicastInstance(enviroPath):
+    """
+    Returns the clicast instance for enviroPath with its commandLock held, or
+    None if an instance could not be started.  While we wait for the lock, the
+    instance can be shut down by the idle reaper, an LRU eviction, or by
+    closeEnvironmentConnection() for another environment in the directory,
+    so once we have the lock we check that it is still the live instance,
+    and if it is not, we release the lock and get a new instance
+    """
+    instanceKey = clicastInstanceKey(enviroPath)
+    for attempt in range(maxInstanceLockAttempts):
+        processObject = getClicastInstance(enviroPath)
+        if processObject == None:
+            return None
+        processObject.commandLock.acquire()
+        with clicastInstancesLock:
+            isCurrent = clicastInstances.get(instanceKey) is processObject
+        if isCurrent and processObject.poll() == None:
+            return processObject
+        processObject.commandLock.release()
+        logMessage(
+            f"  clicast instance [{processObject.pid}] was closed while waiting for it, getting a new one"
+        )
+    return None
+
+
+def waitForPendingClicastStart(enviroPath):
+    """
+    If a clicast instance is being started for enviroPath, wait for it
+    """
+    with clicastInstancesLock:
+        future = pendingClicastStarts.get(clicastInstanceKey(enviroPath))
+    if future is not None:
+        concurrent.futures.wait([future])
 
 
 def closeEnvironmentConnection(enviroPath):
@@ -130,34 +948,64 @@ def closeEnvironmentConnection(enviroPath):
     It is used before things like delete and re-build environment, since we need
     to delete the environment directory, and the running process will have it locked
     If we are in server mode, we return True if we terminated a process, False otherwise
+
+    The instance is shared with the other environments in the same directory,
+    clicast has no way to release just one environment, so we shut the instance
+    down, and if it was used by other environments we start a new one for them
     """
 
     returnValue = False
     if USE_SERVER:
+        # a pre-warm might be starting an instance right now
+        waitForPendingClicastStart(enviroPath)
         processObject = getExistingClicastInstance(enviroPath)
         if processObject != None:
-            logMessage(
-                f"  terminating clicast instance [{processObject.pid}] for environment: {enviroPath}"
-            )
-            # This tells clicast to shutdown gracefully
-            # In the case where the server has been stopped with ctrl-c
-            # we get here, but the clicast process might have already died
-            # from the propagated SIGINT, so we need to catch the exception
-            try:
-                processObject.stdin.write("clicast-server-shutdown\n")
-                processObject.stdin.flush()
-                processObject.wait()
-            except:
-                pass
-            # This simply removes the processObject from the dictionary
-            removeClicastInstance(enviroPath)
+            with processObject.commandLock:
+                shutdownClicastInstance(clicastInstanceKey(enviroPath), processObject)
             returnValue = True
+
+            otherEnviroNames = processObject.enviroNames - {
+                os.path.basename(cleanEnviroPath(enviroPath).rstrip("/"))
+            }
+            if len(otherEnviroNames) > 0:
+                logMessage(
+                    f"  restarting clicast instance for: {', '.join(sorted(otherEnviroNames))}"
+                )
+                getClicastInstanceFuture(enviroPath)
         else:
             logMessage(f"  no clicast instance exists for environment: {enviroPath}")
 
     return returnValue
 
 
+def closeAllClicastInstances():
+    """
+    Called by the server when it shuts down, all of the instances are
+    stopped at the same time, and we do not wait for running commands
+    """
+    global clicastShutdownStarted
+    with clicastInstancesLock:
+        clicastShutdownStarted = True
+        instanceList = list(clicastInstances.items())
+    if len(instanceList) == 0:
+        return
+
+    startTime = time.perf_counter()
+    logMessage(f"  terminating {len(instanceList)} clicast instances ...")
+    runningList = stopClicastProcesses(
+        [processObject for _, processObject in instanceList]
+    )
+    with clicastInstancesLock:
+        for instanceKey, processObject in instanceList:
+            if clicastInstances.get(instanceKey) is processObject:
+                del clicastInstances[instanceKey]
+
+    logMessage(
+        f"  clicast instances stopped in {time.perf_counter() - startTime:.3f}s"
+        + (f", could not stop: {[p.pid for p in runningList]}" if runningList else "")
+    )
+
+
 def cleanEnviroPath(enviroPath):
     """
     This function is used to clean up the environment path to make it usable as
@@ -165,7 +1013,7 @@ def cleanEnviroPath(enviroPath):
     and we replace backslashes with forward slashes.
     """
     returnPath = enviroPath.replace("\\", "/")
-    if returnPath[1] == ":":
+    if len(returnPath) > 1 and returnPath[1] == ":":
         returnPath = returnPath[0].lower() + returnPath[1:]
     return returnPath
 
@@ -181,13 +1029,212 @@ def logPrefix():
 logFileHandle = sys.stdout
 
 
-def logMessage(message):
+class logLevel:
+    error = 0
+    info = 1
+    verbose = 2
+
+
+logLevelNames = {
+    "error": logLevel.error,
+    "info": logLevel.info,
+    "verbose": logLevel.verbose,
+}
+
+# Messages with a level greater than this are not logged
+currentLogLevel = logLevel.info
+
+
+class logWriter:
+    """
+    The server log is written by a background thread so that request
+    processing never waits for the file system.  Messages are queued, and
+    written in batches every flushInterval seconds, or when flushSize bytes
+    are pending.  When the file grows larger than maxFileSize bytes it is
+    renamed to <logFilePath>.1 and a new file is started.
+    """
+
+    def __init__(
+        self,
+        logFilePath,
+        flushInterval=0.5,
+        flushSize=64 * 1024,
+        maxFileSize=10 * 1024 * 1024,
+        backupCount=3,
+    ):
+        self.logFilePath = logFilePath
+        self.flushInterval = flushInterval
+        self.flushSize = flushSize
+        self.maxFileSize = maxFileSize
+        self.backupCount = backupCount
+        self.messageQueue = queue.Queue()
+        self.fileHandle = open(logFilePath, "w")
+        self.fileSize = 0
+        self.thread = threading.Thread(
+            target=self.writeMessages, name="logWriter", daemon=True
+        )
+        self.thread.start()
+
+    def write(self, message, flushNow=False):
+        self.messageQueue.put((message, flushNow))
+
+    def stop(self):
+        """
+        Writes any queued messages and closes the file
+        """
+        self.messageQueue.put(None)
+        self.thread.join(timeout=5)
+
+    def writeMessages(self):
+        pendingMessages = []
+        pendingSize = 0
+        nextFlushTime = time.time() + self.flushInterval
+        while True:
+            try:
+                item = self.messageQueue.get(
+                    timeout=max(nextFlushTime - time.time(), 0)
+                )
+            except queue.Empty:
+                item = ("", False)
+
+            if item is None:
+                self.flush(pendingMessages)
+                self.fileHandle.close()
+                return
+
+            message, flushNow = item
+            if len(message) > 0:
+                pendingMessages.append(message)
+                pendingSize += len(message)
+
+            if (
+                flushNow
+                or pendingSize >= self.flushSize
+                or time.time() >= nextFlushTime
+            ):
+                self.flush(pendingMessages)
+                pendingMessages = []
+                pendingSize = 0
+                nextFlushTime = time.time() + self.flushInterval
+
+    def flush(self, pendingMessages):
+        if len(pendingMessages) > 0:
+            text = "".join(pendingMessages)
+            self.fileHandle.write(text)
+            self.fileHandle.flush()
+            self.fileSize += len(text)
+            if self.maxFileSize > 0 and self.fileSize > self.maxFileSize:
+                self.rotate()
+
+    def rotate(self):
+        self.fileHandle.close()
+        try:
+            for index in range(self.backupCount - 1, 0, -1):
+                olderFile = f"{self.logFilePath}.{index}"
+                if os.path.isfile(olderFile):
+                    os.replace(olderFile, f"{self.logFilePath}.{index + 1}")
+            if self.backupCount > 0:
+                os.replace(self.logFilePath, f"{self.logFilePath}.1")
+        except OSError:
+            # on Windows the rename will fail if another process
+            # has the log open, in this case we simply start over
+            pass
+        self.fileHandle = open(self.logFilePath, "w")
+        self.fileSize = 0
+
+
+# Set by startLogWriter() for the server, when this is None
+# messages are written directly to logFileHandle
+globalLogWriter = None
+
+
+def startLogWriter(logFilePath, maxFileSize):
+    global globalLogWriter
+    globalLogWriter = logWriter(logFilePath, maxFileSize=maxFileSize)
+
+
+def stopLogWriter():
+    global globalLogWriter
+    if globalLogWriter is not None:
+        globalLogWriter.stop()
+        globalLogWriter = None
+
+
+def logMessage(message, level=logLevel.info):
     """
     This function will send server side messages to the file
     opened by the server, and client side messages to stdout
     """
-    logFileHandle.write(message + "\n")
-    logFileHandle.flush()
+    if level > currentLogLevel:
+        return
+
+    # copy the global, since stopLogWriter() can be called from another thread
+    writer = globalLogWriter
+    if writer is not None:
+        writer.write(message + "\n", flushNow=(level == logLevel.error))
+    else:
+        logFileHandle.write(message + "\n")
+        logFileHandle.flush()
+
+
+def logDiagnostic(message, level=logLevel.verbose):
+    """
+    This is for messages from code that also runs in command line mode,
+    where stdout carries the JSON response, so we only use logMessage()
+    in server mode, and send the message to stderr otherwise
+    """
+    if USE_SERVER:
+        logMessage(message, level)
+    elif level <= currentLogLevel:
+        sys.stderr.write(message + "\n")
+        sys.stderr.flush()
+
+
+def getUserCacheDirectory(name):
+    """
+    Returns the path of the cache directory called name for the current user.
+    We use the user's cache directory rather than the shared temp directory
+    so that other users cannot read our cache files, or plant their own, the
+    caller must use makePrivateDirectory() before using the directory
+    """
+    if sys.platform == "win32":
+        rootDirectory = os.environ.get("LOCALAPPDATA", "")
+    else:
+        rootDirectory = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+            "~/.cache"
+        )
+    if not os.path.isabs(rootDirectory):
+        # no usable home directory, so use a per-user directory in temp
+        rootDirectory = os.path.join(
+            tempfile.gettempdir(), f"vcast-{getpass.getuser()}"
+        )
+    return os.path.join(rootDirectory, "vcast", name)
+
+
+def makePrivateDirectory(directoryPath):
+    """
+    Creates directoryPath with mode 0700 if it does not exist.  On POSIX we
+    check that the directory belongs to the current user, is not a symlink,
+    and that no other user can replace it, and raise OSError if not
+    """
+    os.makedirs(directoryPath, mode=0o700, exist_ok=True)
+    if os.name != "posix":
+        return
+
+    statObject = os.lstat(directoryPath)
+    if stat.S_ISLNK(statObject.st_mode) or statObject.st_uid != os.getuid():
+        raise OSError(f"{directoryPath} is not a directory owned by the current user")
+    if stat.S_IMODE(statObject.st_mode) != 0o700:
+        os.chmod(directoryPath, 0o700)
+
+    # the parent must not let another user rename our directory, so it
+    # must belong to us, or root, and be sticky if others can write it
+    parentStat = os.stat(os.path.dirname(os.path.abspath(directoryPath)))
+    parentIsShared = parentStat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+    if parentStat.st_uid not in (0, os.getuid()) or (
+        parentIsShared and not parentStat.st_mode & stat.S_ISVTX
+    ):
+        raise OSError(f"the parent of {directoryPath} can be changed by other users")
 
 
 def monkeypatch_custom_css(custom_css):
@@ -200,6 +1247,8 @@ def monkeypatch_custom_css(custom_css):
     to our CSS file when that option is requested.
     """
 
+    from vector.apps.DataAPI.configuration import EnvironmentMixin
+
     # Back-up old get_option
     orig_get_option = EnvironmentMixin.get_option
 
@@ -0,0 +1,197 @@
+import contextlib
+import threading
+import time
+
+"""
+This module collects the per command metrics for the data server.
+
+For each command we count the requests and errors, and keep latency
+histograms for the phases of request processing:
+    total        - the time to process the request, including lockWait
+    lockWait     - the time spent waiting for the environment lock
+    dataApiOpen  - the time spent opening UnitTestApi handles
+    clicast      - the round trip time of the clicast server commands
+
+The phase timings are attributed to the command that is being processed
+by the current thread, see startCommand()
+"""
+
+# Upper bounds in seconds, in the style of a Prometheus histogram
+latencyBuckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+metricsLock = threading.Lock()
+
+# Key is the command, value is a dictionary with requests and errors counts
+commandCounters = dict()
+
+# Key is (command, phase), value is a latencyHistogram
+commandHistograms = dict()
+
+# Number of requests that are waiting for a worker slot
+queueDepth = 0
+
+# Number of requests that are running in a worker slot
+activeRequests = 0
+
+# The command that the current thread is processing
+currentCommandData = threading.local()
+
+
+class latencyHistogram:
+    def __init__(self):
+        # one count per bucket, plus one for the values larger than the last bucket
+        self.bucketCounts = [0] * (len(latencyBuckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(latencyBuckets) and seconds > latencyBuckets[index]:
+            index += 1
+        self.bucketCounts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulativeCounts(self):
+        returnList = []
+        runningTotal = 0
+        for bucketCount in self.bucketCounts:
+            runningTotal += bucketCount
+            returnList.append(runningTotal)
+        return returnList
+
+    def toDict(self):
+        data = dict()
+        data["count"] = self.count
+        data["sum"] = round(self.sum, 6)
+        data["average"] = round(self.sum / self.count, 6) if self.count else 0
+        bucketNames = [str(bound) for bound in latencyBuckets] + ["+Inf"]
+        data["buckets"] = dict(zip(bucketNames, self.cumulativeCounts()))
+        return data
+
+
+def startCommand(command):
+    currentCommandData.command = command
+
+
+def currentCommand():
+    """
+    Returns the command of the current thread, so that a thread that
+    works for the command can pass it to startCommand()
+    """
+    return getattr(currentCommandData, "command", None)
+
+
+def endCommand(exitCode, totalSeconds):
+    command = getattr(currentCommandData, "command", "unknown")
+    with metricsLock:
+        counters = commandCounters.setdefault(command, {"requests": 0, "errors": 0})
+        counters["requests"] += 1
+        if exitCode != 0:
+            counters["errors"] += 1
+    recordLatency("total", totalSeconds)
+    currentCommandData.command = None
+
+
+def recordLatency(phase, seconds):
+    """
+    Records the latency for phase, for the command of the current thread
+    """
+    command = getattr(currentCommandData, "command", None)
+    if command is None:
+        return
+    with metricsLock:
+        key = (command, phase)
+        if key not in commandHistograms:
+            commandHistograms[key] = latencyHistogram()
+        commandHistograms[key].observe(seconds)
+
+
+@contextlib.contextmanager
+def timedPhase(phase):
+    startTime = time.perf_counter()
+    try:
+        yield
+    finally:
+        recordLatency(phase, time.perf_counter() - startTime)
+
+
+def requestQueued():
+    global queueDepth
+    with metricsLock:
+        queueDepth += 1
+
+
+def requestStarted():
+    global queueDepth
+    global activeRequests
+    with metricsLock:
+        queueDepth -= 1
+        activeRequests += 1
+
+
+def requestFinished():
+    global activeRequests
+    with metricsLock:
+        activeRequests -= 1
+
+
+def metricsAsDict(gauges):
+    """
+    gauges is a dictionary of current values provided by the server
+    """
+    with metricsLock:
+        commandData = dict()
+        for command, counters in commandCounters.items():
+            commandData[command] = dict(counters)
+        for (command, phase), histogram in commandHistograms.items():
+            commandNode = commandData.setdefault(command, {"requests": 0, "errors": 0})
+            commandNode.setdefault("latency", dict())[phase] = histogram.toDict()
+
+        returnData = dict()
+        returnData["commands"] = commandData
+        returnData["gauges"] = dict(
+            gauges, queueDepth=queueDepth, activeRequests=activeRequests
+        )
+    return returnData
+
+
+def prometheusLabels(labelDict):
+    labelText = ",".join(f'{name}="{str(value)}"' for name, value in labelDict.items())
+    return "{" + labelText + "}"
+
+
+def metricsAsPrometheusText(gauges):
+    """
+    Returns the metrics in the Prometheus text exposition format
+    """
+    lineList = []
+    with metricsLock:
+        lineList.append("# TYPE vcast_requests_total counter")
+        for command, counters in commandCounters.items():
+            labels = prometheusLabels({"command": command})
+            lineList.append(f"vcast_requests_total{labels} {counters['requests']}")
+
+        lineList.append("# TYPE vcast_request_errors_total counter")
+        for command, counters in commandCounters.items():
+            labels = prometheusLabels({"command": command})
+            lineList.append(f"vcast_request_errors_total{labels} {counters['errors']}")
+
+        lineList.append("# TYPE vcast_request_seconds histogram")
+        for (command, phase), histogram in commandHistograms.items():
+            labelDict = {"command": command, "phase": phase}
+            bucketNames = [str(bound) for bound in latencyBuckets] + ["+Inf"]
+            for bucketName, count in zip(bucketNames, histogram.cumulativeCounts()):
+                labels = prometheusLabels(dict(labelDict, le=bucketName))
+                lineList.append(f"vcast_request_seconds_bucket{labels} {count}")
+            labels = prometheusLabels(labelDict)
+            lineList.append(f"vcast_request_seconds_sum{labels} {histogram.sum:.6f}")
+            lineList.append(f"vcast_request_seconds_count{labels} {histogram.count}")
+
+        allGauges = dict(gauges, queueDepth=queueDepth, activeRequests=activeRequests)
+
+    for name, value in allGauges.items():
+        lineList.append(f"# TYPE vcast_{name} gauge")
+        lineList.append(f"vcast_{name} {value}")
+
+    return "\n".join(lineList) + "\n"
@@ -8,7 +8,6 @@ import base64
 from enum import Enum
 
 
-from vector.apps.DataAPI.unit_test_api import UnitTestApi
 from vector.apps.DataAPI.unit_test_models import Function, Global
 from vector.apps.DataAPI.migrations.migrate import MigrationError
 
@@ -20,6 +19,7 @@ from vConstants import (
 )
 
 from versionChecks import vpythonHasCodedMockSupport, enviroSupportsMocking
+from unitTestApiCache import closeUnitTestApi, openUnitTestApi
 
 if vpythonHasCodedMockSupport():
     from vector.apps.DataAPI import mock_helper
@@ -939,10 +939,23 @@ def processMockDefinition(enviroPath, lineSoFar):
     returnData = choiceDataType()
 
     try:
-        api = UnitTestApi(enviroPath)
+        api = openUnitTestApi(enviroPath)
     except MigrationError as error:
         return processDataAPIException(error)
 
+    try:
+        processMockDefinitionWithApi(api, lineSoFar, returnData)
+    finally:
+        closeUnitTestApi(api)
+
+    return returnData
+
+
+def processMockDefinitionWithApi(api, lineSoFar, returnData):
+    """
+    This does the work for processMockDefinition() using an open api
+    """
+
     # if what the user entered so far is an each match for the unit and function
     # we will get a single object in each list, else we will get a filtered list
     # based on what was entered
@@ -984,10 +997,6 @@ def processMockDefinition(enviroPath, lineSoFar):
         returnData.choiceKind = choiceKindType.Snippet
         returnData.choiceList.append(whatToReturn)
 
-    api.close()
-
-    return returnData
-
 
 def buildChoiceResponse(choiceData: choiceDataType):
     """
@@ -1027,12 +1036,13 @@ def processTstLine(enviroPath, line, unit=None):
     """
     global globalOutputLog
 
+    api = None
     try:
         globalOutputLog.append("Processing: '" + line + "' ...")
 
         # open the environment ...
         try:
-            api = UnitTestApi(enviroPath)
+            api = openUnitTestApi(enviroPath)
         except MigrationError as error:
             return processDataAPIException(error)
 
@@ -1067,10 +1077,12 @@ def processTstLine(enviroPath, line, unit=None):
         else:
             returnData = processStandardLines(api, pieces, triggerCharacter)
 
-        api.close()
+        closeUnitTestApi(api)
         return returnData
 
     except Exception:
+        if api is not None:
+            closeUnitTestApi(api)
         globalOutputLog.append("-" * 100)
         globalOutputLog.append("Exception occurred ...")
         trace = traceback.format_exc()
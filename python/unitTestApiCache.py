@@ -0,0 +1,339 @@
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+"""
+This module maintains a cache of open UnitTestApi handles for the data server.
+
+Opening the dataAPI is expensive because the databases are opened and the
+migration check is done on every open, and the completion requests open the
+API on every keystroke.  In server mode we keep the most recently used
+handles open, in non-server mode every open creates a new handle.
+
+The cache entry is re-opened when master.db or cover.db change on disk.
+Callers must hold the environment lock from pythonUtilities.getEnviroLock()
+while they are using a handle.
+
+The dataAPI is built on sqlite connections, which must not be used, or closed,
+from a thread other than the one that created them.  So all of the dataAPI
+work for an environment is done on one thread, the enviroThread for that
+environment, see runOnEnviroThread(), and that thread owns the cached handle.
+This means that there is one handle per environment, whichever connection
+thread the request arrived on, and that a handle can be closed synchronously
+by asking its thread to do it.  A handle opened on any other thread is
+not cached, it is closed by closeUnitTestApi().
+"""
+
+import pythonUtilities
+import serverMetrics
+from pythonUtilities import cleanEnviroPath, logMessage
+from vector.apps.DataAPI.unit_test_api import UnitTestApi
+
+# Maximum number of open API handles, when the cache is full
+# the least recently used handle is closed.  Set by the server main()
+maxCacheSize = 8
+
+# Number of seconds that a handle can be unused before it is closed
+idleTimeout = 300
+
+# Number of seconds that an enviroThread with no open handle waits for
+# more work before it exits, so idle environments do not keep a thread
+threadIdleTimeout = 30
+
+# The files that we check to see if the cached handle is stale
+fingerprintFileNames = ["master.db", "cover.db"]
+
+# Key is the clean environment path, value is a cachedApi object
+# the order of the dictionary is the least to most recently used
+apiCache = collections.OrderedDict()
+
+# Key is the id() of an api handle, value is the cachedApi object
+# this allows closeUnitTestApi() to find the entry for an api handle
+apiHandles = dict()
+
+# Key is the clean environment path, value is the enviroThread
+enviroThreads = dict()
+
+apiCacheLock = threading.Lock()
+
+idleReaperThread = None
+
+
+class enviroThread:
+    """
+    This runs the dataAPI work for one environment, one task at a time.  The
+    thread exits when it has been idle for threadIdleTimeout seconds, and there
+    is no cached handle for the environment, it is re-started on demand
+    """
+
+    def __init__(self, enviroPath):
+        self.enviroPath = enviroPath
+        self.taskQueue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self.run,
+            name=f"dataApi-{os.path.basename(enviroPath)}",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def isCurrentThread(self):
+        return threading.current_thread() is self.thread
+
+    def submit(self, function, *args):
+        """
+        The caller must hold apiCacheLock, returns a Future for the result
+        """
+        future = concurrent.futures.Future()
+        self.taskQueue.put((future, function, args))
+        return future
+
+    def run(self):
+        while True:
+            try:
+                future, function, args = self.taskQueue.get(timeout=threadIdleTimeout)
+            except queue.Empty:
+                # the lock is held by submit(), so no task can be lost
+                with apiCacheLock:
+                    if self.taskQueue.empty() and self.enviroPath not in apiCache:
+                        if enviroThreads.get(self.enviroPath) is self:
+                            del enviroThreads[self.enviroPath]
+                        return
+                continue
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args))
+                except BaseException as error:
+                    future.set_exception(error)
+
+
+def getEnviroThread(enviroPath):
+    """
+    The caller must hold apiCacheLock, enviroPath must be clean
+    """
+    if enviroPath not in enviroThreads:
+        enviroThreads[enviroPath] = enviroThread(enviroPath)
+    return enviroThreads[enviroPath]
+
+
+def runInRequestContext(requestContext, function, args):
+    """
+    Runs function with the request state, output listeners and metrics
+    command of the thread that called runOnEnviroThread()
+    """
+    requestState, listeners, command = requestContext
+    pythonUtilities.setRequestState(requestState)
+    pythonUtilities.setOutputListener(*listeners)
+    serverMetrics.startCommand(command)
+    try:
+        return function(*args)
+    finally:
+        serverMetrics.startCommand(None)
+        pythonUtilities.setOutputListener(None)
+        pythonUtilities.setRequestState(None)
+
+
+def runOnEnviroThread(enviroPath, function, *args):
+    """
+    Runs function on the enviroThread of enviroPath, and returns its result,
+    or raises its exception.  The caller must hold the environment lock
+    """
+    if not pythonUtilities.USE_SERVER:
+        return function(*args)
+
+    enviroPath = cleanEnviroPath(enviroPath)
+    with apiCacheLock:
+        thread = getEnviroThread(enviroPath)
+        if thread.isCurrentThread():
+            future = None
+        else:
+            requestContext = (
+                pythonUtilities.getRequestState(),
+                pythonUtilities.getOutputListener(),
+                serverMetrics.currentCommand(),
+            )
+            future = thread.submit(runInRequestContext, requestContext, function, args)
+
+    if future is None:
+        return function(*args)
+    return future.result()
+
+
+class cachedApi:
+    def __init__(self, enviroPath, api, fingerprint):
+        self.enviroPath = enviroPath
+        self.api = api
+        self.fingerprint = fingerprint
+        self.lastUsed = time.time()
+        # number of callers that currently have the handle open
+        self.useCount = 0
+        # set when the entry was removed from the cache while in use
+        self.closePending = False
+
+
+def getFingerprint(enviroPath):
+    """
+    This function returns the size and modification time
+    of the environment databases, None for missing files
+    """
+    fingerprint = []
+    for fileName in fingerprintFileNames:
+        try:
+            statObject = os.stat(os.path.join(enviroPath, fileName))
+            fingerprint.append((statObject.st_size, statObject.st_mtime_ns))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+def closeApiHandle(entry):
+    try:
+        entry.api.close()
+    except Exception as error:
+        logMessage(f"  could not close dataAPI handle for: {entry.enviroPath}: {error}")
+        return
+    logMessage(f"  closed cached dataAPI handle for: {entry.enviroPath}")
+
+
+def closeCacheEntry(entry):
+    """
+    The caller must hold apiCacheLock, and must have removed the entry from the
+    apiCache.  If the handle is in use it will be closed when it is released.
+    If we are not on the enviroThread of the entry, the thread is asked to
+    close it, and we return the Future for that, otherwise we return None
+    """
+    if entry.useCount > 0:
+        entry.closePending = True
+        return None
+
+    apiHandles.pop(id(entry.api), None)
+    thread = getEnviroThread(entry.enviroPath)
+    if thread.isCurrentThread():
+        closeApiHandle(entry)
+        return None
+    return thread.submit(closeApiHandle, entry)
+
+
+def removeIdleEntries():
+    """
+    The caller must hold apiCacheLock
+    """
+    now = time.time()
+    for key in list(apiCache.keys()):
+        entry = apiCache[key]
+        if entry.useCount == 0 and now - entry.lastUsed > idleTimeout:
+            del apiCache[key]
+            closeCacheEntry(entry)
+
+
+def openUnitTestApi(enviroPath):
+    """
+    This function will return an open UnitTestApi handle for enviroPath, callers
+    should use closeUnitTestApi() rather than api.close() when they are done
+    """
+    if not pythonUtilities.USE_SERVER:
+        return UnitTestApi(enviroPath)
+
+    key = cleanEnviroPath(enviroPath)
+    fingerprint = getFingerprint(enviroPath)
+    with apiCacheLock:
+        thread = enviroThreads.get(key)
+        useCache = thread is not None and thread.isCurrentThread()
+        entry = apiCache.get(key) if useCache else None
+        if entry is not None and entry.fingerprint != fingerprint:
+            logMessage(f"  dataAPI files changed for: {entry.enviroPath}")
+            del apiCache[key]
+            closeCacheEntry(entry)
+            entry = None
+
+        if entry is not None:
+            apiCache.move_to_end(key)
+            entry.useCount += 1
+            entry.lastUsed = time.time()
+            return entry.api
+
+    # We open the api outside of the cache lock since this is the slow part,
+    # it's ok to do this because the caller holds the environment lock
+    with serverMetrics.timedPhase("dataApiOpen"):
+        api = UnitTestApi(enviroPath)
+
+    if not useCache:
+        return api
+
+    with apiCacheLock:
+        entry = cachedApi(key, api, fingerprint)
+        entry.useCount = 1
+        apiCache[key] = entry
+        apiHandles[id(api)] = entry
+        removeIdleEntries()
+        while len(apiCache) > max(maxCacheSize, 1):
+            oldestKey = next(iter(apiCache))
+            closeCacheEntry(apiCache.pop(oldestKey))
+
+    return api
+
+
+def closeUnitTestApi(api):
+    """
+    Cached handles are released for re-use, all others are closed
+    """
+    with apiCacheLock:
+        entry = apiHandles.get(id(api))
+        if entry is not None:
+            entry.useCount -= 1
+            entry.lastUsed = time.time()
+            if entry.closePending and entry.useCount == 0:
+                closeCacheEntry(entry)
+            return
+
+    api.close()
+
+
+def invalidateUnitTestApi(enviroPath):
+    """
+    This function will close the cached handle for enviroPath, it should be
+    called before the environment is re-built, or closed by the client.  The
+    handle is closed when this returns, unless the caller is using it
+    """
+    enviroPath = cleanEnviroPath(enviroPath)
+    with apiCacheLock:
+        entry = apiCache.pop(enviroPath, None)
+        future = closeCacheEntry(entry) if entry is not None else None
+
+    # the enviroThread is idle, since the caller holds the environment lock
+    if future is not None:
+        future.result()
+
+
+def closeAllUnitTestApis():
+    """
+    Called when the server exits, we do not wait for the enviroThreads,
+    so any handle that is not closed is left for the process exit
+    """
+    with apiCacheLock:
+        while len(apiCache) > 0:
+            key, entry = apiCache.popitem()
+            closeCacheEntry(entry)
+
+
+def idleReaper():
+    while True:
+        time.sleep(max(idleTimeout / 4, 1))
+        with apiCacheLock:
+            removeIdleEntries()
+
+
+def startIdleReaper():
+    """
+    Called by the server main() to close handles that have not been used
+    for idleTimeout seconds, even if there are no new requests
+    """
+    global idleReaperThread
+    if idleReaperThread is None:
+        idleReaperThread = threading.Thread(
+            target=idleReaper, name="apiCacheReaper", daemon=True
+        )
+        idleReaperThread.start()
@@ -5,11 +5,16 @@ this started life as a duplicate of:  instumentationLib/vTestInterface.py
 """
 
 import argparse
+import concurrent.futures
+import contextlib
 from datetime import datetime
 import hashlib
 import json
+import multiprocessing
 import os
 import sys
+import threading
+import time
 import traceback
 import re
 
@@ -21,9 +26,13 @@ This script must be run under vpython
 
 import coverageGutter
 import clicastInterface
+import enviroDataCache
+import enviroDataVersions
+import jsonEncoding
 import pythonUtilities
 import tstUtilities
 import mcdcReport
+import workspaceIndex
 
 from vcastDataServerTypes import errorCodes
 from vConstants import TAG_FOR_INIT
@@ -31,12 +40,22 @@ from versionChecks import (
     vpythonHasCodedTestSupport,
     enviroSupportsMocking,
 )
-from pythonUtilities import logMessage, expand_vc_env_vars
+from pythonUtilities import (
+    changeDirectory,
+    expand_vc_env_vars,
+    logDiagnostic,
+    logLevel,
+    logMessage,
+)
+from unitTestApiCache import (
+    closeUnitTestApi,
+    invalidateUnitTestApi,
+    openUnitTestApi,
+)
 
 from vector.apps.DataAPI.manage_api import VCProjectApi
 from vector.apps.DataAPI.vcproject_models import EnvironmentType
 from vector.apps.DataAPI.unit_test_api import UnitTestApi
-from vector.lib.core.system import cd
 from vector.enums import COVERAGE_TYPE_TYPE_T
 
 if vpythonHasCodedTestSupport():
@@ -55,14 +74,66 @@ modeChoices = [
     "getWorkspaceEnviroData",
     "getProjectData",
     "getEnviroData",
+    "getEnviroOutline",
+    "getTests",
     "executeTest",
+    "executeTests",
     "report",
     "mcdcReport",
     "mcdcLines",
     "parseCBT",
     "rebuild",
+    "rebuildMany",
 ]
 
+# Default number of environments that rebuildMany rebuilds at the same time
+defaultRebuildParallel = max(1, min(4, os.cpu_count() or 1))
+
+# The names of the nodes for the compound and init tests in the test data
+compoundNodeName = "Compound Tests"
+initNodeName = "Initialization Tests"
+
+# The number of tests that getTests returns when the options have no limit
+defaultTestPageSize = 100
+
+# The fields that a field selection can contain for each section, see
+# parseFieldSelection().  The first field of each section is always
+# returned, since the client needs it to identify the item
+selectableFields = {
+    "tests": [
+        "testName",
+        "notes",
+        "compoundOnly",
+        "time",
+        "status",
+        "passfail",
+        "codedTestFile",
+        "codedTestLine",
+    ],
+    "unitData": [
+        "path",
+        "functionList",
+        "cmcChecksum",
+        "covered",
+        "uncovered",
+        "partiallyCovered",
+    ],
+}
+
+# The short names that the client can use in a field selection
+fieldAliases = {
+    "tests": {"name": "testName"},
+    "unitData": {"functions": "functionList"},
+}
+
+# Number of processes that getWorkspaceEnviroData uses to load the environments,
+# 0 for one per CPU.  Set by the server main(), or with {"workers": N} in the options
+workspaceWorkers = 0
+
+# With fewer environments than this, starting the worker
+# processes costs more than loading the environments one by one
+minParallelEnviros = 4
+
 
 def setupArgs():
     """
@@ -85,6 +156,12 @@ def setupArgs():
         "--options", help="Serialized JSON object containing other option values"
     )
 
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Print the JSON output without indentation or whitespace",
+    )
+
     return parser
 
 
@@ -141,20 +218,99 @@ def getPassFailString(test):
     return XofYString(numerator, denominator)
 
 
-def generateTestInfo(enviroPath, test):
+def parseFieldSelection(fieldSpec):
+    """
+    fieldSpec is a string like: "tests:name,status;unitData:covered,uncovered"
+    or a list of "section:field,field" strings.  This returns a dictionary with
+    the set of selected fields for each section, the sections that are not in
+    the dictionary get all of their fields
+    """
+    if not fieldSpec:
+        return dict()
+    if isinstance(fieldSpec, str):
+        itemList = fieldSpec.split(";")
+    elif isinstance(fieldSpec, list):
+        itemList = fieldSpec
+    else:
+        raise UsageError("fields must be a string or a list of strings")
+
+    fieldSelection = dict()
+    for item in itemList:
+        section, _, fieldText = str(item).strip().partition(":")
+        section = section.strip()
+        if len(section) == 0:
+            continue
+        if section not in selectableFields:
+            raise UsageError(
+                f"unknown fields section: {section}, "
+                f"expecting one of: {', '.join(selectableFields)}"
+            )
+        fieldSet = fieldSelection.setdefault(section, {selectableFields[section][0]})
+        for field in fieldText.split(","):
+            field = field.strip()
+            field = fieldAliases[section].get(field, field)
+            if len(field) == 0:
+                continue
+            if field not in selectableFields[section]:
+                raise UsageError(
+                    f"unknown {section} field: {field}, "
+                    f"expecting one of: {', '.join(selectableFields[section])}"
+                )
+            fieldSet.add(field)
+
+    return fieldSelection
+
+
+def fieldWanted(fieldSet, field):
+    # a fieldSet of None means that there is no selection
+    return fieldSet is None or field in fieldSet
+
+
+def projectEnviroData(topLevel, fieldSelection):
+    """
+    This applies fieldSelection to a complete getEnviroData result, which
+    we use when the result comes from the cache, rather than the dataAPI
+    """
+    testFields = fieldSelection.get("tests")
+    if testFields is not None:
+        for node in topLevel["testData"]:
+            nodeList = node.get("functions", [node])
+            for testNode in nodeList:
+                testNode["tests"] = [
+                    {key: value for key, value in testInfo.items() if key in testFields}
+                    for testInfo in testNode.get("tests", [])
+                ]
+
+    unitFields = fieldSelection.get("unitData")
+    if unitFields is not None:
+        topLevel["unitData"] = [
+            {key: value for key, value in unitInfo.items() if key in unitFields}
+            for unitInfo in topLevel["unitData"]
+        ]
+
+    return topLevel
+
+
+def generateTestInfo(enviroPath, test, testFields=None):
     """
     This function takes an enviroPath and a dataAPI test object
-    and creates a dictionary with the attributes we need
+    and creates a dictionary with the attributes we need.  If testFields
+    is not None, only those attributes are read from the dataAPI
     """
     testInfo = dict()
     testInfo["testName"] = test.name
 
-    testInfo["notes"] = test.notes
-    # stored as 0 or 1
-    testInfo["compoundOnly"] = test.for_compound_only
-    testInfo["time"] = getTime(test.start_time)
-    testInfo["status"] = textStatus(test.status)
-    testInfo["passfail"] = getPassFailString(test)
+    if fieldWanted(testFields, "notes"):
+        testInfo["notes"] = test.notes
+    if fieldWanted(testFields, "compoundOnly"):
+        # stored as 0 or 1
+        testInfo["compoundOnly"] = test.for_compound_only
+    if fieldWanted(testFields, "time"):
+        testInfo["time"] = getTime(test.start_time)
+    if fieldWanted(testFields, "status"):
+        testInfo["status"] = textStatus(test.status)
+    if fieldWanted(testFields, "passfail"):
+        testInfo["passfail"] = getPassFailString(test)
 
     # New to support coded tests in vc24
     if vpythonHasCodedTestSupport() and test.coded_tests_file:
@@ -173,20 +329,42 @@ def generateTestInfo(enviroPath, test):
                 os.path.join(enclosingDirectory, expanded_path)
             )
 
+        # the getEnviroData cache must be invalidated when this file changes
+        codedTestFileSet = getattr(codedTestFileData, "fileSet", None)
+        if codedTestFileSet is not None:
+            codedTestFileSet.add(codedTestFilePath)
+
+        # we always check the file, since it decides if the test is returned
         if os.path.exists(codedTestFilePath) and test.coded_tests_line > 0:
-            testInfo["codedTestFile"] = codedTestFilePath
-            testInfo["codedTestLine"] = test.coded_tests_line
+            if fieldWanted(testFields, "codedTestFile"):
+                testInfo["codedTestFile"] = codedTestFilePath
+            if fieldWanted(testFields, "codedTestLine"):
+                testInfo["codedTestLine"] = test.coded_tests_line
         else:
             testInfo = None
 
     return testInfo
 
 
+# The coded test files used by the tests, this is collected by
+# generateTestInfo() while buildEnviroData() is running
+codedTestFileData = threading.local()
+
+
 # This list is created as we walk the dataAPI list of units->functions
 # in getTestDataVCAST(), and we use it to set the isTestable field when
 # walk the coverage data in the getUnitData() function which has no
 # knowledge of "testabilty"
-globalListOfTestableFunctions = []
+#
+# The list is stored per thread, because the data server can process
+# getEnviroData requests for different environments concurrently
+globalTestableFunctionData = threading.local()
+
+
+def getListOfTestableFunctions():
+    if not hasattr(globalTestableFunctionData, "functionList"):
+        globalTestableFunctionData.functionList = []
+    return globalTestableFunctionData.functionList
 
 
 def getEnviroSupportsMock(api):
@@ -202,8 +380,7 @@ def getEnviroSupportsMock(api):
     return currEnviroSupportsMocking
 
 
-def getTestDataVCAST(api, enviroPath):
-    global globalListOfTestableFunctions
+def getTestDataVCAST(api, enviroPath, testFields=None):
     global enviroSupportsMocking
 
     # Not currently used.
@@ -212,9 +389,9 @@ def getTestDataVCAST(api, enviroPath):
     try:
         coverageType = api.environment.coverage_type_text
     except Exception as err:
-        # In this special case, vcast has given us a valid
-        # handle to the API, so we need to close it here
-        api.close()
+        # In this special case, vcast has given us a valid handle to the
+        # API, so we make sure it is not re-used, the caller closes it
+        invalidateUnitTestApi(enviroPath)
 
         # the dataAPI does not automatically update the coverage DB
         # so we raise an error here if the cover.db is too old
@@ -223,23 +400,27 @@ def getTestDataVCAST(api, enviroPath):
     testList = list()
     sourceFiles = dict()
 
+    # start a fresh list for this environment
+    globalTestableFunctionData.functionList = []
+    testableFunctionList = getListOfTestableFunctions()
+
     # Do compound tests ...
     compoundList = api.TestCase.filter(is_compound_test=True)
     compoundNode = dict()
-    compoundNode["name"] = "Compound Tests"
+    compoundNode["name"] = compoundNodeName
     compoundNode["tests"] = list()
     for test in compoundList:
-        testInfo = generateTestInfo(enviroPath, test)
+        testInfo = generateTestInfo(enviroPath, test, testFields)
         compoundNode["tests"].append(testInfo)
     testList.append(compoundNode)
 
     # Do Init tests ...
     initList = api.TestCase.filter(is_init_test=True)
     initNode = dict()
-    initNode["name"] = "Initialization Tests"
+    initNode["name"] = initNodeName
     initNode["tests"] = list()
     for test in initList:
-        testInfo = generateTestInfo(enviroPath, test)
+        testInfo = generateTestInfo(enviroPath, test, testFields)
         initNode["tests"].append(testInfo)
     testList.append(initNode)
 
@@ -262,7 +443,7 @@ def getTestDataVCAST(api, enviroPath):
                     # Note: the vcast_name has the parameterization only when there is an overload
                     functionNode["name"] = function.vcast_name
                     functionNode["parameterizedName"] = function.long_name
-                    globalListOfTestableFunctions.append(function.long_name)
+                    testableFunctionList.append(function.long_name)
                     functionNode["tests"] = list()
                     for test in function.testcases:
                         if test.is_csv_map:
@@ -270,7 +451,7 @@ def getTestDataVCAST(api, enviroPath):
                         else:
                             # A coded test file might have been renamed or deleted,
                             # in which case generateTestInfo() will return None
-                            testInfo = generateTestInfo(enviroPath, test)
+                            testInfo = generateTestInfo(enviroPath, test, testFields)
                             if testInfo:
                                 functionNode["tests"].append(testInfo)
 
@@ -282,26 +463,129 @@ def getTestDataVCAST(api, enviroPath):
     return testList
 
 
-def getUnitData(api):
+def getFunctionTestCases(function):
+    return [test for test in function.testcases if not test.is_csv_map]
+
+
+def getEnviroOutline(api):
     """
-    This function will return info about the units in an environment
+    This returns the same tree as getTestDataVCAST(), but with a testCount
+    for each node rather than the tests, so that the client can show the
+    environment without loading all of the tests.  The counts include coded
+    tests whose file is missing, which generateTestInfo() drops
+    """
+    outline = list()
+
+    compoundList = api.TestCase.filter(is_compound_test=True)
+    outline.append({"name": compoundNodeName, "testCount": len(compoundList)})
+    initList = api.TestCase.filter(is_init_test=True)
+    outline.append({"name": initNodeName, "testCount": len(initList)})
+
+    for unit in api.Unit.all():
+        if unit.name != "uut_prototype_stubs":
+            unitNode = dict()
+            unitNode["name"] = unit.name
+            try:
+                unitNode["path"] = unit.path
+            except:
+                pass
+            unitNode["functions"] = list()
+            for function in unit.functions:
+                if tstUtilities.isTestableFunction(function):
+                    functionNode = dict()
+                    functionNode["name"] = function.vcast_name
+                    functionNode["parameterizedName"] = function.long_name
+                    functionNode["testCount"] = len(getFunctionTestCases(function))
+                    unitNode["functions"].append(functionNode)
+
+            if len(unitNode["functions"]) > 0:
+                outline.append(unitNode)
+
+    return outline
+
+
+def findTestCases(api, unitName, functionName):
+    """
+    Returns the list of dataAPI test objects for a node of the outline
+    """
+    if unitName == compoundNodeName:
+        return list(api.TestCase.filter(is_compound_test=True))
+    elif unitName == initNodeName:
+        return list(api.TestCase.filter(is_init_test=True))
+
+    for unit in api.Unit.all():
+        if unit.name == unitName:
+            for function in unit.functions:
+                if function.vcast_name == functionName:
+                    return getFunctionTestCases(function)
+            raise UsageError(f"function: {functionName} not found in unit: {unitName}")
+    raise UsageError(f"unit: {unitName} not found")
+
+
+def getTestsPage(
+    api, enviroPath, unitName, functionName, offset, limit, testFields=None
+):
+    """
+    Returns the test details for one page of the tests of a node of the outline,
+    only the tests on the page are read.  The page can have fewer than limit
+    tests, if the coded test file for a test is missing, so the client should
+    use nextOffset, which is None after the last page
+    """
+    testList = findTestCases(api, unitName, functionName)
+    pageList = testList[offset : offset + limit]
+
+    testInfoList = []
+    for test in pageList:
+        testInfo = generateTestInfo(enviroPath, test, testFields)
+        if testInfo:
+            testInfoList.append(testInfo)
+
+    nextOffset = offset + len(pageList)
+    return {
+        "unit": unitName,
+        "function": functionName,
+        "offset": offset,
+        "total": len(testList),
+        "nextOffset": nextOffset if nextOffset < len(testList) else None,
+        "tests": testInfoList,
+    }
+
+
+def getUnitData(api, unitFields=None):
+    """
+    This function will return info about the units in an environment.  If
+    unitFields is not None, only those fields are read from the dataAPI
     """
     unitList = list()
 
+    # the coverage strings all come from one walk of the coverage data
+    coverageWanted = any(
+        fieldWanted(unitFields, field)
+        for field in ["covered", "uncovered", "partiallyCovered"]
+    )
+
     sourceObjects = api.SourceFile.all()
     for sourceObject in sourceObjects:
         sourcePath = sourceObject.display_path
         if sourceObject.is_instrumented:
-            covered, uncovered, partiallyCovered, checksum = getCoverageData(
-                sourceObject
-            )
             unitInfo = dict()
             unitInfo["path"] = sourcePath
-            unitInfo["functionList"] = getFunctionData(sourceObject)
-            unitInfo["cmcChecksum"] = checksum
-            unitInfo["covered"] = covered
-            unitInfo["uncovered"] = uncovered
-            unitInfo["partiallyCovered"] = partiallyCovered
+            if fieldWanted(unitFields, "functionList"):
+                unitInfo["functionList"] = getFunctionData(sourceObject)
+            if coverageWanted:
+                covered, uncovered, partiallyCovered, checksum = getCoverageData(
+                    sourceObject
+                )
+                unitInfo["cmcChecksum"] = checksum
+                unitInfo["covered"] = covered
+                unitInfo["uncovered"] = uncovered
+                unitInfo["partiallyCovered"] = partiallyCovered
+            elif fieldWanted(unitFields, "cmcChecksum"):
+                unitInfo["cmcChecksum"] = sourceObject.checksum
+            if unitFields is not None:
+                unitInfo = {
+                    key: value for key, value in unitInfo.items() if key in unitFields
+                }
             unitList.append(unitInfo)
 
         elif len(sourcePath) > 0:
@@ -315,6 +599,10 @@ def getUnitData(api):
             unitInfo["covered"] = ""
             unitInfo["uncovered"] = ""
             unitInfo["partiallyCovered"] = ""
+            if unitFields is not None:
+                unitInfo = {
+                    key: value for key, value in unitInfo.items() if key in unitFields
+                }
             unitList.append(unitInfo)
 
     return unitList
@@ -325,11 +613,12 @@ def getFunctionData(sourceObject):
     This function will return info about the functions in a source file
     """
     functionList = list()
+    testableFunctionList = getListOfTestableFunctions()
     for function in sourceObject.functions:
         functionInfo = dict()
         functionInfo["name"] = function.name
         functionInfo["startLine"] = function.start_line
-        functionInfo["isTestable"] = function.name in globalListOfTestableFunctions
+        functionInfo["isTestable"] = function.name in testableFunctionList
         functionList.append(functionInfo)
 
     return functionList
@@ -486,41 +775,225 @@ def getCoverageData(sourceObject):
 
 
 def executeVCtest(enviroPath, testIDObject):
-    with cd(os.path.dirname(enviroPath)):
-        returnText = ""
+    # In server mode the clicast instance is already running in the
+    # enviro's parent directory, so we do not need to change the cwd
+    # of the server process, which would block every other environment
+    if pythonUtilities.USE_SERVER:
+        return executeVCtestInEnviroDirectory(enviroPath, testIDObject)
+    else:
+        with changeDirectory(os.path.dirname(enviroPath)):
+            return executeVCtestInEnviroDirectory(enviroPath, testIDObject)
 
-        returnCode, commandOutput = clicastInterface.executeTest(
-            enviroPath, testIDObject
-        )
 
-        # the return codes are defined in clicast.ads -> CLICAST_STATUS_T
-        # 0 means the command ran and the test passed
-        # 28 means the command ran and the test failed
-        # we will treat everything else as a command fail
-        if returnCode == 0 or returnCode == 28:
-            if "TEST RESULT: pass" in commandOutput:
-                returnText += "STATUS:passed\n"
-            else:
-                returnText += "STATUS:failed\n"
-            returnText += f"REPORT:{testIDObject.reportName}\n"
-
-            # Retrieve the expected value x/y and the test time
-            # we don't need to catch dataAPI errors here because
-            # if there is a problem with a version miss-match
-            # we will have already gotten a return code of 15
-            # and not be in this block
-            api = UnitTestApi(enviroPath)
+def executeVCtestInEnviroDirectory(enviroPath, testIDObject):
+    returnText = ""
+
+    returnCode, commandOutput = clicastInterface.executeTest(enviroPath, testIDObject)
+
+    # the return codes are defined in clicast.ads -> CLICAST_STATUS_T
+    # 0 means the command ran and the test passed
+    # 28 means the command ran and the test failed
+    # we will treat everything else as a command fail
+    if returnCode == 0 or returnCode == 28:
+        if "TEST RESULT: pass" in commandOutput:
+            returnText += "STATUS:passed\n"
+        else:
+            returnText += "STATUS:failed\n"
+        returnText += f"REPORT:{testIDObject.reportName}\n"
+
+        # Retrieve the expected value x/y and the test time
+        # we don't need to catch dataAPI errors here because
+        # if there is a problem with a version miss-match
+        # we will have already gotten a return code of 15
+        # and not be in this block
+        api = openUnitTestApi(enviroPath)
+        try:
             testList = api.TestCase.filter(name=testIDObject.testName)
             if len(testList) > 0:
                 returnText += f"PASSFAIL:{getPassFailString(testList[0])}\n"
                 returnText += f"TIME:{getTime(testList[0].start_time)}\n"
-            api.close()
+        finally:
+            closeUnitTestApi(api)
+
+        returnText += commandOutput.rstrip()
+    else:
+        returnText = commandOutput
+
+    return returnCode, returnText.rstrip()
+
+
+def executeVCtests(enviroPath, testIDObjectList):
+    """
+    This runs all of the tests in testIDObjectList, which must be for the
+    same environment, and returns a list with a result record for each test.
+
+    Each record is emitted as soon as the test completes, with the STATUS
+    and REPORT, the PASSFAIL and TIME values come from the dataAPI, which we
+    open once after all of the tests are done, rather than once per test
+    """
+    recordList = [None] * len(testIDObjectList)
+
+    def onTestComplete(index, returnCode, commandOutput):
+        testIDObject = testIDObjectList[index]
+        record = {"testId": testIDObject.testIDString, "exitCode": returnCode}
+        # see executeVCtestInEnviroDirectory() for the meaning of the return codes
+        if returnCode == 0 or returnCode == 28:
+            if "TEST RESULT: pass" in commandOutput:
+                record["STATUS"] = "passed"
+            else:
+                record["STATUS"] = "failed"
+            record["REPORT"] = testIDObject.reportName
+        record["text"] = commandOutput.rstrip().split("\n")
+        recordList[index] = record
+        pythonUtilities.emitRecord({"testResult": record})
+
+    if pythonUtilities.USE_SERVER:
+        clicastInterface.executeTests(enviroPath, testIDObjectList, onTestComplete)
+    else:
+        with changeDirectory(os.path.dirname(enviroPath)):
+            clicastInterface.executeTests(enviroPath, testIDObjectList, onTestComplete)
+
+    executedList = [
+        (testIDObject, record)
+        for testIDObject, record in zip(testIDObjectList, recordList)
+        if "STATUS" in record
+    ]
+    if len(executedList) > 0:
+        api = openUnitTestApi(enviroPath)
+        try:
+            for testIDObject, record in executedList:
+                testList = api.TestCase.filter(name=testIDObject.testName)
+                if len(testList) > 0:
+                    record["PASSFAIL"] = getPassFailString(testList[0])
+                    record["TIME"] = getTime(testList[0].start_time)
+        finally:
+            closeUnitTestApi(api)
+
+    return recordList
 
-            returnText += commandOutput.rstrip()
-        else:
-            returnText = commandOutput
 
-        return returnCode, returnText.rstrip()
+def rebuildOneEnvironment(enviroPath, jsonOptions, requestState, listeners):
+    """
+    Runs on the rebuildMany thread pool, and returns the result record for
+    enviroPath.  We hold the environment lock while we rebuild, so that no
+    other request uses the environment while it is deleted and re-created
+    """
+    outputCallback, recordCallback = listeners
+    enviroName = os.path.basename(enviroPath)
+    record = {"enviro": enviroPath, "exitCode": 0, "seconds": 0.0}
+
+    # prefix the output with the environment name, since the
+    # output of the parallel rebuilds is interleaved
+    if outputCallback is not None:
+        pythonUtilities.setOutputListener(
+            lambda line: outputCallback(f"[{enviroName}] {line}"), recordCallback
+        )
+    pythonUtilities.setRequestState(requestState)
+
+    startTime = time.perf_counter()
+    try:
+        with pythonUtilities.getEnviroLock(enviroPath):
+            if pythonUtilities.requestIsCancelled():
+                record["status"] = "cancelled"
+                record["exitCode"] = int(errorCodes.clicastCommandAborted)
+                return record
+            if not os.path.isdir(enviroPath):
+                raise UsageError(f"environment does not exist: {enviroPath}")
+
+            pythonUtilities.emitRecord(
+                {"rebuildProgress": {"enviro": enviroPath, "status": "running"}}
+            )
+            invalidateUnitTestApi(enviroPath)
+            enviroDataVersions.discardSnapshot(enviroPath)
+            enviroDataCache.discardEnviroData(enviroPath)
+            returnCode, commandOutput = clicastInterface.rebuildEnvironment(
+                enviroPath, jsonOptions
+            )
+        record["exitCode"] = returnCode
+        record["status"] = "succeeded" if returnCode == 0 else "failed"
+        record["text"] = commandOutput.rstrip().split("\n")
+    except Exception as error:
+        record["exitCode"] = int(errorCodes.testInterfaceError)
+        record["status"] = "failed"
+        record["text"] = [str(error)]
+    finally:
+        record["seconds"] = round(time.perf_counter() - startTime, 3)
+        pythonUtilities.setOutputListener(None)
+        pythonUtilities.setRequestState(None)
+
+    return record
+
+
+def writeToStderr(line):
+    sys.stderr.write(line + "\n")
+    sys.stderr.flush()
+
+
+def formatRebuildTable(recordList):
+    """
+    Returns the rebuildMany results as lines of text, for the log
+    """
+    nameWidth = max([len("Environment")] + [len(r["enviro"]) for r in recordList])
+    lineList = [f"{'Environment':<{nameWidth}}  {'Status':<9}  {'Exit':>5}  Seconds"]
+    for record in recordList:
+        lineList.append(
+            f"{record['enviro']:<{nameWidth}}  {record['status']:<9}  "
+            f"{record['exitCode']:>5}  {record['seconds']:.1f}"
+        )
+    return lineList
+
+
+def rebuildEnvironments(enviroPathList, jsonOptions, maxParallel):
+    """
+    Rebuilds the environments in enviroPathList, with at most maxParallel
+    rebuilds running at the same time.  A {"rebuildProgress": ...} record is
+    emitted when each rebuild starts and completes, and we return the list of
+    result records, in the same order as enviroPathList.
+
+    The work is done by the clicast processes that each rebuild starts,
+    so we use a thread pool to drive them, and maxParallel bounds the
+    number of clicast processes that are running at the same time
+    """
+    listeners = pythonUtilities.getOutputListener()
+    if not pythonUtilities.USE_SERVER:
+        # in command line mode stdout carries the JSON response, so
+        # the clicast output of the rebuilds is echoed to stderr
+        listeners = (writeToStderr, None)
+    requestState = pythonUtilities.getRequestState()
+    recordList = [None] * len(enviroPathList)
+    completedCount = 0
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=maxParallel, thread_name_prefix="rebuild"
+    ) as executor:
+        futureMap = dict()
+        for index, enviroPath in enumerate(enviroPathList):
+            future = executor.submit(
+                rebuildOneEnvironment,
+                enviroPath,
+                jsonOptions,
+                requestState,
+                listeners,
+            )
+            futureMap[future] = index
+
+        for future in concurrent.futures.as_completed(futureMap):
+            record = future.result()
+            recordList[futureMap[future]] = record
+            completedCount += 1
+            progress = {key: value for key, value in record.items() if key != "text"}
+            progress["completed"] = completedCount
+            progress["total"] = len(enviroPathList)
+            pythonUtilities.emitRecord({"rebuildProgress": progress})
+
+    # in command line mode stdout carries the JSON response, and the
+    # client can build the table from the results
+    if pythonUtilities.USE_SERVER:
+        logMessage(
+            "  rebuildMany results:\n    "
+            + "\n    ".join(formatRebuildTable(recordList))
+        )
+    return recordList
 
 
 def processVResults(filePath):
@@ -544,8 +1017,20 @@ def processVResults(filePath):
         print(f"{filePath} not found")
 
 
+def reportDirectory(enviroPath):
+    """
+    The reports are generated with absolute paths, so in server mode we
+    do not change the cwd, since that would serialize the report work for
+    all environments on the cwdLock.  The command line keeps the cd
+    """
+    if pythonUtilities.USE_SERVER:
+        return contextlib.nullcontext()
+    else:
+        return changeDirectory(os.path.dirname(enviroPath))
+
+
 def getResults(enviroPath, testIDObject):
-    with cd(os.path.dirname(enviroPath)):
+    with reportDirectory(enviroPath):
         commands = list()
         commands.append("report")
         try:
@@ -585,6 +1070,7 @@ def getCodeBasedTestNames(filePath):
 
 class testID:
     def __init__(self, enviroPath, testIDString):
+        self.testIDString = testIDString
         self.enviroName, restOfString = testIDString.split("|")
         pieces = restOfString.split(".")
         self.unitName = pieces[0]
@@ -596,6 +1082,7 @@ class testID:
         temp = ".".join([self.unitName, self.functionName, self.testName])
         hashString = hashlib.md5(temp.encode("utf-8")).hexdigest()
         self.reportName = os.path.join(enviroPath, hashString) + ".html"
+        self.enviroPath = os.path.abspath(enviroPath)
 
 
 def validateClicastCommand(command, mode):
@@ -603,7 +1090,7 @@ def validateClicastCommand(command, mode):
     The --clicast arg is only required for a sub-set of modes, so we do
     those checks here, and throw usage error if there is a problem
     """
-    if mode in ["executeTest", "rebuild"]:
+    if mode in ["executeTest", "executeTests", "rebuild", "rebuildMany"]:
         if command is None or len(command) == 0:
             raise UsageError("--clicast argument is required")
         elif os.path.isfile(command) or (
@@ -720,19 +1207,122 @@ def getProjectCompilerData(api):
     return compilerList
 
 
-def find_vce_files(root_dir):
-    vce_files = []
+def getWorkspaceEnviro(vce_path, fieldSelection=None):
+    """
+    Returns the data for one environment of the workspace, and None, or None
+    and the error.  This runs in the getWorkspaceEnviroList() worker processes
+    """
+    fieldSelection = fieldSelection or dict()
+    try:
+        api = UnitTestApi(vce_path)
+        try:
+            test_data = getTestDataVCAST(api, vce_path, fieldSelection.get("tests"))
+            unit_data = getUnitData(api, fieldSelection.get("unitData"))
+            mocking_support = getEnviroSupportsMock(api)
+        finally:
+            api.close()
+
+        enviroNode = {
+            "vcePath": normalize_path(vce_path),
+            "testData": test_data,
+            "unitData": unit_data,
+            "mockingSupport": mocking_support,
+        }
+        return enviroNode, None
 
-    def scan_dir(path):
-        with os.scandir(path) as entries:
-            for entry in entries:
-                if entry.is_file() and entry.name.endswith(".vce"):
-                    vce_files.append(entry.path)
-                elif entry.is_dir(follow_symlinks=False):
-                    scan_dir(entry.path)
+    except Exception as err:
+        return None, f"{vce_path}: {str(err)}"
 
-    scan_dir(root_dir)
-    return vce_files
+
+def getWorkspaceEnviroList(vce_files, workerCount, fieldSelection=None):
+    """
+    Loads the environments on a pool of workerCount processes, since the
+    dataAPI work is CPU bound Python, threads would not help.  Returns the
+    list of environment data and the list of errors, both in the order of
+    vce_files, so the result does not depend on which worker finishes first
+    """
+    if workerCount <= 0:
+        workerCount = os.cpu_count() or 1
+    workerCount = min(workerCount, len(vce_files))
+
+    resultList = [None] * len(vce_files)
+    if workerCount > 1 and len(vce_files) >= minParallelEnviros:
+        try:
+            # we use spawn on all platforms, because forking the
+            # multi-threaded data server is not safe
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workerCount, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                futureList = [
+                    executor.submit(getWorkspaceEnviro, vce_path, fieldSelection)
+                    for vce_path in vce_files
+                ]
+                for index, future in enumerate(futureList):
+                    resultList[index] = future.result()
+        except (OSError, concurrent.futures.BrokenExecutor) as error:
+            # in command line mode stdout carries the JSON response
+            logDiagnostic(
+                f"  workspace worker processes failed: {error}", logLevel.error
+            )
+
+    # anything that the pool did not do, because it could not be
+    # started, or a worker died, is done here one by one
+    for index, vce_path in enumerate(vce_files):
+        if resultList[index] is None:
+            resultList[index] = getWorkspaceEnviro(vce_path, fieldSelection)
+
+    enviro_list = [enviroNode for enviroNode, _ in resultList if enviroNode]
+    errors = [error for _, error in resultList if error]
+    return enviro_list, errors
+
+
+def find_vce_files(root_dir, excludeList=None, maxDepth=-1):
+    # the workspace index only lists the directories that have changed
+    return workspaceIndex.findVceFiles(root_dir, excludeList, maxDepth)
+
+
+def buildEnviroData(pathToUse, fieldSelection=None):
+    """
+    This function returns the getEnviroData response for pathToUse, from
+    the on-disk cache if the environment has not changed since it was stored.
+    fieldSelection is the result of parseFieldSelection(), only the complete
+    data is stored in the cache, but a selection can be applied to it
+    """
+    fieldSelection = fieldSelection or dict()
+    topLevel = enviroDataCache.loadEnviroData(pathToUse)
+    if topLevel is not None:
+        return projectEnviroData(topLevel, fieldSelection)
+
+    enviroFingerprint = enviroDataCache.getEnviroFingerprint(pathToUse)
+    topLevel = dict()
+
+    try:
+        api = openUnitTestApi(pathToUse)
+    except Exception as err:
+        raise UsageError(err)
+
+    codedTestFileData.fileSet = set()
+    # the handle must be released even if building the data fails, or
+    # the cache entry stays in use, and is never reaped or invalidated
+    try:
+        # it's important that getTetDataVCAST() is called first since it sets up
+        # the global list of testable functions that getUnitData() needs
+        topLevel["testData"] = getTestDataVCAST(
+            api, pathToUse, fieldSelection.get("tests")
+        )
+        topLevel["unitData"] = getUnitData(api, fieldSelection.get("unitData"))
+        topLevel["enviro"] = dict()
+        topLevel["mockingSupport"] = getEnviroSupportsMock(api)
+        codedTestFileList = list(codedTestFileData.fileSet)
+    finally:
+        codedTestFileData.fileSet = None
+        closeUnitTestApi(api)
+
+    if len(fieldSelection) == 0:
+        enviroDataCache.storeEnviroData(
+            pathToUse, enviroFingerprint, codedTestFileList, topLevel
+        )
+    return topLevel
 
 
 def processCommandLogic(mode, clicast, pathToUse, testString="", options=""):
@@ -779,30 +1369,25 @@ def processCommandLogic(mode, clicast, pathToUse, testString="", options=""):
         returnObject = topLevel
 
     elif mode == "getWorkspaceEnviroData":
-        enviro_list = []
-        errors = []
+        # options can contain the number of worker processes, a list of fnmatch
+        # patterns for the directories to skip, and the number of levels to scan:
+        #     {"workers": N, "exclude": [...], "maxDepth": N}
+        # and a field selection, see getEnviroData
         topLevel = {}
-        vce_files = find_vce_files(pathToUse)
-
-        for vce_path in vce_files:
-            try:
-                api = UnitTestApi(vce_path)
-                test_data = getTestDataVCAST(api, vce_path)
-                unit_data = getUnitData(api)
-                mocking_support = getEnviroSupportsMock(api)
-                api.close()
-
-                enviro_list.append(
-                    {
-                        "vcePath": normalize_path(vce_path),
-                        "testData": test_data,
-                        "unitData": unit_data,
-                        "mockingSupport": mocking_support,
-                    }
-                )
-
-            except Exception as err:
-                errors.append(f"{vce_path}: {str(err)}")
+        jsonOptions = processOptions(options) or dict()
+        fieldSelection = parseFieldSelection(jsonOptions.get("fields"))
+        try:
+            workerCount = int(jsonOptions.get("workers", workspaceWorkers))
+            maxDepth = int(jsonOptions.get("maxDepth", -1))
+            excludeList = jsonOptions.get("exclude")
+            if excludeList is not None:
+                excludeList = [str(pattern) for pattern in excludeList]
+        except (TypeError, ValueError):
+            raise UsageError("--options argument is invalid for getWorkspaceEnviroData")
+        vce_files = find_vce_files(pathToUse, excludeList, maxDepth)
+        enviro_list, errors = getWorkspaceEnviroList(
+            vce_files, workerCount, fieldSelection
+        )
 
         topLevel["enviro"] = enviro_list
         if errors:
@@ -811,22 +1396,70 @@ def processCommandLogic(mode, clicast, pathToUse, testString="", options=""):
         returnObject = topLevel
 
     elif mode == "getEnviroData":
-        topLevel = dict()
+        # options can contain a field selection, so that only the fields that
+        # the client needs are read from the dataAPI, for example:
+        #     {"fields": "tests:name,status;unitData:covered,uncovered"}
+        jsonOptions = processOptions(options) or dict()
+        fieldSelection = parseFieldSelection(jsonOptions.get("fields"))
+
+        if len(fieldSelection) > 0:
+            # The pre-warmed data and the version snapshots are for the
+            # complete data, so they are not used for a selection
+            returnObject = buildEnviroData(pathToUse, fieldSelection)
+        else:
+            topLevel = None
+            # In server mode, the pre-warm thread might have done the work already
+            if pythonUtilities.USE_SERVER:
+                topLevel = enviroDataVersions.takePrewarmedData(pathToUse)
+            if topLevel is None:
+                topLevel = buildEnviroData(pathToUse)
+            returnObject = topLevel
+
+            # In server mode, we keep a snapshot of the data, so that if the
+            # client sends the version token from the last response, we can
+            # return only what has changed since then
+            if pythonUtilities.USE_SERVER:
+                returnObject = enviroDataVersions.buildVersionedResponse(
+                    pathToUse, topLevel, jsonOptions.get("versionToken")
+                )
 
+    elif mode == "getEnviroOutline":
         try:
-            api = UnitTestApi(pathToUse)
+            api = openUnitTestApi(pathToUse)
         except Exception as err:
             raise UsageError(err)
-
-        # it's important that getTetDataVCAST() is called first since it sets up
-        # the global list of testable functions that getUnitData() needs
-        topLevel["testData"] = getTestDataVCAST(api, pathToUse)
-        topLevel["unitData"] = getUnitData(api)
-        topLevel["enviro"] = dict()
-        topLevel["mockingSupport"] = getEnviroSupportsMock(api)
-
-        api.close()
-        returnObject = topLevel
+        try:
+            returnObject = {
+                "outline": getEnviroOutline(api),
+                "mockingSupport": getEnviroSupportsMock(api),
+            }
+        finally:
+            closeUnitTestApi(api)
+
+    elif mode == "getTests":
+        # options identifies the node of the outline, and the page to return:
+        #     {"unit": name, "function": name, "offset": N, "limit": N}
+        # for the compound and init nodes the function is not used, and
+        # "fields" can select the test fields, for example: "tests:name,status"
+        jsonOptions = processOptions(options) or dict()
+        testFields = parseFieldSelection(jsonOptions.get("fields")).get("tests")
+        try:
+            unitName = str(jsonOptions["unit"])
+            functionName = str(jsonOptions.get("function", ""))
+            offset = max(int(jsonOptions.get("offset", 0)), 0)
+            limit = max(int(jsonOptions.get("limit", defaultTestPageSize)), 1)
+        except (KeyError, TypeError, ValueError):
+            raise UsageError("--options argument is invalid, expecting a unit name")
+        try:
+            api = openUnitTestApi(pathToUse)
+        except Exception as err:
+            raise UsageError(err)
+        try:
+            returnObject = getTestsPage(
+                api, pathToUse, unitName, functionName, offset, limit, testFields
+            )
+        finally:
+            closeUnitTestApi(api)
 
     elif mode == "executeTest":
         try:
@@ -840,6 +1473,27 @@ def processCommandLogic(mode, clicast, pathToUse, testString="", options=""):
         returnCode, returnText = executeVCtest(pathToUse, testIDObject)
         returnObject = {"text": returnText.split("\n")}
 
+    elif mode == "executeTests":
+        # options contains the list of test IDs: {"tests": [testID, ...]}
+        jsonOptions = processOptions(options) or dict()
+        testIDObjectList = []
+        try:
+            for testString in jsonOptions["tests"]:
+                testIDObject = testID(pathToUse, testString)
+                # remove any left over report file ...
+                if os.path.isfile(testIDObject.reportName):
+                    os.remove(testIDObject.reportName)
+                testIDObjectList.append(testIDObject)
+        except:
+            raise UsageError("--options argument is invalid, expecting a list of tests")
+        recordList = executeVCtests(pathToUse, testIDObjectList)
+        # the return code is the first one that is not a normal pass or fail
+        for record in recordList:
+            if record["exitCode"] not in [0, 28]:
+                returnCode = record["exitCode"]
+                break
+        returnObject = {"tests": recordList}
+
     elif mode == "report":
         try:
             testIDObject = testID(pathToUse, testString)
@@ -873,11 +1527,41 @@ def processCommandLogic(mode, clicast, pathToUse, testString="", options=""):
 
         # we don't set the return object for rebuild, because we echo in real-time
         jsonOptions = processOptions(options)
+        enviroDataCache.discardEnviroData(pathToUse)
         returnCode, commandOutput = clicastInterface.rebuildEnvironment(
             pathToUse, jsonOptions
         )
         returnObject = {"text": commandOutput.split("\n")}
 
+    elif mode == "rebuildMany":
+        # options contains the list of environments, the optional ENVIRO.*
+        # updates that are applied to all of them, and the optional maximum
+        # number of parallel rebuilds:
+        #     {"enviros": [path, ...], "options": {...}, "maxParallel": N}
+        jsonOptions = processOptions(options) or dict()
+        try:
+            enviroPathList = [
+                os.path.abspath(enviroPath) for enviroPath in jsonOptions["enviros"]
+            ]
+            enviroOptions = jsonOptions.get("options") or dict()
+            maxParallel = int(jsonOptions.get("maxParallel", defaultRebuildParallel))
+        except:
+            raise UsageError(
+                "--options argument is invalid, expecting a list of environments"
+            )
+        recordList = rebuildEnvironments(
+            enviroPathList, enviroOptions, max(maxParallel, 1)
+        )
+        # the return code is the first failure
+        for record in recordList:
+            if record["exitCode"] != 0:
+                returnCode = record["exitCode"]
+                break
+        summary = {"total": len(recordList)}
+        for status in ["succeeded", "failed", "cancelled"]:
+            summary[status] = len([r for r in recordList if r["status"] == status])
+        returnObject = {"results": recordList, "summary": summary}
+
     else:
         modeListAsString = ",".join(modeChoices)
         raise UsageError(
@@ -976,7 +1660,7 @@ def getMCDCResults(enviroPath, unitName, lineNumber):
     """
     Returns the MCDC Report for a specific line in a specific unit.
     """
-    with cd(os.path.dirname(enviroPath)):
+    with reportDirectory(enviroPath):
         commands = list()
         commands.append("mcdcReport")
         try:
@@ -1002,7 +1686,7 @@ def getMCDCLines(enviroPath):
     """
     Returns all MCDC lines for all units within an environment.
     """
-    with cd(os.path.dirname(enviroPath)):
+    with reportDirectory(enviroPath):
         commands = list()
         commands.append("mcdcLines")
         try:
@@ -1056,7 +1740,7 @@ def main():
             returnText = "\n".join(returnObject["text"])
             print(returnText)
         else:
-            returnText = json.dumps(returnObject, indent=4)
+            returnText = jsonEncoding.dumps(returnObject, compact=args.compact)
             print(returnText)
 
     # only used for executeTest currently
@@ -1,26 +1,91 @@
+import time
+
+# used for the startup timing that we write to the log
+serverStartTime = time.perf_counter()
+
 import argparse
-import copy
+import concurrent.futures
+import contextlib
 import json
 import os
+import queue
 import sys
 import signal
-import socket
+import threading
 import traceback
 
 import vcastDataServerTypes
 from vcastDataServerTypes import commandType, errorCodes
 
-
 # flask was added to vpython for vc24sp4
-from flask import Flask, request
+from flask import Flask, Response, request
+from werkzeug.serving import ThreadedWSGIServer
 
 
-import clicastInterface
-import testEditorInterface
-import tstUtilities
-import vTestInterface
+import jsonEncoding
+import outputCapture
 import pythonUtilities
-from pythonUtilities import logFileHandle, logMessage, logPrefix
+import serverMetrics
+from pythonUtilities import logLevel, logMessage, logPrefix
+
+# These modules import the dataAPI, mock_helper and the coded test parser,
+# which is slow, so they are imported by loadHeavyModules(), either by the
+# warm-up thread that is started after the server is ready, or on first use
+clicastInterface = None
+enviroDataVersions = None
+enviroPrewarm = None
+testEditorInterface = None
+tstUtilities = None
+unitTestApiCache = None
+vTestInterface = None
+heavyModulesLock = threading.Lock()
+
+# The parsed command line arguments, set by main()
+serverArgs = None
+
+# The file used to persist the most recently used environments, set by main()
+mruFilePath = None
+
+# Successful requests for these commands move the environment to the
+# front of the most recently used list that is used for pre-warming
+enviroUseCommands = [
+    commandType.getEnviroData,
+    commandType.getEnviroOutline,
+    commandType.executeTest,
+    commandType.executeTests,
+    commandType.rebuild,
+    commandType.report,
+    commandType.runClicastCommand,
+]
+
+# These commands lock each of the environments that they work on, so
+# the request must not hold the lock for the path of the request
+selfLockingCommands = [commandType.rebuildMany]
+
+# Each HTTP connection is handled on a thread of a fixed size pool, see
+# pooledWSGIServer, and a command runs on the thread of its connection.
+# This semaphore allows --workers commands to run at the same time,
+# it is created in main()
+commandSlots = None
+numberOfWorkers = 0
+
+# The number of connection threads in addition to --workers, so that the
+# cancel, ping and metrics requests are served while all of the workers
+# are busy, and the other command requests wait for a free slot
+reservedConnections = 4
+
+# The streaming and batch requests run their commands on this pool, since
+# the connection thread is busy sending the response, or waits for all
+# of the commands of the batch.  It is created in main()
+helperExecutor = None
+
+# The commands that we keep metrics for, loadHeavyModules()
+# adds the vTestInterface.modeChoices to this list
+knownCommands = set([command.value for command in commandType])
+
+# The choice list processing uses the tstUtilities.globalOutputLog
+# so we serialize the completion requests for all environments
+completionLock = threading.Lock()
 
 
 def init_application(logFilePath):
@@ -29,7 +94,7 @@ def init_application(logFilePath):
 
         @app.route("/ping", methods=["POST"])
         def pingRoute():
-            return ping()
+            return jsonResponse(ping())
 
         @app.route("/shutdown", methods=["POST"])
         def shutdownRoute():
@@ -42,40 +107,408 @@ def init_application(logFilePath):
             # Note: this string must match what is in vcastAdapter.ts -> startServer()
             clientRequest = decodeRequest(clientRequestJson)
             # Ensure clientRequest is correctly decoded or processed
-            return runcommand(clientRequest, clientRequestJson)
+            return jsonResponse(executeRequest(clientRequest, clientRequestJson))
 
-        # Note: this string must match what is in vcastAdapter.ts -> startServer()
-        print(
-            f" * vcastDataServer is starting on {vcastDataServerTypes.HOST}:{vcastDataServerTypes.PORT}",
-            flush=True,
-        )
-        print(f" * Server log file path: {logFilePath}", flush=True)
-        logMessage(
-            f"{logPrefix()} port: {vcastDataServerTypes.PORT} clicast: {pythonUtilities.globalClicastCommand}\n"
-        )
+        @app.route("/runcommandstream", methods=["POST"])
+        def runcommandstreamRoute():
+            # Same request as /runcommand, but the response is NDJSON
+            clientRequestJson = request.get_json()
+            clientRequest = decodeRequest(clientRequestJson)
+            return Response(
+                executeStreamingRequest(clientRequest, clientRequestJson),
+                mimetype="application/x-ndjson",
+            )
+
+        @app.route("/metrics", methods=["GET", "POST"])
+        def metricsRoute():
+            # JSON by default, use ?format=prometheus for the text format
+            if request.args.get("format") == "prometheus":
+                return Response(
+                    serverMetrics.metricsAsPrometheusText(metricsGauges()),
+                    mimetype="text/plain; version=0.0.4",
+                )
+            else:
+                metricsData = serverMetrics.metricsAsDict(metricsGauges())
+                metricsData["clicastInstances"] = (
+                    pythonUtilities.getClicastInstanceStatus()
+                )
+                metricsData["clicastHealth"] = pythonUtilities.getClicastHealthStatus()
+                return jsonResponse(metricsData)
+
+        @app.route("/runbatch", methods=["POST"])
+        def runbatchRoute():
+            # Data from the request is a stringyfied json list of requests
+            clientRequestListJson = request.get_json()
+            return jsonResponse(executeBatch(clientRequestListJson))
 
     return app
 
 
+def jsonResponse(data):
+    """
+    This must be called from a request handler, it returns data as compact
+    JSON, compressed if the client sent an Accept-Encoding that we support
+    """
+    payload = jsonEncoding.compactDumps(data).encode("utf-8")
+    payload, contentEncoding = jsonEncoding.compressPayload(
+        payload, request.headers.get("Accept-Encoding")
+    )
+    response = Response(payload, mimetype="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if contentEncoding is not None:
+        response.headers["Content-Encoding"] = contentEncoding
+    return response
+
+
+def announceServer(logFilePath):
+    """
+    This is called as soon as the server socket is bound, the
+    client starts sending requests when it sees these lines
+    """
+    # Note: this string must match what is in vcastAdapter.ts -> startServer()
+    print(
+        f" * vcastDataServer is starting on {vcastDataServerTypes.HOST}:{vcastDataServerTypes.PORT}",
+        flush=True,
+    )
+    print(f" * Server log file path: {logFilePath}", flush=True)
+    logMessage(
+        f"{logPrefix()} port: {vcastDataServerTypes.PORT} clicast: {pythonUtilities.globalClicastCommand}\n"
+    )
+
+
+def loadHeavyModules():
+    """
+    This function imports the modules that use the dataAPI, it is safe to call
+    this from any thread, and it returns immediately once the modules are loaded
+    """
+    global clicastInterface
+    global enviroDataVersions
+    global enviroPrewarm
+    global testEditorInterface
+    global tstUtilities
+    global unitTestApiCache
+    global vTestInterface
+
+    with heavyModulesLock:
+        if vTestInterface is not None:
+            return
+
+        import clicastInterface as clicastInterfaceModule
+        import enviroDataVersions as enviroDataVersionsModule
+        import enviroPrewarm as enviroPrewarmModule
+        import testEditorInterface as testEditorInterfaceModule
+        import tstUtilities as tstUtilitiesModule
+        import unitTestApiCache as unitTestApiCacheModule
+        import vTestInterface as vTestInterfaceModule
+
+        unitTestApiCacheModule.maxCacheSize = serverArgs.apiCacheSize
+        unitTestApiCacheModule.idleTimeout = serverArgs.apiCacheTimeout
+        unitTestApiCacheModule.startIdleReaper()
+        enviroPrewarmModule.maxMruSize = serverArgs.prewarmCount
+        vTestInterfaceModule.workspaceWorkers = serverArgs.workspaceWorkers
+        vTestInterfaceModule.workspaceIndex.watchMode = serverArgs.workspaceWatch
+        vTestInterfaceModule.enviroDataCache.enabled = not serverArgs.noEnviroDataCache
+        knownCommands.update(vTestInterfaceModule.modeChoices)
+
+        clicastInterface = clicastInterfaceModule
+        enviroDataVersions = enviroDataVersionsModule
+        enviroPrewarm = enviroPrewarmModule
+        testEditorInterface = testEditorInterfaceModule
+        tstUtilities = tstUtilitiesModule
+        unitTestApiCache = unitTestApiCacheModule
+        # this must be last since it is used to check if the modules are loaded
+        vTestInterface = vTestInterfaceModule
+
+
+def warmUp(startupTimes):
+    """
+    This runs in a background thread after the server is ready, and
+    writes the startup timing breakdown to the log when it's done
+    """
+    try:
+        loadHeavyModules()
+        startupTimes.append(("warm-up", time.perf_counter()))
+        prewarmList = enviroPrewarm.startPrewarmThread(mruFilePath)
+        if len(prewarmList) > 0:
+            logMessage(f"{logPrefix()} pre-warming: {', '.join(prewarmList)}")
+    except Exception:
+        logMessage("  ERROR: warm-up failed", logLevel.error)
+        logMessage(traceback.format_exc(), logLevel.error)
+
+    timingText = []
+    previousTime = serverStartTime
+    for label, timeStamp in startupTimes:
+        timingText.append(f"{label}: {timeStamp - previousTime:.3f}s")
+        previousTime = timeStamp
+    logMessage(
+        f"{logPrefix()} startup timing: {', '.join(timingText)}, total: {previousTime - serverStartTime:.3f}s"
+    )
+
+
 def ping():
     logMessage(f"{logPrefix()} received ping request, responding 'alive'")
     # we return the clicast path since the client needs this
     return {"text": "alive"}
 
 
+def metricsGauges():
+    """
+    Current values that are reported by the /metrics route
+    """
+    gauges = dict()
+    gauges["clicastInstances"] = len(pythonUtilities.clicastInstances)
+    gauges["clicastCrashes"] = sum(pythonUtilities.crashCounts.values())
+    gauges["quarantinedInstances"] = len(pythonUtilities.quarantinedInstances)
+    if vTestInterface is not None:
+        gauges["apiCacheSize"] = len(unitTestApiCache.apiCache)
+        gauges["enviroSnapshots"] = len(enviroDataVersions.enviroSnapshots)
+    else:
+        gauges["apiCacheSize"] = 0
+        gauges["enviroSnapshots"] = 0
+    gauges["workerThreads"] = numberOfWorkers
+    return gauges
+
+
 def shutdown():
     logMessage(f"\n{logPrefix()} received shutdown request ...")
     # terminate all of the clicast processes
-    # Need a copy of the keys because we are modifying the dictionary
-    # while looping over it would cause an error
-    keyList = list(pythonUtilities.clicastInstances.keys())
-    for enviroPath in keyList:
-        logMessage(f"  terminating clicast process for: {enviroPath}")
-        clicastInterface.closeEnvironmentConnection(enviroPath)
+    pythonUtilities.closeAllClicastInstances()
+
+    if unitTestApiCache is not None:
+        unitTestApiCache.closeAllUnitTestApis()
 
     # TBD: is there an app.shutdown() call to do this?
     logMessage("  vcastDataServer is exiting ...")
-    sys.exit(0)
+    pythonUtilities.stopLogWriter()
+    if threading.current_thread() is threading.main_thread():
+        sys.exit(0)
+    else:
+        # sys.exit() in a request thread would only end that thread
+        os._exit(0)
+
+
+def metricsCommandName(command):
+    """
+    We only use the known commands as metric keys, so that bad
+    requests cannot create an unlimited number of metrics
+    """
+    if command in knownCommands:
+        return command
+    else:
+        return "unknown"
+
+
+def runcommandWithEnviroLock(clientRequest, clientRequestText):
+    """
+    Requests for the same environment share a clicast instance and
+    dataAPI files, so we serialize them using the per environment lock,
+    and run them on the enviroThread that owns the cached dataAPI handle
+    """
+    startTime = time.perf_counter()
+    serverMetrics.startCommand(metricsCommandName(clientRequest.command))
+    pythonUtilities.startRequest(getattr(clientRequest, "requestId", ""))
+    if clientRequest.command in selfLockingCommands:
+        enviroLock = contextlib.nullcontext()
+    else:
+        enviroLock = pythonUtilities.getEnviroLock(clientRequest.path)
+    try:
+        with enviroLock:
+            serverMetrics.recordLatency("lockWait", time.perf_counter() - startTime)
+            if pythonUtilities.requestIsCancelled():
+                logMessage("  request cancelled before it started")
+                result = {
+                    "exitCode": errorCodes.clicastCommandAborted,
+                    "data": {"error": ["request cancelled by the client"]},
+                }
+            elif clientRequest.command in selfLockingCommands:
+                result = runcommand(clientRequest, clientRequestText)
+            else:
+                result = unitTestApiCache.runOnEnviroThread(
+                    clientRequest.path, runcommand, clientRequest, clientRequestText
+                )
+    finally:
+        pythonUtilities.endRequest()
+    serverMetrics.endCommand(result["exitCode"], time.perf_counter() - startTime)
+    return result
+
+
+class pooledWSGIServer(ThreadedWSGIServer):
+    """
+    The standard threaded server starts a new thread for every connection,
+    so there is no limit on the number of threads.  This one handles the
+    connections on a fixed size pool, and the connections that arrive
+    while all of the threads are busy wait in the pool's queue
+    """
+
+    def __init__(self, host, port, app, threadCount):
+        super().__init__(host, port, app)
+        self.connectionExecutor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threadCount, thread_name_prefix="vcastConnection"
+        )
+
+    def process_request(self, request, client_address):
+        # process_request_thread() handles the errors and closes the request
+        self.connectionExecutor.submit(
+            self.process_request_thread, request, client_address
+        )
+
+
+def runWithWorkerSlot(function, *args):
+    """
+    All command processing is done using this function, which waits for one
+    of the --workers slots, so that we can report the number of requests
+    waiting to start, and limit the number of commands running at once
+    """
+    serverMetrics.requestQueued()
+    with commandSlots:
+        serverMetrics.requestStarted()
+        try:
+            # the first request might arrive before the warm-up thread is done
+            loadHeavyModules()
+            return function(*args)
+        finally:
+            serverMetrics.requestFinished()
+
+
+def submitToHelperPool(function, *args):
+    return helperExecutor.submit(runWithWorkerSlot, function, *args)
+
+
+def executeRequest(clientRequest, clientRequestText):
+    """
+    This function runs the request on the thread of the connection, once
+    a worker slot is free, so that a long running command for one
+    environment does not block requests for other environments
+    """
+    # cancel requests must not wait behind the requests they are cancelling
+    if clientRequest.command == commandType.cancel:
+        return runcommand(clientRequest, clientRequestText)
+
+    return runWithWorkerSlot(runcommandWithEnviroLock, clientRequest, clientRequestText)
+
+
+class outputStream:
+    """
+    This is used to pass clicast output from the worker thread
+    that processes a request, to the thread that sends the response
+    """
+
+    def __init__(self):
+        self.outputQueue = queue.Queue()
+        # set when the client has disconnected
+        self.closed = False
+
+    def putLine(self, line):
+        if not self.closed:
+            self.outputQueue.put((False, {"output": line}))
+
+    def putRecord(self, record):
+        if not self.closed:
+            self.outputQueue.put((False, record))
+
+    def putResult(self, result):
+        self.outputQueue.put((True, result))
+
+
+def runcommandWithOutputListener(clientRequest, clientRequestText, stream):
+    """
+    This runs on the helper pool, and puts each line of clicast output on the
+    stream as it is read, followed by the result of runcommand()
+    """
+    pythonUtilities.setOutputListener(stream.putLine, stream.putRecord)
+    try:
+        result = runcommandWithEnviroLock(clientRequest, clientRequestText)
+    except Exception:
+        result = {
+            "exitCode": errorCodes.internalServerError,
+            "data": {"error": traceback.format_exc().split("\n")},
+        }
+    finally:
+        pythonUtilities.setOutputListener(None)
+    stream.putResult(result)
+
+
+def executeStreamingRequest(clientRequest, clientRequestText):
+    """
+    This is a generator that yields one JSON record per line: an {"output": line}
+    record for each line of clicast output, the partial results that some
+    commands emit, like {"testResult": ...} for executeTests, and a final
+    record with the same shape as the /runcommand response.  This allows the client to show progress
+    for long running commands like rebuild and executeTest
+    """
+    stream = outputStream()
+    submitToHelperPool(
+        runcommandWithOutputListener, clientRequest, clientRequestText, stream
+    )
+
+    try:
+        while True:
+            isFinal, record = stream.outputQueue.get()
+            yield jsonEncoding.compactDumps(record) + "\n"
+            if isFinal:
+                break
+    finally:
+        # if the client disconnects, we stop queueing output, the
+        # command itself will run to completion on the helper thread
+        stream.closed = True
+
+
+def runBatchGroup(itemList):
+    """
+    itemList is a list of (clientRequest, clientRequestText) for a single
+    environment, we run these in order, and return the list of results
+    """
+    returnList = []
+    for clientRequest, clientRequestText in itemList:
+        returnList.append(runcommandWithEnviroLock(clientRequest, clientRequestText))
+    return returnList
+
+
+def executeBatch(clientRequestListJson):
+    """
+    This function processes a list of client requests.  Requests for different
+    environments are run in parallel on the helper pool, and requests for the same
+    environment are run in the order received.  The results list is in the same
+    order as the request list, and each item has the same shape as runcommand()
+    """
+
+    if not isinstance(clientRequestListJson, list):
+        errorMessage = (
+            f"batch request must be a list, ignoring: '{clientRequestListJson}'"
+        )
+        logMessage(f"  ERROR: {errorMessage}", logLevel.error)
+        return {
+            "exitCode": errorCodes.internalServerError,
+            "data": {"error": [errorMessage]},
+        }
+
+    logMessage(
+        f"\n{logPrefix()} received batch request with {len(clientRequestListJson)} items"
+    )
+
+    # Key is the clean enviro path, value is a list of (index, request, requestJson)
+    indexGroups = dict()
+    for index, clientRequestJson in enumerate(clientRequestListJson):
+        clientRequest = decodeRequest(clientRequestJson)
+        key = pythonUtilities.cleanEnviroPath(clientRequest.path)
+        indexGroups.setdefault(key, []).append(
+            (index, clientRequest, clientRequestJson)
+        )
+
+    futureList = []
+    for group in indexGroups.values():
+        itemList = [
+            (clientRequest, requestJson) for _, clientRequest, requestJson in group
+        ]
+        future = submitToHelperPool(runBatchGroup, itemList)
+        futureList.append((group, future))
+
+    resultList = [None] * len(clientRequestListJson)
+    for group, future in futureList:
+        for (index, _, _), result in zip(group, future.result()):
+            resultList[index] = result
+
+    return {"results": resultList}
 
 
 def runcommand(clientRequest, clientRequestText):
@@ -88,8 +521,30 @@ def runcommand(clientRequest, clientRequestText):
         logMessage(
             f"\n{logPrefix()} received client request: {clientRequest.command} for {clientRequest.path}"
         )
-        logMessage(f"  clicastInstances: {pythonUtilities.clicastInstances.keys()}")
+        logMessage(
+            f"  clicastInstances: {pythonUtilities.clicastInstances.keys()}",
+            logLevel.verbose,
+        )
         exitCode = 0
+        # These commands can modify the environment databases, so we
+        # close the cached dataAPI handle before running them
+        if clientRequest.command in [
+            commandType.closeConnection,
+            commandType.rebuild,
+            commandType.executeTest,
+            commandType.executeTests,
+            commandType.runClicastCommand,
+        ]:
+            unitTestApiCache.invalidateUnitTestApi(clientRequest.path)
+
+        # After these, the client will need a full getEnviroData response
+        if clientRequest.command in [commandType.closeConnection, commandType.rebuild]:
+            enviroDataVersions.discardSnapshot(clientRequest.path)
+
+        if clientRequest.command == commandType.closeConnection:
+            enviroPrewarm.forgetEnviro(clientRequest.path)
+            vTestInterface.enviroDataCache.discardEnviroData(clientRequest.path)
+
         if clientRequest.command == commandType.closeConnection:
 
             returnValue = clicastInterface.closeEnvironmentConnection(
@@ -99,31 +554,60 @@ def runcommand(clientRequest, clientRequestText):
                 "status": returnValue,
                 "newlist": list(pythonUtilities.clicastInstances.keys()),
             }
-            logMessage(f"  clicastInstances: {pythonUtilities.clicastInstances.keys()}")
+            logMessage(
+                f"  clicastInstances: {pythonUtilities.clicastInstances.keys()}",
+                logLevel.verbose,
+            )
+
+        elif clientRequest.command == commandType.prewarm:
+            # options can contain a list of paths: {"paths": [...]}, if
+            # there is no list we use the path, or the most recently used list
+            jsonOptions = json.loads(clientRequest.options or "{}")
+            pathList = jsonOptions.get("paths", [])
+            if len(pathList) == 0 and clientRequest.path:
+                pathList = [clientRequest.path]
+            if len(pathList) == 0:
+                pathList = enviroPrewarm.getMruList()
+            returnData = {"queued": enviroPrewarm.prewarmEnvironments(pathList)}
+            logMessage(f"  pre-warm queued: {returnData['queued']}")
+
+        elif clientRequest.command == commandType.cancel:
+            # options contains the ID of the request to cancel: {"requestId": "..."}
+            requestIdToCancel = json.loads(clientRequest.options or "{}").get(
+                "requestId", ""
+            )
+            returnData = {
+                "requestId": requestIdToCancel,
+                "status": pythonUtilities.cancelRequest(requestIdToCancel),
+            }
+            logMessage(f"  cancel request: {returnData}")
 
         elif clientRequest.command == commandType.choiceListTst:
 
-            # because we are not restarting, we need to clear the global output log
-            testEditorInterface.globalOutputLog.clear()
+            with completionLock:
+                # because we are not restarting, we need to clear the global output log
+                testEditorInterface.globalOutputLog.clear()
 
-            choiceData = testEditorInterface.processTstLine(
-                clientRequest.path, clientRequest.options, clientRequest.unit
-            )
-            returnData = tstUtilities.buildChoiceResponse(choiceData)
+                choiceData = testEditorInterface.processTstLine(
+                    clientRequest.path, clientRequest.options, clientRequest.unit
+                )
+                returnData = tstUtilities.buildChoiceResponse(choiceData)
             logMessage(f"  line received: '{clientRequest.options}'")
             logMessage(
-                "  list returned:\n     " + "\n     ".join(returnData["choiceList"])
+                "  list returned:\n     " + "\n     ".join(returnData["choiceList"]),
+                logLevel.verbose,
             )
 
         elif clientRequest.command == commandType.choiceListCT:
 
-            # because we are not restarting, we need to clear the global output log
-            testEditorInterface.globalOutputLog.clear()
+            with completionLock:
+                # because we are not restarting, we need to clear the global output log
+                testEditorInterface.globalOutputLog.clear()
 
-            choiceData = testEditorInterface.processMockDefinition(
-                clientRequest.path, clientRequest.options
-            )
-            returnData = tstUtilities.buildChoiceResponse(choiceData)
+                choiceData = testEditorInterface.processMockDefinition(
+                    clientRequest.path, clientRequest.options
+                )
+                returnData = tstUtilities.buildChoiceResponse(choiceData)
             logMessage(f"  line received: '{clientRequest.options}'")
 
             # the return data for the vmock implementation is really long
@@ -131,11 +615,14 @@ def runcommand(clientRequest, clientRequestText):
             if len(returnData["choiceList"]) == 1:
                 # we need to strip off the new line chars as the beginning
                 logMessage(
-                    "  returned: " + returnData["choiceList"][0].strip().split("\n")[0]
+                    "  returned: " + returnData["choiceList"][0].strip().split("\n")[0],
+                    logLevel.verbose,
                 )
             else:
                 logMessage(
-                    "  list returned:\n     " + "\n     ".join(returnData["choiceList"])
+                    "  list returned:\n     "
+                    + "\n     ".join(returnData["choiceList"]),
+                    logLevel.verbose,
                 )
 
         elif clientRequest.command == commandType.runClicastCommand:
@@ -145,7 +632,7 @@ def runcommand(clientRequest, clientRequestText):
             )
 
         elif clientRequest.command == commandType.mcdcLines:
-            logMessage(f"  getMCDCLines: {clientRequest.__dict__}")
+            logMessage(f"  getMCDCLines: {clientRequest.__dict__}", logLevel.verbose)
             exitCode, returnData = vTestInterface.processMCDCCommand(
                 clientRequest.command,
                 pythonUtilities.globalClicastCommand,
@@ -153,7 +640,7 @@ def runcommand(clientRequest, clientRequestText):
             )
 
         elif clientRequest.command == commandType.mcdcReport:
-            logMessage(f"  getMCDCReport: {clientRequest.__dict__}")
+            logMessage(f"  getMCDCReport: {clientRequest.__dict__}", logLevel.verbose)
             exitCode, returnData = vTestInterface.processMCDCCommand(
                 clientRequest.command,
                 pythonUtilities.globalClicastCommand,
@@ -180,20 +667,23 @@ def runcommand(clientRequest, clientRequestText):
 
         elif clientRequest.command == "bad-request-format":
             errorMessage = f"client request was improperly formatted, ignoring: '{clientRequestText}'"
-            logMessage(f"  ERROR: {errorMessage}")
+            logMessage(f"  ERROR: {errorMessage}", logLevel.error)
             exitCode = errorCodes.internalServerError
             returnData = {"error": [errorMessage]}
 
         else:
             errorMessage = f"server does not support command: '{clientRequest.command}'"
-            logMessage(f"  ERROR: {errorMessage}")
+            logMessage(f"  ERROR: {errorMessage}", logLevel.error)
             exitCode = errorCodes.internalServerError
             returnData = {"error": [errorMessage]}
 
+        if exitCode == 0 and clientRequest.command in enviroUseCommands:
+            enviroPrewarm.recordEnviroUse(clientRequest.path)
+
     except Exception as error:
         # if anything goes wrong send the stack trace back to the client
         errorMessage = "internal server error"
-        logMessage(f"  ERROR: {errorMessage}")
+        logMessage(f"  ERROR: {errorMessage}", logLevel.error)
         errorTextToReturn = [errorMessage]
         errorTextToReturn.extend(traceback.format_exc().split("\n"))
         exitCode = errorCodes.internalServerError
@@ -233,17 +723,129 @@ def serverSignalHandler(signum, frame):
     shutdown()
 
 
-def findAvailablePort():
+def setupArgs():
     """
-    I have not implemented any error handling, and I am not sure
-    if there could be a race condition between the close and
-    the flask app.start() ... but this seems unlikely.
+    Add Command Line Args
     """
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.bind((vcastDataServerTypes.HOST, 0))
-    availablePortNumber = sock.getsockname()[1]
-    sock.close()
-    vcastDataServerTypes.PORT = availablePortNumber
+    parser = argparse.ArgumentParser(description="VectorCAST Data Server")
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) + 4),
+        help="Number of requests that can be processed concurrently",
+    )
+
+    parser.add_argument(
+        "--apiCacheSize",
+        type=int,
+        default=8,
+        help="Maximum number of dataAPI handles to keep open",
+    )
+
+    parser.add_argument(
+        "--apiCacheTimeout",
+        type=int,
+        default=300,
+        help="Seconds before an unused dataAPI handle is closed",
+    )
+
+    parser.add_argument(
+        "--logLevel",
+        choices=pythonUtilities.logLevelNames.keys(),
+        default="info",
+        help="Use verbose to log the choice lists returned for completion requests",
+    )
+
+    parser.add_argument(
+        "--logMaxSize",
+        type=int,
+        default=10,
+        help="Size in MB at which the server log is rotated, 0 to disable rotation",
+    )
+
+    parser.add_argument(
+        "--maxClicastInstances",
+        type=int,
+        default=8,
+        help="Maximum number of clicast instances, the least recently used is shut down",
+    )
+
+    parser.add_argument(
+        "--clicastIdleTimeout",
+        type=int,
+        default=600,
+        help="Seconds before an unused clicast instance is shut down, 0 to disable",
+    )
+
+    parser.add_argument(
+        "--clicastCommandTimeout",
+        type=int,
+        default=1800,
+        help="Seconds before a hung clicast command is killed, 0 to disable",
+    )
+
+    parser.add_argument(
+        "--clicastShutdownTimeout",
+        type=int,
+        default=5,
+        help="Seconds that clicast instances have to exit on shutdown before they are terminated",
+    )
+
+    parser.add_argument(
+        "--clicastHealthInterval",
+        type=int,
+        default=30,
+        help="Seconds between the checks for clicast instances that have died, 0 to disable",
+    )
+
+    parser.add_argument(
+        "--clicastHealthProbe",
+        action="store_true",
+        help="Also send a no-op command to check that idle clicast instances respond",
+    )
+
+    parser.add_argument(
+        "--outputMode",
+        choices=outputCapture.outputModes,
+        default=outputCapture.fullOutput,
+        help="Keep all of the clicast output, or only the start and end of it",
+    )
+
+    parser.add_argument(
+        "--outputSpoolSize",
+        type=int,
+        default=1,
+        help="Size in MB at which clicast output is moved to a temporary file",
+    )
+
+    parser.add_argument(
+        "--workspaceWorkers",
+        type=int,
+        default=0,
+        help="Number of processes used to load the workspace environments, 0 for one per CPU",
+    )
+
+    parser.add_argument(
+        "--workspaceWatch",
+        action="store_true",
+        help="Keep the workspace environment index up to date with a file system watcher",
+    )
+
+    parser.add_argument(
+        "--noEnviroDataCache",
+        action="store_true",
+        help="Do not use the on-disk cache of the getEnviroData results",
+    )
+
+    parser.add_argument(
+        "--prewarmCount",
+        type=int,
+        default=5,
+        help="Number of recently used environments to pre-warm on startup, 0 to disable",
+    )
+
+    return parser
 
 
 def main():
@@ -252,6 +854,17 @@ def main():
     to interact with the VectorCAST environment.
     """
 
+    global commandSlots
+    global helperExecutor
+    global numberOfWorkers
+    global serverArgs
+    global mruFilePath
+
+    startupTimes = [("imports", time.perf_counter())]
+
+    argParser = setupArgs()
+    serverArgs, restOfArgs = argParser.parse_known_args()
+
     # force server mode on
     pythonUtilities.USE_SERVER = True
 
@@ -259,6 +872,14 @@ def main():
     # we are running under vpython so we use that to find the path to clicast
     vcastInstallation = os.path.dirname(sys.executable)
     pythonUtilities.globalClicastCommand = os.path.join(vcastInstallation, "clicast")
+    pythonUtilities.maxClicastInstances = serverArgs.maxClicastInstances
+    pythonUtilities.clicastIdleTimeout = serverArgs.clicastIdleTimeout
+    pythonUtilities.clicastCommandTimeout = serverArgs.clicastCommandTimeout
+    pythonUtilities.clicastShutdownTimeout = serverArgs.clicastShutdownTimeout
+    pythonUtilities.clicastHealthInterval = serverArgs.clicastHealthInterval
+    pythonUtilities.clicastHealthProbe = serverArgs.clicastHealthProbe
+    outputCapture.outputMode = serverArgs.outputMode
+    outputCapture.spoolThreshold = serverArgs.outputSpoolSize * 1024 * 1024
 
     # By registering this signal handler we can
     # allow ctrl-c to shutdown the server gracefully
@@ -273,11 +894,42 @@ def main():
 
     # start the server
     logFilePath = os.path.join(os.getcwd(), "vcastDataServer.log")
-    with open(logFilePath, "w", buffering=1) as pythonUtilities.logFileHandle:
-        # this will set the vcastDataServerTypes.PORT global
-        findAvailablePort()
+    mruFilePath = os.path.join(os.getcwd(), "vcastDataServer.mru.json")
+    pythonUtilities.currentLogLevel = pythonUtilities.logLevelNames[serverArgs.logLevel]
+    pythonUtilities.startLogWriter(logFilePath, serverArgs.logMaxSize * 1024 * 1024)
+    try:
+        numberOfWorkers = max(1, serverArgs.workers)
+        commandSlots = threading.BoundedSemaphore(numberOfWorkers)
+        helperExecutor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=numberOfWorkers, thread_name_prefix="vcastHelper"
+        )
         app = init_application(logFilePath)
-        app.run(vcastDataServerTypes.HOST, vcastDataServerTypes.PORT, threaded=False)
+
+        # we bind to port 0 so the OS picks a free port, and we serve
+        # from the same socket, so there is no window where another
+        # process could grab the port we picked
+        server = pooledWSGIServer(
+            vcastDataServerTypes.HOST,
+            0,
+            app,
+            numberOfWorkers + reservedConnections,
+        )
+        vcastDataServerTypes.PORT = server.server_port
+        startupTimes.append(("bind", time.perf_counter()))
+
+        announceServer(logFilePath)
+        logMessage(f"{logPrefix()} worker threads: {numberOfWorkers}")
+        logMessage(f"{logPrefix()} JSON encoder: {jsonEncoding.encoderName()}")
+        pythonUtilities.startClicastReaper()
+        pythonUtilities.startClicastHealthMonitor()
+        startupTimes.append(("ready", time.perf_counter()))
+
+        threading.Thread(
+            target=warmUp, args=(startupTimes,), name="warmUp", daemon=True
+        ).start()
+        server.serve_forever()
+    finally:
+        pythonUtilities.stopLogWriter()
 
 
 if __name__ == "__main__":
@@ -15,6 +15,7 @@ class errorCodes(str, Enum):
     testInterfaceError = 253
     couldNotStartClicastInstance = 252
     codedTestCompileError = 251
+    clicastCommandAborted = 250
 
 
 # NOTE: This class must stay in sync with typescript file vcastServer.ts: vcastCommandType
@@ -29,14 +30,20 @@ class commandType(str, Enum):
     runClicastCommand = "runClicastCommand"
     getProjectData = "getProjectData"
     getEnviroData = "getEnviroData"
+    getEnviroOutline = "getEnviroOutline"
+    getTests = "getTests"
     rebuild = "rebuild"
+    rebuildMany = "rebuildMany"
     executeTest = "executeTest"
+    executeTests = "executeTests"
     report = "report"
     parseCBT = "parseCBT"
     choiceListTst = "choiceList-tst"
     choiceListCT = "choiceList-ct"
     mcdcReport = "mcdcReport"
     mcdcLines = "mcdcLines"
+    prewarm = "prewarm"
+    cancel = "cancel"
 
 
 class clientRequest:
@@ -48,6 +55,7 @@ class clientRequest:
         test="",
         options="",
         unit="",
+        requestId="",
     ):
         self.command = command
         self.clicast = clicast
@@ -55,6 +63,8 @@ class clientRequest:
         self.test = test
         self.options = options
         self.unit = unit
+        # optional, used by the cancel command to find the request
+        self.requestId = requestId
 
     def toDict(self):
         data = {}
@@ -64,6 +74,7 @@ class clientRequest:
         data["test"] = self.test
         data["options"] = self.options
         data["unit"] = self.unit
+        data["requestId"] = self.requestId
         return data
 
     @classmethod
@@ -84,7 +95,10 @@ class clientRequest:
         unit = ""
         if "unit" in data:
             unit = data["unit"]
-        return cls(command, clicast, path, test, options, unit)
+        requestId = ""
+        if "requestId" in data:
+            requestId = data["requestId"]
+        return cls(command, clicast, path, test, options, unit, requestId)
 
 
 class mcdcClientRequest:
@@ -0,0 +1,279 @@
+import fnmatch
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+"""
+This module finds the .vce files in a workspace for getWorkspaceEnviroData.
+
+A full recursive scan lists every file in the workspace, including build output
+and .git trees, on every call.  Instead we keep an index with the list of .vce
+files and sub-directories of each directory, and the modification time of the
+directory.  A directory's modification time changes when an entry is added,
+removed or renamed in it, so on a rescan we only stat the directories, and we
+only list the ones that have changed.  The index is persisted in indexDirectory
+so that the command line, which runs in a new process each time, benefits too.
+
+In watch mode, which is used by the data server when the watchdog package is
+available, a file system watcher marks the index as changed when a directory
+or .vce file is created, deleted or moved, so when nothing has changed a
+rescan costs nothing at all.
+"""
+
+from pythonUtilities import (
+    getUserCacheDirectory,
+    logDiagnostic,
+    logLevel,
+    makePrivateDirectory,
+)
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Bump this when the format of the index file changes
+indexFormatVersion = 1
+
+# The directories that are never scanned, these are fnmatch patterns that
+# are matched against the directory name, and the path relative to the root
+defaultExcludes = [".git", ".svn", ".hg", "node_modules"]
+
+# Where the index files are written, one per root, excludes and depth,
+# this is private to the user, see makePrivateDirectory()
+indexDirectory = getUserCacheDirectory("workspaceIndex")
+
+# Set by the server main() to keep the indexes live with a file system watcher
+watchMode = False
+
+# A directory modified this recently might be modified again within the
+# resolution of its modification time, so we don't trust the time, and
+# list the directory again on the next scan
+racyModifySeconds = 2
+
+# Key is the index file path, value is the workspaceIndex object
+indexCache = dict()
+indexCacheLock = threading.Lock()
+
+
+class indexEventHandler(FileSystemEventHandler):
+    """
+    We only care about changes to the directory tree and the .vce files,
+    so the modify events for the other files are ignored
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def isInteresting(self, event):
+        if event.is_directory:
+            return True
+        pathList = [event.src_path, getattr(event, "dest_path", "")]
+        return any(str(path).endswith(".vce") for path in pathList)
+
+    def on_created(self, event):
+        if self.isInteresting(event):
+            self.index.changed = True
+
+    def on_deleted(self, event):
+        if self.isInteresting(event):
+            self.index.changed = True
+
+    def on_moved(self, event):
+        if self.isInteresting(event):
+            self.index.changed = True
+
+
+class workspaceIndex:
+    def __init__(self, rootPath, excludeList, maxDepth):
+        self.rootPath = rootPath
+        self.excludeList = excludeList
+        # a negative value means there is no limit
+        self.maxDepth = maxDepth
+        # Key is the directory path relative to the root, "" for the root, value
+        # is a dictionary with the mtime, and the vce and dirs name lists
+        self.directories = dict()
+        self.vceFiles = []
+        # set by the watcher when the tree changes, and cleared by scan()
+        self.changed = True
+        self.observer = None
+        self.lock = threading.Lock()
+
+    def indexFilePath(self):
+        keyText = json.dumps([self.rootPath, self.excludeList, self.maxDepth])
+        fileName = hashlib.sha1(keyText.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(indexDirectory, fileName)
+
+    def load(self):
+        """
+        A missing, corrupt or old index file just gives an empty index
+        """
+        try:
+            makePrivateDirectory(indexDirectory)
+            with open(self.indexFilePath(), "r") as indexFile:
+                indexData = json.load(indexFile)
+            if indexData.get("version") == indexFormatVersion:
+                self.directories = indexData["directories"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.directories = dict()
+
+    def save(self):
+        """
+        We write a temp file and rename it so that a crash, or
+        another process, never sees a partial file
+        """
+        indexData = {
+            "version": indexFormatVersion,
+            "root": self.rootPath,
+            "directories": self.directories,
+        }
+        try:
+            makePrivateDirectory(indexDirectory)
+            fileHandle, tempFilePath = tempfile.mkstemp(
+                dir=indexDirectory, suffix=".tmp"
+            )
+            with os.fdopen(fileHandle, "w") as indexFile:
+                json.dump(indexData, indexFile, separators=(",", ":"))
+            os.replace(tempFilePath, self.indexFilePath())
+        except OSError as error:
+            logDiagnostic(
+                f"  could not save the workspace index: {error}", logLevel.error
+            )
+
+    def isExcluded(self, relativePath, name):
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relativePath, pattern)
+            for pattern in self.excludeList
+        )
+
+    def listDirectory(self, directoryPath, mtime):
+        """
+        Returns the index entry for directoryPath, the directory of an
+        environment is not included in dirs, since it cannot contain
+        other environments, and it can be very large
+        """
+        vceList = []
+        dirList = []
+        with os.scandir(directoryPath) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".vce"):
+                    vceList.append(entry.name)
+                elif entry.is_dir(follow_symlinks=False):
+                    dirList.append(entry.name)
+
+        enviroNames = set(name[: -len(".vce")] for name in vceList)
+        dirList = [name for name in dirList if name not in enviroNames]
+
+        if time.time() - mtime / 1e9 < racyModifySeconds:
+            mtime = None
+        return {"mtime": mtime, "vce": sorted(vceList), "dirs": sorted(dirList)}
+
+    def scan(self):
+        """
+        Updates the index, and returns the number of directories
+        that were listed, and the number that were checked
+        """
+        # cleared first, so that a change made during the scan is not lost
+        self.changed = False
+        newDirectories = dict()
+        vceList = []
+        listedCount = 0
+
+        # each item is the relative path and the depth, we use a
+        # stack rather than recursion, since trees can be deep
+        stack = [("", 0)]
+        while len(stack) > 0:
+            relativePath, depth = stack.pop()
+            directoryPath = os.path.join(self.rootPath, relativePath)
+            try:
+                mtime = os.stat(directoryPath).st_mtime_ns
+                entry = self.directories.get(relativePath)
+                if entry is None or entry["mtime"] != mtime:
+                    entry = self.listDirectory(directoryPath, mtime)
+                    listedCount += 1
+            except OSError:
+                continue
+
+            newDirectories[relativePath] = entry
+            vceList.extend(os.path.join(directoryPath, name) for name in entry["vce"])
+
+            if self.maxDepth >= 0 and depth >= self.maxDepth:
+                continue
+            for name in reversed(entry["dirs"]):
+                childPath = os.path.join(relativePath, name)
+                if not self.isExcluded(childPath, name):
+                    stack.append((childPath, depth + 1))
+
+        self.vceFiles = sorted(vceList)
+        directoriesChanged = listedCount > 0 or len(newDirectories) != len(
+            self.directories
+        )
+        self.directories = newDirectories
+        if directoriesChanged:
+            self.save()
+        return listedCount, len(newDirectories)
+
+    def startWatching(self):
+        if self.observer is not None or Observer is None:
+            return
+        try:
+            observer = Observer()
+            observer.schedule(indexEventHandler(self), self.rootPath, recursive=True)
+            observer.daemon = True
+            observer.start()
+            self.observer = observer
+            logDiagnostic(f"  watching workspace: {self.rootPath}")
+        except Exception as error:
+            logDiagnostic(
+                f"  could not watch workspace: {self.rootPath}: {error}", logLevel.error
+            )
+
+    def getVceFiles(self):
+        with self.lock:
+            # with a watcher, nothing has changed unless it tells us so
+            if self.observer is not None and not self.changed:
+                return list(self.vceFiles)
+
+            startTime = time.perf_counter()
+            # start watching before the scan, so we cannot miss a change
+            if watchMode:
+                self.startWatching()
+            listedCount, directoryCount = self.scan()
+            logDiagnostic(
+                f"  workspace index: {len(self.vceFiles)} environments, listed "
+                f"{listedCount} of {directoryCount} directories in "
+                f"{time.perf_counter() - startTime:.3f}s"
+            )
+            return list(self.vceFiles)
+
+
+def getIndex(rootPath, excludeList, maxDepth):
+    rootPath = os.path.abspath(rootPath)
+    index = workspaceIndex(rootPath, list(excludeList), maxDepth)
+    key = index.indexFilePath()
+    with indexCacheLock:
+        if key in indexCache:
+            return indexCache[key]
+        index.load()
+        indexCache[key] = index
+    return index
+
+
+def findVceFiles(rootPath, excludeList=None, maxDepth=-1):
+    """
+    Returns the sorted list of the .vce files under rootPath.  excludeList is a
+    list of fnmatch patterns for the directories to skip, which are added to the
+    defaultExcludes, and maxDepth is the number of levels below rootPath
+    to scan, a negative value means there is no limit
+    """
+    excludeList = defaultExcludes + [
+        pattern for pattern in excludeList or [] if pattern not in defaultExcludes
+    ]
+    if maxDepth is None:
+        maxDepth = -1
+    return getIndex(rootPath, excludeList, maxDepth).getVceFiles()
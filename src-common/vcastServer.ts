@@ -17,8 +17,12 @@ export enum vcastCommandType {
   runClicastCommand = "runClicastCommand",
   getProjectData = "getProjectData",
   getEnviroData = "getEnviroData",
+  getEnviroOutline = "getEnviroOutline",
+  getTests = "getTests",
   rebuild = "rebuild",
+  rebuildMany = "rebuildMany",
   executeTest = "executeTest",
+  executeTests = "executeTests",
   report = "report",
   parseCBT = "parseCBT",
   choiceListTst = "choiceList-tst",
@@ -26,6 +30,8 @@ export enum vcastCommandType {
   mcdcReport = "mcdcReport",
   mcdcLines = "mcdcLines",
   getWorkspaceEnviroData = "getWorkspaceEnviroData",
+  prewarm = "prewarm",
+  cancel = "cancel",
 }
 
 export interface mcdcClientRequestType extends clientRequestType {
@@ -39,6 +45,7 @@ export interface clientRequestType {
   test?: string;
   options?: string;
   unit?: string;
+  requestId?: string;
 }
 
 // This is set when the VectorCAST Data Server process is started
@@ -4,4 +4,5 @@ export enum pythonErrorCodes {
   testInterfaceError = 253,
   couldNotStartClicastInstance = 252,
   codedTestCompileError = 251,
+  clicastCommandAborted = 250,
 }
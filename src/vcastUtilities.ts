@@ -405,7 +405,7 @@ function getCommonCommandString(
   command: vcastCommandType,
   enviroPath: string
 ): string {
-  return `${vPythonCommandToUse} ${globalTestInterfacePath} --mode=${command.toString()} --clicast=${clicastCommandToUse} --path=${enviroPath}`;
+  return `${vPythonCommandToUse} ${globalTestInterfacePath} --mode=${command.toString()} --clicast=${clicastCommandToUse} --path=${enviroPath} --compact`;
 }
 
 export function getVcastInterfaceCommand(
@@ -447,6 +447,30 @@ def completionTest(enviroPath):
     print("  completionTest Test Passed")
 
 
+def batchTest(enviroPath):
+
+    print("Starting batch Test")
+
+    requestList = [
+        vcastDataServerTypes.clientRequest(
+            commandType.choiceListTst, path=enviroPath, options="TEST.VALUE:"
+        ).toDict(),
+        vcastDataServerTypes.clientRequest("bad-command", path=enviroPath).toDict(),
+        vcastDataServerTypes.clientRequest(
+            commandType.choiceListTst, path=enviroPath, options="TEST.VALUE:"
+        ).toDict(),
+    ]
+    returnData = requests.post(f"{serverURL()}/runbatch", json=requestList).json()
+
+    # results are in request order, with the same shape as /runcommand
+    resultList = returnData["results"]
+    assert len(resultList) == 3
+    assert compareToExpected("expected-completion-tst.json", resultList[0])
+    assert resultList[1]["exitCode"] == errorCodes.internalServerError
+    assert compareToExpected("expected-completion-tst.json", resultList[2])
+    print("   batch Test Passed")
+
+
 def rebuildTest(clicastPath, enviroPath):
     # rebuild
     print("Starting Environment Rebuild Test")
@@ -604,6 +628,7 @@ def fullTest(enviroPath, clicastPath, testString):
 
     # note that this works even when a clicast process is active
     completionTest(enviroPath)
+    batchTest(enviroPath)
 
     # we do this last since it closes clicast process
     rebuildTest(clicastPath, enviroPath)
@@ -786,6 +811,8 @@ def enviroBasedTests(args):
         errorTests(clicastPath, enviroPath)
     elif args.test == "completion":
         completionTest(enviroPath)
+    elif args.test == "batch":
+        batchTest(enviroPath)
     elif args.test == "full":
         fullTest(enviroPath, clicastPath, testString)
     else:
@@ -0,0 +1,140 @@
+import collections
+import concurrent.futures
+import io
+import os
+import stat
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+"""
+A fake clicast for the tests of the clicast server code.  When this file is
+run as a script it speaks the clicast server protocol, for "-lc tools server",
+runs a script for "-lc tools execute <script> true", and any other arguments
+are run as a single command.  The commands are:
+    fail          - completes with exit code 3
+    sleep <s>     - sleeps for <s> seconds
+    touch <path>  - creates <path>
+    hang          - never completes
+    die           - exits without completing the command
+anything else completes with exit code 0, and each command writes "ran <command>"
+"""
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+
+def runCommand(command):
+    """
+    Returns the exit code of command
+    """
+    if command.startswith("sleep "):
+        time.sleep(float(command.split()[1]))
+    elif command.startswith("touch "):
+        with open(command.split(" ", 1)[1], "w"):
+            pass
+    elif command == "hang":
+        time.sleep(3600)
+    elif command == "die":
+        os._exit(9)
+    print(f"ran {command}", flush=True)
+    return 3 if command == "fail" else 0
+
+
+def runServer():
+    print("clicast-server-started", flush=True)
+    for line in sys.stdin:
+        command = line.strip()
+        if command == "clicast-server-shutdown":
+            return 0
+        exitCode = runCommand(command)
+        print(f"clicast-server-command-done:STATUS | {exitCode}", flush=True)
+    return 0
+
+
+def runScript(scriptPath):
+    # clicastInterface.convertOutput() expects the version banner
+    print("**Version 24 fake", flush=True)
+    with open(scriptPath) as scriptFile:
+        for line in scriptFile:
+            exitCode = runCommand(line.strip())
+            if exitCode != 0:
+                return exitCode
+    return 0
+
+
+def makeFakeClicast(directory):
+    """
+    Writes an executable that runs this script, and returns its path
+    """
+    clicastPath = os.path.join(directory, "clicast")
+    with open(clicastPath, "w") as clicastFile:
+        clicastFile.write(
+            f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n'
+        )
+    os.chmod(clicastPath, os.stat(clicastPath).st_mode | stat.S_IEXEC)
+    return clicastPath
+
+
+@unittest.skipUnless(os.name == "posix", "the fake clicast is a shell script")
+class clicastTestCase(unittest.TestCase):
+    """
+    Runs the server code with the fake clicast, and a clean set of instances
+    """
+
+    def setUp(self):
+        import pythonUtilities
+
+        self.pythonUtilities = pythonUtilities
+        workDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(workDirectory.cleanup)
+        self.workDirectory = workDirectory.name
+
+        patcher = mock.patch.multiple(
+            pythonUtilities,
+            globalClicastCommand=makeFakeClicast(self.workDirectory),
+            USE_SERVER=True,
+            clicastInstances=collections.OrderedDict(),
+            crashTimes=dict(),
+            crashCounts=dict(),
+            quarantinedInstances=dict(),
+            clicastShutdownStarted=False,
+            pendingClicastStarts=dict(),
+            runningRequests=dict(),
+            earlyCancels=collections.OrderedDict(),
+            enviroLocks=dict(),
+            logFileHandle=io.StringIO(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # this runs before the patches are removed
+        self.addCleanup(self.closeInstances)
+
+    def closeInstances(self):
+        # a discarded instance is replaced in the background, so we
+        # wait for the replacement, so that it cannot outlive the test
+        with self.pythonUtilities.clicastInstancesLock:
+            futureList = list(self.pythonUtilities.pendingClicastStarts.values())
+        concurrent.futures.wait(futureList)
+        self.pythonUtilities.closeAllClicastInstances()
+
+    def makeEnviroPath(self, directoryName, enviroName):
+        directoryPath = os.path.join(self.workDirectory, directoryName)
+        os.makedirs(directoryPath, exist_ok=True)
+        return os.path.join(directoryPath, enviroName)
+
+    def getInstance(self, enviroPath):
+        with self.pythonUtilities.clicastInstancesLock:
+            return self.pythonUtilities.clicastInstances.get(
+                self.pythonUtilities.clicastInstanceKey(enviroPath)
+            )
+
+
+if __name__ == "__main__":
+    if "server" in sys.argv:
+        sys.exit(runServer())
+    elif "execute" in sys.argv:
+        sys.exit(runScript(sys.argv[sys.argv.index("execute") + 1]))
+    else:
+        sys.exit(runCommand(" ".join(sys.argv[1:])))
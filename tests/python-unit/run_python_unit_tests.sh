@@ -0,0 +1,7 @@
+#!/bin/bash
+ROOT=$(dirname "$(realpath "$0")")
+
+# Some of the modules under test import the dataAPI, so we run the tests with vpython
+# shellcheck disable=SC2155
+export PYTHONPATH=$(realpath "$ROOT"/../../python)
+"$VECTORCAST_DIR"/vpython -m unittest discover -s "$ROOT" -p "test*.py" -v
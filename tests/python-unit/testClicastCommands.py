@@ -0,0 +1,128 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+# the modules under test are in the python directory of the repository,
+# clicastInterface imports the VectorCAST dataAPI, so run these with vpython
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import clicastInterface
+import vTestInterface
+from fakeClicast import clicastTestCase
+
+
+class clicastCommandTests(clicastTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enviroPath = self.makeEnviroPath("unit", "ENV_A")
+
+    def touchPath(self, name):
+        return os.path.join(self.workDirectory, name)
+
+    def testCommandsRunInOrder(self):
+        for pipelined in [False, True]:
+            exitCode, output = clicastInterface.runClicastServerCommands(
+                self.enviroPath, ["one", "two", "three"], pipelined
+            )
+            self.assertEqual(exitCode, 0)
+            self.assertEqual(output, "ran one\nran two\nran three\n")
+
+    def testStopsAtTheFirstFailure(self):
+        exitCode, output = clicastInterface.runClicastServerCommands(
+            self.enviroPath, ["one", "fail", f"touch {self.touchPath('after')}"]
+        )
+        self.assertEqual(exitCode, 3)
+        self.assertEqual(output, "ran one\nran fail\n")
+        self.assertFalse(os.path.exists(self.touchPath("after")))
+
+    def testPipelinedStopsAtTheFirstFailure(self):
+        processObject = self.pythonUtilities.getClicastInstance(self.enviroPath)
+        # clicast might start the next command before we read the failure,
+        # like a real clicast command, this one takes a while, so the
+        # kill stops it, and the commands queued after it
+        commandList = ["one", "fail", "sleep 2"]
+        commandList += [
+            f"touch {self.touchPath(f'after{index}')}" for index in range(3)
+        ]
+        exitCode, output = clicastInterface.runClicastServerCommands(
+            self.enviroPath, commandList, pipelined=True
+        )
+        self.assertEqual(exitCode, 3)
+        self.assertEqual(output, "ran one\nran fail\n")
+
+        # the instance was killed, so the queued commands cannot run,
+        # and this is not counted as a crash of the instance
+        processObject.wait(5)
+        self.assertEqual(
+            [os.path.exists(self.touchPath(f"after{index}")) for index in range(3)],
+            [False] * 3,
+        )
+        self.assertEqual(self.pythonUtilities.crashCounts, {})
+
+        # and a new instance is used for the next commands
+        exitCode, output = clicastInterface.runClicastServerCommands(
+            self.enviroPath, ["one"], pipelined=True
+        )
+        self.assertEqual((exitCode, output), (0, "ran one\n"))
+        self.assertIsNot(self.getInstance(self.enviroPath), processObject)
+
+    def testPipelinedFailureOfTheLastCommandKeepsTheInstance(self):
+        processObject = self.pythonUtilities.getClicastInstance(self.enviroPath)
+        exitCode, _ = clicastInterface.runClicastServerCommands(
+            self.enviroPath, ["one", "fail"], pipelined=True
+        )
+        self.assertEqual(exitCode, 3)
+        self.assertIs(self.getInstance(self.enviroPath), processObject)
+
+    def testInstanceThatDiesAbortsTheCommands(self):
+        exitCode, output = clicastInterface.runClicastServerCommands(
+            self.enviroPath, ["one", "die", "three"], pipelined=True
+        )
+        self.assertEqual(exitCode, clicastInterface.errorCodes.clicastCommandAborted)
+        self.assertIn("clicast instance exited", output)
+        self.assertEqual(len(self.pythonUtilities.crashCounts), 1)
+
+    def testCommandListOnTheCommandLine(self):
+        self.pythonUtilities.USE_SERVER = False
+        enviroDirectory = os.path.dirname(self.enviroPath)
+        for echoToStdout in [False, True]:
+            exitCode, output = clicastInterface.runClicastCommandList(
+                self.enviroPath,
+                ["one", "fail", "three"],
+                echoToStdout=echoToStdout,
+            )
+            self.assertEqual(exitCode, 3)
+            self.assertIn("ran fail", output)
+            self.assertNotIn("ran three", output)
+        # the script is written to the temp directory, and removed
+        self.assertEqual(os.listdir(enviroDirectory), [])
+
+    def testRebuildManyOutputGoesToStderr(self):
+        # on the command line, stdout carries the JSON response
+        self.pythonUtilities.USE_SERVER = False
+        enviroPathList = [
+            self.makeEnviroPath("unit", name) for name in ["ENV_A", "ENV_B"]
+        ]
+        for enviroPath in enviroPathList:
+            os.makedirs(enviroPath)
+
+        stdoutText = io.StringIO()
+        stderrText = io.StringIO()
+        with contextlib.redirect_stdout(stdoutText):
+            with contextlib.redirect_stderr(stderrText):
+                recordList = vTestInterface.rebuildEnvironments(
+                    enviroPathList, dict(), 2
+                )
+
+        self.assertEqual([record["exitCode"] for record in recordList], [0, 0])
+        self.assertEqual(stdoutText.getvalue(), "")
+        stderrLines = stderrText.getvalue().splitlines()
+        self.assertIn("[ENV_A] ran -lc -eENV_A enviro re_build", stderrLines)
+        self.assertIn("[ENV_B] ran -lc -eENV_B enviro re_build", stderrLines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+# the modules under test are in the python directory of the repository,
+# clicastInterface imports the VectorCAST dataAPI, so run these with vpython
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import clicastInterface
+from fakeClicast import clicastTestCase
+from vcastDataServerTypes import errorCodes
+
+
+def waitFor(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out waiting for the condition")
+        time.sleep(0.01)
+
+
+class commandThread(threading.Thread):
+    """
+    Runs one clicast command, optionally as a request that can be cancelled
+    """
+
+    def __init__(self, pythonUtilities, enviroPath, command, requestId=None):
+        super().__init__(daemon=True)
+        self.pythonUtilities = pythonUtilities
+        self.enviroPath = enviroPath
+        self.command = command
+        self.requestId = requestId
+        self.result = None
+
+    def run(self):
+        self.pythonUtilities.startRequest(self.requestId)
+        try:
+            self.result = clicastInterface.runClicastServerCommand(
+                self.enviroPath, self.command
+            )
+        finally:
+            self.pythonUtilities.endRequest()
+
+
+class lockTests(clicastTestCase):
+    def testEnviroLockIsPerEnvironment(self):
+        enviroPath = self.makeEnviroPath("unit", "ENV_A")
+        lock = self.pythonUtilities.getEnviroLock(enviroPath)
+        self.assertIs(self.pythonUtilities.getEnviroLock(enviroPath), lock)
+        self.assertIsNot(
+            self.pythonUtilities.getEnviroLock(self.makeEnviroPath("unit", "ENV_B")),
+            lock,
+        )
+
+    def testEnvironmentsInOneDirectoryShareTheInstance(self):
+        enviroPathA = self.makeEnviroPath("unit", "ENV_A")
+        enviroPathB = self.makeEnviroPath("unit", "ENV_B")
+        clicastInterface.runClicastServerCommand(enviroPathA, "one")
+        clicastInterface.runClicastServerCommand(enviroPathB, "two")
+        self.assertIs(self.getInstance(enviroPathA), self.getInstance(enviroPathB))
+        self.assertEqual(len(self.pythonUtilities.clicastInstances), 1)
+
+    def testCommandsForOneInstanceAreSerialized(self):
+        enviroPathA = self.makeEnviroPath("unit", "ENV_A")
+        enviroPathB = self.makeEnviroPath("unit", "ENV_B")
+        processObject = self.pythonUtilities.lockClicastInstance(enviroPathA)
+        try:
+            thread = commandThread(self.pythonUtilities, enviroPathB, "two")
+            thread.start()
+            # the other environment must wait for the commandLock
+            thread.join(0.5)
+            self.assertTrue(thread.is_alive())
+        finally:
+            processObject.commandLock.release()
+        thread.join(10)
+        self.assertEqual(thread.result, (0, "ran two\n"))
+
+
+class evictionTests(clicastTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(self.pythonUtilities, "maxClicastInstances", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testLeastRecentlyUsedInstanceIsEvicted(self):
+        enviroPathA = self.makeEnviroPath("a", "ENV")
+        enviroPathB = self.makeEnviroPath("b", "ENV")
+        enviroPathC = self.makeEnviroPath("c", "ENV")
+        clicastInterface.runClicastServerCommand(enviroPathA, "one")
+        clicastInterface.runClicastServerCommand(enviroPathB, "one")
+        processObjectB = self.getInstance(enviroPathB)
+        # using A makes B the least recently used
+        clicastInterface.runClicastServerCommand(enviroPathA, "two")
+        clicastInterface.runClicastServerCommand(enviroPathC, "one")
+
+        self.assertIsNotNone(self.getInstance(enviroPathA))
+        self.assertIsNone(self.getInstance(enviroPathB))
+        self.assertIsNotNone(self.getInstance(enviroPathC))
+        waitFor(lambda: processObjectB.poll() is not None)
+
+    def testBusyInstanceIsNotEvicted(self):
+        self.pythonUtilities.maxClicastInstances = 1
+        enviroPathA = self.makeEnviroPath("a", "ENV")
+        enviroPathB = self.makeEnviroPath("b", "ENV")
+        processObjectA = self.pythonUtilities.lockClicastInstance(enviroPathA)
+        try:
+            self.assertEqual(
+                clicastInterface.runClicastServerCommand(enviroPathB, "one"),
+                (0, "ran one\n"),
+            )
+            self.assertIs(self.getInstance(enviroPathA), processObjectA)
+        finally:
+            processObjectA.commandLock.release()
+
+    def testIdleInstanceIsClosed(self):
+        enviroPath = self.makeEnviroPath("a", "ENV")
+        instanceKey = self.pythonUtilities.clicastInstanceKey(enviroPath)
+        processObject = self.pythonUtilities.lockClicastInstance(enviroPath)
+        try:
+            self.assertFalse(
+                self.pythonUtilities.closeIdleClicastInstance(instanceKey, "idle")
+            )
+        finally:
+            processObject.commandLock.release()
+        self.assertTrue(
+            self.pythonUtilities.closeIdleClicastInstance(instanceKey, "idle")
+        )
+        self.assertIsNone(self.getInstance(enviroPath))
+        waitFor(lambda: processObject.poll() is not None)
+
+
+class cancelTests(clicastTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enviroPath = self.makeEnviroPath("unit", "ENV_A")
+
+    def testCancelKillsTheRunningCommand(self):
+        thread = commandThread(
+            self.pythonUtilities, self.enviroPath, "hang", requestId="request-1"
+        )
+        thread.start()
+        runningRequests = self.pythonUtilities.runningRequests
+        waitFor(
+            lambda: "request-1" in runningRequests
+            and runningRequests["request-1"].clicastProcess is not None
+        )
+        processObject = runningRequests["request-1"].clicastProcess
+
+        self.assertEqual(self.pythonUtilities.cancelRequest("request-1"), "running")
+        thread.join(10)
+        exitCode, output = thread.result
+        self.assertEqual(exitCode, errorCodes.clicastCommandAborted)
+        self.assertIn("cancelled", output)
+        self.assertIsNot(self.getInstance(self.enviroPath), processObject)
+        # a cancel is not a problem with the instance
+        self.assertEqual(self.pythonUtilities.crashCounts, {})
+
+        # the next command gets a new instance
+        self.assertEqual(
+            clicastInterface.runClicastServerCommand(self.enviroPath, "one"),
+            (0, "ran one\n"),
+        )
+
+    def testCancelBeforeTheRequestStarts(self):
+        self.assertEqual(self.pythonUtilities.cancelRequest("request-2"), "pending")
+        thread = commandThread(
+            self.pythonUtilities, self.enviroPath, "one", requestId="request-2"
+        )
+        thread.start()
+        thread.join(10)
+        self.assertEqual(thread.result[0], errorCodes.clicastCommandAborted)
+        # the command was never sent, so no instance was started
+        self.assertIsNone(self.getInstance(self.enviroPath))
+
+    def testHungCommandTimesOut(self):
+        with mock.patch.object(self.pythonUtilities, "clicastCommandTimeout", 0.5):
+            exitCode, output = clicastInterface.runClicastServerCommand(
+                self.enviroPath, "hang"
+            )
+        self.assertEqual(exitCode, errorCodes.clicastCommandAborted)
+        self.assertIn("timed out", output)
+        # unlike a cancel, a hang counts towards the quarantine
+        self.assertEqual(len(self.pythonUtilities.crashCounts), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# the modules under test are in the python directory of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+import enviroDataCache
+
+
+class enviroDataCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.rootDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.rootDirectory.cleanup)
+        self.rootPath = self.rootDirectory.name
+        self.cacheDirectory = os.path.join(self.rootPath, "cache", "enviroDataCache")
+        self.enviroPath = os.path.join(self.rootPath, "ENV")
+        os.makedirs(self.enviroPath)
+        with open(os.path.join(self.enviroPath, "master.db"), "w") as fileHandle:
+            fileHandle.write("master")
+
+        patcher = mock.patch.multiple(
+            enviroDataCache, cacheDirectory=self.cacheDirectory, enabled=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def storeData(self, topLevel):
+        enviroFingerprint = enviroDataCache.getEnviroFingerprint(self.enviroPath)
+        enviroDataCache.storeEnviroData(
+            self.enviroPath, enviroFingerprint, [], topLevel
+        )
+
+    def testStoreAndLoad(self):
+        self.storeData({"unitData": [1, 2, 3]})
+        self.assertEqual(
+            enviroDataCache.loadEnviroData(self.enviroPath), {"unitData": [1, 2, 3]}
+        )
+
+    def testChangedEnvironmentIsAMiss(self):
+        self.storeData({"unitData": []})
+        with open(os.path.join(self.enviroPath, "cover.db"), "w") as fileHandle:
+            fileHandle.write("cover")
+        self.assertIsNone(enviroDataCache.loadEnviroData(self.enviroPath))
+
+    def testDiscardEnviroData(self):
+        self.storeData({"unitData": []})
+        enviroDataCache.discardEnviroData(self.enviroPath)
+        self.assertIsNone(enviroDataCache.loadEnviroData(self.enviroPath))
+
+    @unittest.skipUnless(os.name == "posix", "POSIX permissions")
+    def testCacheDirectoryIsPrivate(self):
+        os.makedirs(self.cacheDirectory, mode=0o755)
+        os.chmod(self.cacheDirectory, 0o755)
+        self.storeData({"unitData": []})
+        mode = stat.S_IMODE(os.stat(self.cacheDirectory).st_mode)
+        self.assertEqual(mode, 0o700)
+        for fileName in os.listdir(self.cacheDirectory):
+            filePath = os.path.join(self.cacheDirectory, fileName)
+            self.assertEqual(stat.S_IMODE(os.stat(filePath).st_mode) & 0o077, 0)
+
+    @unittest.skipUnless(os.name == "posix", "POSIX permissions")
+    def testSymlinkedCacheDirectoryIsNotUsed(self):
+        otherDirectory = os.path.join(self.rootPath, "other")
+        os.makedirs(otherDirectory)
+        os.makedirs(os.path.dirname(self.cacheDirectory))
+        os.symlink(otherDirectory, self.cacheDirectory)
+        self.storeData({"unitData": []})
+        self.assertEqual(os.listdir(otherDirectory), [])
+        self.assertIsNone(enviroDataCache.loadEnviroData(self.enviroPath))
+
+
+if __name__ == "__main__":
+    unittest.main()
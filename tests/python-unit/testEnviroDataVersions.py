@@ -0,0 +1,155 @@
+import copy
+import os
+import sys
+import tempfile
+import unittest
+
+# the modules under test are in the python directory of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+import enviroDataVersions
+
+
+def makeTopLevel():
+    """
+    A small getEnviroData response, with the same shape as buildEnviroData()
+    """
+    return {
+        "testData": [
+            {
+                "name": "Compound Tests",
+                "tests": [{"testName": "<<COMPOUND>>.c1", "status": "passed"}],
+            },
+            {"name": "Initialization Tests", "tests": []},
+            {
+                "name": "unit1",
+                "path": "/src/unit1.c",
+                "functions": [
+                    {
+                        "name": "f1",
+                        "parameterizedName": "f1(int)",
+                        "tests": [
+                            {"testName": "t1", "status": "passed"},
+                            {"testName": "t2", "status": "failed"},
+                        ],
+                    },
+                    {"name": "f2", "parameterizedName": "f2(void)", "tests": []},
+                ],
+            },
+        ],
+        "unitData": [{"path": "/src/unit1.c", "covered": "1,2", "uncovered": "3"}],
+        "enviro": {},
+        "mockingSupport": False,
+    }
+
+
+class enviroDataVersionsTests(unittest.TestCase):
+    def setUp(self):
+        enviroDataVersions.enviroSnapshots.clear()
+        enviroDataVersions.prewarmedData.clear()
+        self.enviroPath = "/work/ENV"
+
+    def testFlattenTestData(self):
+        units, functions, tests = enviroDataVersions.flattenTestData(
+            makeTopLevel()["testData"]
+        )
+        self.assertEqual(
+            sorted(units), ["Compound Tests", "Initialization Tests", "unit1"]
+        )
+        self.assertNotIn("functions", units["unit1"])
+        self.assertEqual(sorted(functions), [("unit1", "f1"), ("unit1", "f2")])
+        self.assertNotIn("tests", functions[("unit1", "f1")])
+        self.assertEqual(
+            tests[("Compound Tests", "", "<<COMPOUND>>.c1")]["function"], ""
+        )
+        self.assertEqual(tests[("unit1", "f1", "t2")]["unit"], "unit1")
+
+    def testFirstResponseIsComplete(self):
+        response = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, makeTopLevel(), None
+        )
+        self.assertIn("testData", response)
+        self.assertIn("versionToken", response)
+        self.assertNotIn("delta", response)
+
+    def testDeltaAgainstPreviousToken(self):
+        first = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, makeTopLevel(), None
+        )
+
+        newTopLevel = makeTopLevel()
+        functionList = newTopLevel["testData"][2]["functions"]
+        functionList[0]["tests"][1]["status"] = "passed"
+        functionList[0]["tests"].append({"testName": "t3", "status": ""})
+        del functionList[1]
+        newTopLevel["unitData"][0]["covered"] = "1,2,3"
+        newTopLevel["unitData"][0]["uncovered"] = ""
+
+        second = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, newTopLevel, first["versionToken"]
+        )
+        self.assertEqual(second["baseVersionToken"], first["versionToken"])
+        self.assertNotEqual(second["versionToken"], first["versionToken"])
+        self.assertNotIn("testData", second)
+
+        delta = second["delta"]
+        self.assertEqual([test["testName"] for test in delta["tests"]["added"]], ["t3"])
+        self.assertEqual(
+            [test["testName"] for test in delta["tests"]["changed"]], ["t2"]
+        )
+        self.assertEqual(delta["tests"]["removed"], [])
+        self.assertEqual(
+            delta["functions"]["removed"], [{"unit": "unit1", "name": "f2"}]
+        )
+        self.assertEqual(delta["units"], {"added": [], "changed": [], "removed": []})
+        self.assertEqual(delta["unitData"]["changed"][0]["covered"], "1,2,3")
+
+    def testUnknownTokenGivesCompleteResponse(self):
+        enviroDataVersions.buildVersionedResponse(self.enviroPath, makeTopLevel(), None)
+        response = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, makeTopLevel(), "not-a-token"
+        )
+        self.assertIn("testData", response)
+        self.assertNotIn("delta", response)
+
+    def testDiscardSnapshot(self):
+        first = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, makeTopLevel(), None
+        )
+        enviroDataVersions.discardSnapshot(self.enviroPath)
+        response = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, makeTopLevel(), first["versionToken"]
+        )
+        self.assertNotIn("delta", response)
+
+    def testUnchangedDataGivesEmptyDelta(self):
+        topLevel = makeTopLevel()
+        first = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, copy.deepcopy(topLevel), None
+        )
+        second = enviroDataVersions.buildVersionedResponse(
+            self.enviroPath, topLevel, first["versionToken"]
+        )
+        for section in second["delta"].values():
+            self.assertEqual(section, {"added": [], "changed": [], "removed": []})
+
+    def testPrewarmedDataIsDiscardedWhenTheEnviroChanges(self):
+        with tempfile.TemporaryDirectory() as enviroPath:
+            masterPath = os.path.join(enviroPath, "master.db")
+            with open(masterPath, "w") as masterFile:
+                masterFile.write("1")
+            fingerprint = enviroDataVersions.getFingerprint(enviroPath)
+
+            enviroDataVersions.storePrewarmedData(enviroPath, fingerprint, {"a": 1})
+            self.assertEqual(enviroDataVersions.takePrewarmedData(enviroPath), {"a": 1})
+            # the data is only used once
+            self.assertIsNone(enviroDataVersions.takePrewarmedData(enviroPath))
+
+            enviroDataVersions.storePrewarmedData(enviroPath, fingerprint, {"a": 1})
+            with open(masterPath, "w") as masterFile:
+                masterFile.write("22")
+            self.assertIsNone(enviroDataVersions.takePrewarmedData(enviroPath))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import copy
+import os
+import sys
+import unittest
+
+# the modules under test are in the python directory of the repository,
+# vTestInterface imports the VectorCAST dataAPI, so run these with vpython
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+from vTestInterface import (
+    UsageError,
+    fieldWanted,
+    generateTestInfo,
+    getUnitData,
+    parseFieldSelection,
+    projectEnviroData,
+)
+
+
+def makeTest(name):
+    return {
+        "testName": name,
+        "notes": "some notes",
+        "compoundOnly": 0,
+        "time": "",
+        "status": "TC_EXECUTION_PASSED",
+        "passfail": "1 / 1",
+        "codedTestFile": "",
+        "codedTestLine": 1,
+    }
+
+
+def makeEnviroData():
+    return {
+        "testData": [
+            {"name": "Compound Tests", "tests": [makeTest("compound1")]},
+            {"name": "Initialization Tests", "tests": [makeTest("init1")]},
+            {
+                "name": "manager",
+                "path": "/work/manager.cpp",
+                "functions": [
+                    {
+                        "name": "Manager::PlaceOrder",
+                        "parameterizedName": "Manager::PlaceOrder(int)",
+                        "tests": [makeTest("test1"), makeTest("test2")],
+                    },
+                    {"name": "Manager::ClearTable", "tests": []},
+                ],
+            },
+        ],
+        "unitData": [
+            {
+                "path": "/work/manager.cpp",
+                "functionList": [],
+                "cmcChecksum": "123",
+                "covered": [1, 2],
+                "uncovered": [3],
+                "partiallyCovered": [],
+            }
+        ],
+        "time": "12:00",
+    }
+
+
+class fakeDataApiObject:
+    """
+    Stands in for a dataAPI object, it records the attributes that are read
+    and raises if the code reads an attribute that is not in allowedValues
+    """
+
+    def __init__(self, **allowedValues):
+        self._allowedValues = allowedValues
+        self._accessed = set()
+
+    def __getattr__(self, name):
+        if name not in self._allowedValues:
+            raise AssertionError(f"dataAPI attribute was read: {name}")
+        self._accessed.add(name)
+        return self._allowedValues[name]
+
+
+class fakeSourceFileTable:
+    def __init__(self, sourceObjects):
+        self.sourceObjects = sourceObjects
+
+    def all(self):
+        return self.sourceObjects
+
+
+class fakeApi:
+    def __init__(self, sourceObjects):
+        self.SourceFile = fakeSourceFileTable(sourceObjects)
+
+
+class parseFieldSelectionTests(unittest.TestCase):
+    def testEmptySelection(self):
+        self.assertEqual(parseFieldSelection(None), {})
+        self.assertEqual(parseFieldSelection(""), {})
+        self.assertEqual(parseFieldSelection([]), {})
+
+    def testStringForm(self):
+        self.assertEqual(
+            parseFieldSelection("tests:status,notes;unitData:covered"),
+            {
+                "tests": {"testName", "status", "notes"},
+                "unitData": {"path", "covered"},
+            },
+        )
+
+    def testListForm(self):
+        self.assertEqual(
+            parseFieldSelection(["tests: status , time", "unitData:uncovered"]),
+            {
+                "tests": {"testName", "status", "time"},
+                "unitData": {"path", "uncovered"},
+            },
+        )
+
+    def testAliases(self):
+        self.assertEqual(
+            parseFieldSelection("tests:name;unitData:functions"),
+            {"tests": {"testName"}, "unitData": {"path", "functionList"}},
+        )
+
+    def testKeyFieldIsAlwaysIncluded(self):
+        self.assertEqual(parseFieldSelection("tests:"), {"tests": {"testName"}})
+        self.assertEqual(parseFieldSelection("unitData"), {"unitData": {"path"}})
+
+    def testUnknownSection(self):
+        with self.assertRaises(UsageError):
+            parseFieldSelection("results:status")
+
+    def testUnknownField(self):
+        with self.assertRaises(UsageError):
+            parseFieldSelection("tests:status,color")
+
+    def testBadType(self):
+        with self.assertRaises(UsageError):
+            parseFieldSelection({"tests": "status"})
+
+    def testFieldWanted(self):
+        self.assertTrue(fieldWanted(None, "notes"))
+        self.assertTrue(fieldWanted({"testName", "notes"}, "notes"))
+        self.assertFalse(fieldWanted({"testName"}, "notes"))
+
+
+class projectEnviroDataTests(unittest.TestCase):
+    def testEmptySelectionReturnsEverything(self):
+        enviroData = makeEnviroData()
+        self.assertEqual(projectEnviroData(copy.deepcopy(enviroData), {}), enviroData)
+
+    def testProjectsTheTests(self):
+        fieldSelection = parseFieldSelection("tests:status")
+        topLevel = projectEnviroData(makeEnviroData(), fieldSelection)
+
+        compoundNode, initNode, unitNode = topLevel["testData"]
+        self.assertEqual(
+            compoundNode["tests"],
+            [{"testName": "compound1", "status": "TC_EXECUTION_PASSED"}],
+        )
+        self.assertEqual(
+            initNode["tests"], [{"testName": "init1", "status": "TC_EXECUTION_PASSED"}]
+        )
+        placeOrderNode, clearTableNode = unitNode["functions"]
+        self.assertEqual(
+            placeOrderNode["tests"],
+            [
+                {"testName": "test1", "status": "TC_EXECUTION_PASSED"},
+                {"testName": "test2", "status": "TC_EXECUTION_PASSED"},
+            ],
+        )
+        self.assertEqual(placeOrderNode["name"], "Manager::PlaceOrder")
+        self.assertEqual(clearTableNode["tests"], [])
+        # the sections that are not selected are left alone
+        self.assertEqual(topLevel["unitData"], makeEnviroData()["unitData"])
+
+    def testProjectsTheUnitData(self):
+        fieldSelection = parseFieldSelection("unitData:covered,uncovered")
+        topLevel = projectEnviroData(makeEnviroData(), fieldSelection)
+
+        self.assertEqual(
+            topLevel["unitData"],
+            [{"path": "/work/manager.cpp", "covered": [1, 2], "uncovered": [3]}],
+        )
+        self.assertEqual(topLevel["testData"], makeEnviroData()["testData"])
+        self.assertEqual(topLevel["time"], "12:00")
+
+
+class dataApiReadTests(unittest.TestCase):
+    def testGenerateTestInfoReadsOnlySelectedFields(self):
+        test = fakeDataApiObject(
+            name="test1", status="TC_EXECUTION_PASSED", coded_tests_file=""
+        )
+        testInfo = generateTestInfo("/work/ENV", test, {"testName", "status"})
+        self.assertEqual(testInfo, {"testName": "test1", "status": "passed"})
+        self.assertEqual(test._accessed - {"coded_tests_file"}, {"name", "status"})
+
+    def testGenerateTestInfoKeyFieldOnly(self):
+        test = fakeDataApiObject(name="test1", coded_tests_file="")
+        testInfo = generateTestInfo("/work/ENV", test, {"testName"})
+        self.assertEqual(testInfo, {"testName": "test1"})
+
+    def testGetUnitDataReadsOnlySelectedFields(self):
+        sourceObject = fakeDataApiObject(
+            display_path="/work/manager.cpp", is_instrumented=True, checksum="123"
+        )
+        unitList = getUnitData(fakeApi([sourceObject]), {"path", "cmcChecksum"})
+        self.assertEqual(
+            unitList, [{"path": "/work/manager.cpp", "cmcChecksum": "123"}]
+        )
+        self.assertEqual(
+            sourceObject._accessed, {"display_path", "is_instrumented", "checksum"}
+        )
+
+    def testGetUnitDataPathOnly(self):
+        # no functions, coverage or checksum are read
+        sourceObjects = [
+            fakeDataApiObject(display_path="/work/manager.cpp", is_instrumented=True),
+            fakeDataApiObject(display_path="/work/stub.cpp", is_instrumented=False),
+        ]
+        unitList = getUnitData(fakeApi(sourceObjects), {"path"})
+        self.assertEqual(
+            unitList, [{"path": "/work/manager.cpp"}, {"path": "/work/stub.cpp"}]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
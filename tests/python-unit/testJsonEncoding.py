@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+import sys
+import unittest
+import zlib
+from unittest import mock
+
+# the modules under test are in the python directory of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+import jsonEncoding
+
+sampleData = {
+    "testData": [
+        {
+            "name": "unit1",
+            "functions": [{"name": "f1", "tests": [{"testName": "t1", "time": ""}]}],
+        }
+    ],
+    "unitData": [{"path": "/src/unit1.c", "covered": "1,2", "cmcChecksum": 1234}],
+    "enviro": {},
+    "mockingSupport": True,
+    "notes": "café – \U0001f600",
+    "ratio": 0.25,
+    "nothing": None,
+}
+
+
+def encoderPatches():
+    """
+    Returns the patches for each encoder that is available, so that
+    each test checks all of the encoders that compactDumps() might use
+    """
+    patchList = [("json", mock.patch.multiple(jsonEncoding, orjson=None, ujson=None))]
+    if jsonEncoding.orjson is not None:
+        patchList.append(("orjson", mock.patch.object(jsonEncoding, "ujson", None)))
+    if jsonEncoding.ujson is not None:
+        patchList.append(("ujson", mock.patch.object(jsonEncoding, "orjson", None)))
+    return patchList
+
+
+class compactDumpsTests(unittest.TestCase):
+    def testSameDataAsJsonDumps(self):
+        for name, patch in encoderPatches():
+            with self.subTest(encoder=name), patch:
+                self.assertEqual(
+                    json.loads(jsonEncoding.compactDumps(sampleData)), sampleData
+                )
+
+    def testOutputIsCompactAscii(self):
+        for name, patch in encoderPatches():
+            with self.subTest(encoder=name), patch:
+                text = jsonEncoding.compactDumps(sampleData)
+                self.assertTrue(text.isascii())
+                self.assertNotIn(": ", text)
+                self.assertNotIn("\n", text)
+
+    def testNonStringKeysFallBackToJson(self):
+        data = {1: "one", "two": [2]}
+        for name, patch in encoderPatches():
+            with self.subTest(encoder=name), patch:
+                self.assertEqual(
+                    json.loads(jsonEncoding.compactDumps(data)),
+                    {"1": "one", "two": [2]},
+                )
+
+    def testIndentedDumps(self):
+        text = jsonEncoding.dumps(sampleData, compact=False)
+        self.assertIn("\n    ", text)
+        self.assertEqual(json.loads(text), sampleData)
+
+
+class compressionTests(unittest.TestCase):
+    def testParseAcceptEncoding(self):
+        self.assertEqual(
+            jsonEncoding.parseAcceptEncoding("gzip;q=0.5, Deflate, br;q=x"),
+            {"gzip": 0.5, "deflate": 1.0, "br": 0.0},
+        )
+        self.assertEqual(jsonEncoding.parseAcceptEncoding(None), {})
+
+    def testChooseEncoding(self):
+        self.assertEqual(jsonEncoding.chooseEncoding("gzip, deflate"), "gzip")
+        self.assertEqual(jsonEncoding.chooseEncoding("gzip;q=0.2, deflate"), "deflate")
+        self.assertEqual(jsonEncoding.chooseEncoding("*"), "gzip")
+        self.assertEqual(jsonEncoding.chooseEncoding("gzip;q=0, br"), None)
+        self.assertEqual(jsonEncoding.chooseEncoding(""), None)
+
+    def testSmallPayloadsAreNotCompressed(self):
+        payload = b"{}"
+        self.assertEqual(jsonEncoding.compressPayload(payload, "gzip"), (payload, None))
+
+    def testCompressedPayloadsRoundTrip(self):
+        payload = jsonEncoding.compactDumps([sampleData] * 50).encode("utf-8")
+
+        compressed, encoding = jsonEncoding.compressPayload(payload, "gzip")
+        self.assertEqual(encoding, "gzip")
+        self.assertEqual(gzip.decompress(compressed), payload)
+
+        compressed, encoding = jsonEncoding.compressPayload(payload, "deflate")
+        self.assertEqual(encoding, "deflate")
+        self.assertEqual(zlib.decompress(compressed), payload)
+
+        self.assertEqual(jsonEncoding.compressPayload(payload, "br"), (payload, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# the modules under test are in the python directory of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+import outputCapture
+
+
+def chunkList(count, size):
+    return [f"{index:04d}".ljust(size, "x") for index in range(count)]
+
+
+class fullOutputTests(unittest.TestCase):
+    def testKeepsAllOfTheOutput(self):
+        chunks = chunkList(100, 50)
+        with outputCapture.outputBuffer(outputCapture.fullOutput) as outputBuffer:
+            for chunk in chunks:
+                outputBuffer.append(chunk)
+            outputBuffer.append("")
+            self.assertEqual(outputBuffer.getvalue(), "".join(chunks))
+            self.assertEqual(outputBuffer.length, 5000)
+
+    def testGetvalueCanBeCalledWhileAppending(self):
+        with outputCapture.outputBuffer(outputCapture.fullOutput) as outputBuffer:
+            outputBuffer.append("first\n")
+            self.assertEqual(outputBuffer.getvalue(), "first\n")
+            outputBuffer.append("second\n")
+            self.assertEqual(outputBuffer.getvalue(), "first\nsecond\n")
+
+    def testOutputLargerThanTheSpoolThreshold(self):
+        chunks = chunkList(200, 100)
+        with mock.patch.object(outputCapture, "spoolThreshold", 1000):
+            with outputCapture.outputBuffer(outputCapture.fullOutput) as outputBuffer:
+                for chunk in chunks:
+                    outputBuffer.append(chunk)
+                self.assertTrue(outputBuffer.spoolFile._rolled)
+                self.assertEqual(outputBuffer.getvalue(), "".join(chunks))
+
+    def testNonAsciiOutput(self):
+        with outputCapture.outputBuffer(outputCapture.fullOutput) as outputBuffer:
+            outputBuffer.append("café\r\n")
+            self.assertEqual(outputBuffer.getvalue(), "café\r\n")
+
+    def testDefaultModeComesFromTheModule(self):
+        with mock.patch.object(
+            outputCapture, "outputMode", outputCapture.truncateOutput
+        ):
+            with outputCapture.outputBuffer() as outputBuffer:
+                self.assertEqual(outputBuffer.mode, outputCapture.truncateOutput)
+
+
+class truncateOutputTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(outputCapture, headSize=100, tailSize=300)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def capture(self, chunks):
+        with outputCapture.outputBuffer(outputCapture.truncateOutput) as outputBuffer:
+            for chunk in chunks:
+                outputBuffer.append(chunk)
+            return outputBuffer, outputBuffer.getvalue()
+
+    def testSmallOutputIsNotTruncated(self):
+        chunks = chunkList(7, 50)
+        outputBuffer, text = self.capture(chunks)
+        self.assertEqual(text, "".join(chunks))
+        self.assertEqual(outputBuffer.omittedLength, 0)
+
+    def testKeepsTheHeadAndTail(self):
+        chunks = chunkList(100, 45)
+        fullText = "".join(chunks)
+        outputBuffer, text = self.capture(chunks)
+
+        omittedLength = len(fullText) - 400
+        self.assertEqual(outputBuffer.omittedLength, omittedLength)
+        self.assertEqual(outputBuffer.length, len(fullText))
+        marker = f"\n... {omittedLength} characters of output omitted ...\n"
+        self.assertEqual(text, fullText[:100] + marker + fullText[-300:])
+
+    def testMemoryIsBounded(self):
+        outputBuffer, text = self.capture(chunkList(5000, 37))
+        self.assertEqual(outputBuffer.headLength, 100)
+        self.assertEqual(outputBuffer.tailLength, 300)
+        self.assertEqual(sum(len(chunk) for chunk in outputBuffer.tail), 300)
+
+    def testChunkLargerThanTheHeadAndTail(self):
+        bigChunk = "".join(chunkList(20, 50))
+        outputBuffer, text = self.capture([bigChunk])
+        self.assertTrue(text.startswith(bigChunk[:100]))
+        self.assertTrue(text.endswith(bigChunk[-300:]))
+        self.assertEqual(outputBuffer.omittedLength, len(bigChunk) - 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import concurrent.futures
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# the modules under test are in the python directory of the repository,
+# unitTestApiCache imports the VectorCAST dataAPI, so run these with vpython
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+import pythonUtilities
+import unitTestApiCache
+
+
+class fakeUnitTestApi:
+    """
+    Like the sqlite connections of the dataAPI, this must be
+    closed by the thread that opened it
+    """
+
+    openCount = 0
+
+    def __init__(self, enviroPath):
+        self.enviroPath = enviroPath
+        self.ownerThread = threading.get_ident()
+        self.closed = False
+        fakeUnitTestApi.openCount += 1
+
+    def close(self):
+        if threading.get_ident() != self.ownerThread:
+            raise RuntimeError("closed by the wrong thread")
+        self.closed = True
+
+
+class unitTestApiCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.workDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workDirectory.cleanup)
+        fakeUnitTestApi.openCount = 0
+
+        patcher = mock.patch.multiple(
+            unitTestApiCache,
+            UnitTestApi=fakeUnitTestApi,
+            apiCache=unitTestApiCache.collections.OrderedDict(),
+            apiHandles=dict(),
+            enviroThreads=dict(),
+            maxCacheSize=2,
+            threadIdleTimeout=0.2,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(pythonUtilities, "USE_SERVER", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(unitTestApiCache, "logMessage", lambda *args: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def makeEnviro(self, name):
+        enviroPath = os.path.join(self.workDirectory.name, name)
+        os.makedirs(enviroPath)
+        with open(os.path.join(enviroPath, "master.db"), "w") as dbFile:
+            dbFile.write("master")
+        return enviroPath
+
+    def useApi(self, enviroPath):
+        api = unitTestApiCache.openUnitTestApi(enviroPath)
+        unitTestApiCache.closeUnitTestApi(api)
+        return api
+
+    def runOnEnviro(self, enviroPath, function, *args):
+        return unitTestApiCache.runOnEnviroThread(enviroPath, function, *args)
+
+    def testOneHandleForAllConnectionThreads(self):
+        enviroPath = self.makeEnviro("ENV_A")
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            apiList = list(
+                executor.map(
+                    lambda _: self.runOnEnviro(enviroPath, self.useApi, enviroPath),
+                    range(8),
+                )
+            )
+        self.assertEqual(len(set(id(api) for api in apiList)), 1)
+        self.assertEqual(fakeUnitTestApi.openCount, 1)
+        self.assertEqual(list(unitTestApiCache.apiCache), [enviroPath])
+
+    def testHandlesOpenedOffTheEnviroThreadAreNotCached(self):
+        enviroPath = self.makeEnviro("ENV_A")
+        api = self.useApi(enviroPath)
+        self.assertTrue(api.closed)
+        self.assertEqual(len(unitTestApiCache.apiCache), 0)
+
+    def testInvalidateClosesTheHandleBeforeItReturns(self):
+        enviroPath = self.makeEnviro("ENV_A")
+        api = self.runOnEnviro(enviroPath, self.useApi, enviroPath)
+        self.assertFalse(api.closed)
+
+        unitTestApiCache.invalidateUnitTestApi(enviroPath)
+        self.assertTrue(api.closed)
+        self.assertEqual(len(unitTestApiCache.apiCache), 0)
+
+    def testInvalidateOnTheEnviroThread(self):
+        enviroPath = self.makeEnviro("ENV_A")
+
+        def invalidateWhileOpen():
+            api = unitTestApiCache.openUnitTestApi(enviroPath)
+            unitTestApiCache.invalidateUnitTestApi(enviroPath)
+            # the handle is in use, so it is closed when it is released
+            stillOpen = not api.closed
+            unitTestApiCache.closeUnitTestApi(api)
+            return api, stillOpen
+
+        api, stillOpen = self.runOnEnviro(enviroPath, invalidateWhileOpen)
+        self.assertTrue(stillOpen)
+        self.assertTrue(api.closed)
+
+    def testChangedDatabaseReopensTheHandle(self):
+        enviroPath = self.makeEnviro("ENV_A")
+        firstApi = self.runOnEnviro(enviroPath, self.useApi, enviroPath)
+        with open(os.path.join(enviroPath, "master.db"), "a") as dbFile:
+            dbFile.write("more")
+        secondApi = self.runOnEnviro(enviroPath, self.useApi, enviroPath)
+        self.assertIsNot(firstApi, secondApi)
+        self.assertTrue(firstApi.closed)
+
+    def testLeastRecentlyUsedHandleIsClosed(self):
+        apiList = []
+        for name in ["ENV_A", "ENV_B", "ENV_C"]:
+            enviroPath = self.makeEnviro(name)
+            apiList.append(self.runOnEnviro(enviroPath, self.useApi, enviroPath))
+
+        # the close is done by the thread of ENV_A, wait for it
+        self.runOnEnviro(apiList[0].enviroPath, lambda: None)
+        self.assertEqual([api.closed for api in apiList], [True, False, False])
+        self.assertEqual(len(unitTestApiCache.apiCache), 2)
+
+    def testIdleThreadExits(self):
+        enviroPath = self.makeEnviro("ENV_A")
+        self.runOnEnviro(enviroPath, self.useApi, enviroPath)
+        unitTestApiCache.invalidateUnitTestApi(enviroPath)
+
+        thread = unitTestApiCache.enviroThreads[enviroPath].thread
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertNotIn(enviroPath, unitTestApiCache.enviroThreads)
+
+        # and it is started again on demand
+        self.assertEqual(self.runOnEnviro(enviroPath, lambda: 42), 42)
+
+    def testRequestStateIsPassedToTheEnviroThread(self):
+        enviroPath = self.makeEnviro("ENV_A")
+        pythonUtilities.startRequest("request-1")
+        try:
+            pythonUtilities.cancelRequest("request-1")
+            self.assertTrue(
+                self.runOnEnviro(enviroPath, pythonUtilities.requestIsCancelled)
+            )
+        finally:
+            pythonUtilities.endRequest()
+        self.assertFalse(
+            self.runOnEnviro(enviroPath, pythonUtilities.requestIsCancelled)
+        )
+
+    def testExceptionsAreRaisedInTheCaller(self):
+        enviroPath = self.makeEnviro("ENV_A")
+
+        def fail():
+            raise ValueError("bad")
+
+        with self.assertRaises(ValueError):
+            self.runOnEnviro(enviroPath, fail)
+
+
+if __name__ == "__main__":
+    unittest.main()
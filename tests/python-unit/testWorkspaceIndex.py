@@ -0,0 +1,172 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# the modules under test are in the python directory of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "python"))
+
+import workspaceIndex
+
+# an old time for the directories, so that their mtimes are trusted
+oldTime = 1000000000
+
+
+class workspaceIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.rootDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.rootDirectory.cleanup)
+        self.rootPath = self.rootDirectory.name
+        self.indexDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.indexDirectory.cleanup)
+
+        patcher = mock.patch.multiple(
+            workspaceIndex,
+            indexDirectory=self.indexDirectory.name,
+            indexCache=dict(),
+            watchMode=False,
+            racyModifySeconds=0,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def makeFile(self, relativePath):
+        filePath = os.path.join(self.rootPath, relativePath)
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+        with open(filePath, "w") as fileHandle:
+            fileHandle.write("")
+        return filePath
+
+    def makeEnvironment(self, relativePath):
+        # an environment is a .vce file and a directory with the same name
+        os.makedirs(os.path.join(self.rootPath, relativePath), exist_ok=True)
+        self.makeFile(os.path.join(relativePath, "UNITDATA.VCD"))
+        return self.makeFile(relativePath + ".vce")
+
+    def setOldTimes(self):
+        for directoryPath, _, _ in os.walk(self.rootPath):
+            os.utime(directoryPath, ns=(oldTime * 10**9, oldTime * 10**9))
+
+    def getIndex(self, excludeList=None, maxDepth=-1):
+        excludeList = workspaceIndex.defaultExcludes + (excludeList or [])
+        return workspaceIndex.getIndex(self.rootPath, excludeList, maxDepth)
+
+    def testFindsTheVceFiles(self):
+        expectedList = [
+            self.makeEnvironment("ENV_A"),
+            self.makeEnvironment(os.path.join("unit", "ENV_B")),
+            self.makeEnvironment(os.path.join("unit", "deep", "tree", "ENV_C")),
+        ]
+        self.makeFile(os.path.join("unit", "notes.txt"))
+        self.assertEqual(
+            workspaceIndex.findVceFiles(self.rootPath), sorted(expectedList)
+        )
+
+    def testExcludes(self):
+        keptPath = self.makeEnvironment(os.path.join("src", "ENV_A"))
+        self.makeEnvironment(os.path.join(".git", "ENV_B"))
+        self.makeEnvironment(os.path.join("node_modules", "pkg", "ENV_C"))
+        self.makeEnvironment(os.path.join("build", "ENV_D"))
+        self.makeEnvironment(os.path.join("src", "out", "ENV_E"))
+
+        self.assertEqual(
+            workspaceIndex.findVceFiles(self.rootPath, ["build", "src/out"]),
+            [keptPath],
+        )
+
+    def testMaxDepth(self):
+        topPath = self.makeEnvironment("ENV_A")
+        levelOnePath = self.makeEnvironment(os.path.join("one", "ENV_B"))
+        self.makeEnvironment(os.path.join("one", "two", "ENV_C"))
+
+        self.assertEqual(
+            workspaceIndex.findVceFiles(self.rootPath, maxDepth=0), [topPath]
+        )
+        self.assertEqual(
+            workspaceIndex.findVceFiles(self.rootPath, maxDepth=1),
+            sorted([topPath, levelOnePath]),
+        )
+
+    def testEnvironmentDirectoriesAreNotScanned(self):
+        self.makeEnvironment("ENV_A")
+        index = self.getIndex()
+        index.getVceFiles()
+        self.assertEqual(index.directories[""]["dirs"], [])
+        self.assertNotIn("ENV_A", index.directories)
+
+    def testOnlyChangedDirectoriesAreListed(self):
+        self.makeEnvironment(os.path.join("one", "ENV_A"))
+        self.makeEnvironment(os.path.join("two", "ENV_B"))
+        self.setOldTimes()
+
+        index = self.getIndex()
+        self.assertEqual(index.scan(), (3, 3))
+        self.assertEqual(index.scan(), (0, 3))
+
+        newPath = self.makeEnvironment(os.path.join("two", "ENV_C"))
+        self.assertEqual(index.scan(), (1, 3))
+        self.assertIn(newPath, index.vceFiles)
+
+    def testRemovedFilesAreDropped(self):
+        removedPath = self.makeEnvironment(os.path.join("one", "ENV_A"))
+        keptPath = self.makeEnvironment(os.path.join("one", "ENV_B"))
+        self.setOldTimes()
+        index = self.getIndex()
+        self.assertEqual(index.getVceFiles(), sorted([removedPath, keptPath]))
+
+        os.remove(removedPath)
+        self.assertEqual(index.getVceFiles(), [keptPath])
+
+    def testRecentDirectoriesAreListedAgain(self):
+        self.makeEnvironment("ENV_A")
+        index = self.getIndex()
+        with mock.patch.object(workspaceIndex, "racyModifySeconds", 3600):
+            index.scan()
+            self.assertIsNone(index.directories[""]["mtime"])
+            self.assertEqual(index.scan(), (1, 1))
+
+    def testIndexIsPersisted(self):
+        enviroPath = self.makeEnvironment(os.path.join("one", "ENV_A"))
+        self.setOldTimes()
+        self.getIndex().getVceFiles()
+        self.assertTrue(os.path.isfile(self.getIndex().indexFilePath()))
+
+        # a new process starts with an empty cache, and loads the index file
+        workspaceIndex.indexCache.clear()
+        index = self.getIndex()
+        self.assertEqual(index.scan(), (0, 2))
+        self.assertEqual(index.vceFiles, [enviroPath])
+
+    def testCorruptIndexFileIsIgnored(self):
+        enviroPath = self.makeEnvironment("ENV_A")
+        indexFilePath = self.getIndex().indexFilePath()
+        with open(indexFilePath, "w") as indexFile:
+            indexFile.write("{not json")
+
+        workspaceIndex.indexCache.clear()
+        self.assertEqual(workspaceIndex.findVceFiles(self.rootPath), [enviroPath])
+
+    @unittest.skipUnless(os.name == "posix", "POSIX permissions")
+    def testIndexDirectoryIsPrivate(self):
+        os.chmod(self.indexDirectory.name, 0o755)
+        self.makeEnvironment("ENV_A")
+        self.getIndex().getVceFiles()
+        mode = stat.S_IMODE(os.stat(self.indexDirectory.name).st_mode)
+        self.assertEqual(mode, 0o700)
+
+    @unittest.skipUnless(os.name == "posix", "POSIX permissions")
+    def testSymlinkedIndexDirectoryIsNotUsed(self):
+        otherDirectory = os.path.join(self.rootPath, "other")
+        os.makedirs(otherDirectory)
+        linkPath = os.path.join(self.indexDirectory.name, "link")
+        os.symlink(otherDirectory, linkPath)
+        enviroPath = self.makeEnvironment("ENV_A")
+        with mock.patch.object(workspaceIndex, "indexDirectory", linkPath):
+            self.assertEqual(workspaceIndex.findVceFiles(self.rootPath), [enviroPath])
+        self.assertEqual(os.listdir(otherDirectory), [])
+
+
+if __name__ == "__main__":
+    unittest.main()